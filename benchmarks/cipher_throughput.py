@@ -0,0 +1,62 @@
+"""
+Compare the cipher suites of `encrypted` members: per-field throughput and stored size.
+
+Each suite encrypts and decrypts one string member of a payload `--fields` times, through
+`to_dict` and `from_dict`, and reports the size of the stored value. Members are decrypted
+when first read, so the decryption loop reads the member of each decoded instance.
+
+Usage:
+    python benchmarks/cipher_throughput.py [--fields N] [--size BYTES]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventsourcing.data import Data
+from eventsourcing.encryption import AES_GCM, CHACHA20_POLY1305, FERNET, CryptoRepository, InMemCryptoStore, encrypted
+
+def make_class(cipher : str) -> type[Data]:
+    @encrypted(subject_id="id", encrypted_members=["value"], cipher=cipher)
+    @dataclass
+    class Field(Data):
+        id : str
+        value : str
+    return Field
+
+def measure(cipher : str, fields : int, value : str) -> tuple[float, float, int, int]:
+    cls = make_class(cipher)
+    instance = cls(id="00000000", value=value)
+    stored = instance.to_dict()
+
+    started = time.perf_counter()
+    for _ in range(fields):
+        instance.to_dict()
+    encrypting = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(fields):
+        cls.from_dict(stored).value
+    decrypting = time.perf_counter() - started
+
+    return fields / encrypting, fields / decrypting, len(stored["value"]), len(json.dumps(stored))
+
+def main(argv : list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fields", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=32, help="length of the plaintext value")
+    args = parser.parse_args(argv)
+    CryptoRepository.crypto_store = InMemCryptoStore()
+    value = "x" * args.size
+
+    print(f"{'cipher':<20}{'encrypt/s':>12}{'decrypt/s':>12}{'value B':>10}{'payload B':>11}")
+    for cipher in [FERNET, AES_GCM, CHACHA20_POLY1305]:
+        encrypts, decrypts, value_size, payload_size = measure(cipher, args.fields, value)
+        print(f"{cipher:<20}{encrypts:>12.0f}{decrypts:>12.0f}{value_size:>10}{payload_size:>11}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+"""
+Measure the event loop lag caused by a large replay, decoding inline or in an executor.
+
+A ticker coroutine sleeps for 1 ms in a loop and records how late it wakes up while one
+stream of encrypted `example.user` events is loaded through `get_events_for_aggregate`.
+
+Usage:
+    python benchmarks/decode_loop_lag.py [--events N] [--workers W]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.load_testing import percentile
+from eventsourcing.repositories import EventStoreRepository
+from example.user import User
+
+TICK = 0.001
+
+async def build_store(events : int, executor : Executor | None) -> InMemEventStore:
+    event_store = InMemEventStore(decode_executor=executor)
+    user = User("00000000", "First", "Last", date(1990, 1, 1))
+    for n in range(events - 1):
+        user.change_last_name(f"Last {n}")
+    await EventStoreRepository[User](event_store, User).save(user, -1)
+    return event_store
+
+async def measure(event_store : InMemEventStore) -> tuple[float, list[float]]:
+    lags : list[float] = []
+    done = False
+
+    async def ticker() -> None:
+        loop = asyncio.get_running_loop()
+        while not done:
+            expected = loop.time() + TICK
+            await asyncio.sleep(TICK)
+            lags.append(max(0.0, loop.time() - expected))
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await event_store.get_events_for_aggregate("user-00000000")
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    return elapsed, sorted(lags)
+
+async def main(argv : list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+    CryptoRepository.crypto_store = InMemCryptoStore()
+
+    print(f"{'decoding':<10}{'load ms':>10}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for name, executor in [("inline", None), ("threads", ThreadPoolExecutor(args.workers)), ("processes", ProcessPoolExecutor(args.workers))]:
+        try:
+            event_store = await build_store(args.events, executor)
+            # The first load starts the workers of the pool.
+            await event_store.get_events_for_aggregate("user-00000000")
+            elapsed, lags = await measure(event_store)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        print(f"{name:<10}{elapsed * 1000:>10.1f}{percentile(lags, 50) * 1000:>12.2f}{percentile(lags, 99) * 1000:>12.2f}{(lags[-1] if lags else 0) * 1000:>12.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
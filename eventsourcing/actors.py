@@ -0,0 +1,202 @@
+import asyncio
+import inspect
+from typing import Any, Callable, Generic, TypeVar
+from .aggregates import AggregateRoot
+from .exceptions import AggregateNotFoundError, ConcurrencyError
+from .repositories import IRepository
+
+T = TypeVar('T', bound=AggregateRoot)
+
+Command = Callable[[T], Any]
+
+class _Actor(Generic[T]):
+    """Mailbox and live instance of one aggregate."""
+
+    def __init__(self, id : str) -> None:
+        self.id = id
+        self.mailbox : asyncio.Queue[tuple[Command, asyncio.Future]] = asyncio.Queue()
+        self.aggregate : T | None = None
+        self.task : asyncio.Task | None = None
+
+class ActorRuntime(Generic[T]):
+    """
+    Runs the commands of each aggregate one at a time on a live instance, saving the
+    changes of all the commands waiting in its mailbox with one `save` per tick.
+
+    Each active aggregate gets an actor: a mailbox served by its own task, which keeps
+    the aggregate loaded between commands. A tick takes every command waiting in the
+    mailbox, up to `max_batch`, runs them in arrival order and saves their changes
+    together. A command that raises only fails its own caller; if it left changes
+    behind, the tick starts over from a reloaded aggregate without it. When the save
+    conflicts with a writer outside the runtime, the aggregate is reloaded and the
+    commands of the tick run again, up to `max_attempts` times. Actors idle for
+    `idle_timeout` seconds are evicted along with their aggregate. An actor whose task
+    ends on a `BaseException`, such as a command raising `CancelledError`, fails the
+    commands it still holds with `RuntimeError` and is replaced on the next command.
+    """
+
+    def __init__(self, repository : IRepository[T], create : Callable[[str], T] | None = None, idle_timeout : float = 60.0, max_batch : int = 256, max_attempts : int = 3) -> None:
+        """
+        Args:
+            repository (IRepository[T]): Repository loading and saving the aggregates.
+            create (Callable[[str], T] | None): Create the aggregate of an ID that is not stored yet; commands
+                on missing aggregates fail with `AggregateNotFoundError` when None.
+            idle_timeout (float): Seconds without commands after which an actor is evicted.
+            max_batch (int): Maximum number of commands saved in one tick.
+            max_attempts (int): Number of times the commands of a tick run when their save conflicts.
+        """
+        if idle_timeout <= 0:
+            raise ValueError("idle_timeout must be positive")
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive")
+        if max_attempts <= 0:
+            raise ValueError("max_attempts must be positive")
+        self.repository = repository
+        self.create = create
+        self.idle_timeout = idle_timeout
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.commands = 0
+        self.ticks = 0
+        self.saves = 0
+        self.conflicts = 0
+        self.evictions = 0
+        self.__actors : dict[str, _Actor[T]] = {}
+
+    @property
+    def active_ids(self) -> list[str]:
+        return list(self.__actors)
+
+    async def execute(self, id : str, command : Command) -> Any:
+        """
+        Run a command on an aggregate and wait until its changes are saved.
+
+        Args:
+            id (str): Aggregate ID.
+            command (Command): Called with the aggregate; it may be a coroutine function.
+
+        Returns:
+            What the command returned.
+        """
+        actor = self.__actors.get(id)
+        if actor is None:
+            actor = self.__actors[id] = _Actor(id)
+            actor.task = asyncio.get_running_loop().create_task(self.__serve(actor))
+        future = asyncio.get_running_loop().create_future()
+        actor.mailbox.put_nowait((command, future))
+        return await future
+
+    async def stop(self) -> None:
+        """Wait for the commands already sent, then stop every actor."""
+        for actor in list(self.__actors.values()):
+            await actor.mailbox.join()
+        for actor in list(self.__actors.values()):
+            actor.task.cancel()
+        await asyncio.gather(*(actor.task for actor in self.__actors.values()), return_exceptions=True)
+        self.__actors.clear()
+
+    async def __serve(self, actor : _Actor[T]) -> None:
+        batch : list[tuple[Command, asyncio.Future]] = []
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(actor.mailbox.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    # Nothing runs between the check and the removal, so no command can be lost.
+                    if actor.mailbox.empty():
+                        del self.__actors[actor.id]
+                        self.evictions += 1
+                        return
+                    continue
+                batch = [first]
+                while len(batch) < self.max_batch and not actor.mailbox.empty():
+                    batch.append(actor.mailbox.get_nowait())
+                try:
+                    await self.__tick(actor, [(command, future) for command, future in batch if not future.done()])
+                finally:
+                    for _ in batch:
+                        actor.mailbox.task_done()
+                batch = []
+        except BaseException as e:
+            # A command raising CancelledError, or the task being cancelled, ends the actor:
+            # fail what it still holds and forget it so the next command starts a new one.
+            if self.__actors.get(actor.id) is actor:
+                del self.__actors[actor.id]
+            stopped = RuntimeError(f"The actor of '{actor.id}' stopped")
+            stopped.__cause__ = e
+            while not actor.mailbox.empty():
+                batch.append(actor.mailbox.get_nowait())
+                actor.mailbox.task_done()
+            self.__fail(batch, stopped)
+            raise
+
+    async def __tick(self, actor : _Actor[T], batch : list[tuple[Command, asyncio.Future]]) -> None:
+        self.ticks += 1
+        self.commands += len(batch)
+        attempts = 0
+        while batch:
+            try:
+                aggregate = actor.aggregate if actor.aggregate is not None else await self.__load(actor.id)
+            except Exception as e:
+                self.__fail(batch, e)
+                return
+            outcomes : list[tuple[asyncio.Future, Any, BaseException | None]] = []
+            restart = False
+            for n, (command, future) in enumerate(batch):
+                changes = len(aggregate.get_uncommitted_changes())
+                try:
+                    result = command(aggregate)
+                    if inspect.isawaitable(result):
+                        result = await result
+                except Exception as e:
+                    if len(aggregate.get_uncommitted_changes()) != changes:
+                        # The aggregate holds changes of a failed command: start over without it.
+                        future.set_exception(e)
+                        del batch[n]
+                        actor.aggregate = None
+                        restart = True
+                        break
+                    outcomes.append((future, None, e))
+                else:
+                    outcomes.append((future, result, None))
+            if restart:
+                continue
+            if aggregate.get_uncommitted_changes():
+                try:
+                    await self.repository.save(aggregate, aggregate.version)
+                    self.saves += 1
+                except ConcurrencyError as e:
+                    self.conflicts += 1
+                    actor.aggregate = None
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        self.__fail(batch, e)
+                        return
+                    continue
+                except Exception as e:
+                    actor.aggregate = None
+                    self.__fail(batch, e)
+                    return
+            actor.aggregate = aggregate
+            for future, result, error in outcomes:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            return
+
+    async def __load(self, id : str) -> T:
+        try:
+            return await self.repository.get_by_id(id)
+        except AggregateNotFoundError:
+            if self.create is None:
+                raise
+            return self.create(id)
+
+    @staticmethod
+    def __fail(batch : list[tuple[Command, asyncio.Future]], error : BaseException) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
@@ -1,5 +1,7 @@
 import abc
+from copy import deepcopy
 from .event import IEvent
+from .encryption import get_subject_id
 
 class AggregateRoot(abc.ABC):
     """
@@ -15,6 +17,7 @@ class AggregateRoot(abc.ABC):
     def __init__(self) -> None:
         self.__changes : list[IEvent] = []
         self.__version : int = -1
+        self.__subject_ids : set[str] = set()
 
 
     @staticmethod 
@@ -31,6 +34,14 @@ class AggregateRoot(abc.ABC):
         """
         return self.__version
 
+    @property
+    def subject_ids(self) -> set[str]:
+        """
+        Get the subjects of the encrypted events applied to the aggregate root, whose
+        decrypted values its state may hold.
+        """
+        return self.__subject_ids
+
     def get_uncommitted_changes(self) -> list[IEvent]:
         """
         Get the list of uncommitted changes.
@@ -39,8 +50,10 @@ class AggregateRoot(abc.ABC):
 
     def mark_changes_as_committed(self) -> None:
         """
-        Mark all uncommitted changes as committed by clearing the changes list.
+        Mark all uncommitted changes as committed by clearing the changes list and
+        advancing the version past them.
         """
+        self.__version += len(self.__changes)
         self.__changes.clear()
 
 
@@ -53,6 +66,21 @@ class AggregateRoot(abc.ABC):
             self.__apply_change(e, False)
             self.__version += 1
 
+    def get_snapshot_state(self) -> dict:
+        """
+        Get a copy of the aggregate root's state to be stored in a snapshot.
+        """
+        return deepcopy({key : value for key, value in vars(self).items() if key not in ("_AggregateRoot__changes", "_AggregateRoot__version", "_AggregateRoot__subject_ids")})
+
+    def loads_from_snapshot(self, state : dict, version : int, history : list[IEvent], subject_ids : list[str] | None = None) -> None:
+        """
+        Load the aggregate root from a snapshot state taken at `version` and the events that follow it.
+        """
+        self.__dict__.update(deepcopy(state))
+        self.__version = version
+        self.__subject_ids = set(subject_ids or ())
+        self.loads_from_history(history)
+
     def _apply(self, e : "IEvent") -> None:
         """
         Abstract method to apply a change to the aggregate root.
@@ -63,6 +91,9 @@ class AggregateRoot(abc.ABC):
         Apply a change to the aggregate root and optionally mark it as new.
         """
         self._apply(event)
+        subject_id = get_subject_id(event)
+        if subject_id is not None:
+            self.__subject_ids.add(subject_id)
         if is_new:
             self.__changes.append(event)
 
@@ -0,0 +1,228 @@
+from array import array
+from bisect import bisect_right
+from typing import Hashable, Iterable, Iterator, overload
+from concurrent.futures import Executor
+from .cache import DecodedEventCache
+from .compression import PayloadCompressor
+from .event_stores import InMemEventStore, EventDescriptor, stream_category
+from .idempotency import DedupIndex
+from .outbox import Outbox
+
+class InternTable:
+    """Maps a small set of repeated values, such as event type names, to integer codes."""
+
+    def __init__(self) -> None:
+        self.values : list = []
+        self.__codes : dict = {}
+
+    def code(self, value : Hashable) -> int:
+        code = self.__codes.get(value)
+        if code is None:
+            code = self.__codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+class ArenaStream:
+    """
+    The events of one stream packed into contiguous buffers.
+
+    Payloads are concatenated in one `bytearray` delimited by an `array('Q')` of offsets,
+    and every other attribute is kept in a typed array, with event types, compressions
+    and subjects stored as codes of intern tables. Versions are consecutive from
+    `first_version` and are not stored. The stream behaves as the list of
+    `EventDescriptor` used by `InMemEventStore`: indexing and slicing build the
+    descriptors on access, decoding their payloads straight from a `memoryview` of the
+    arena.
+    """
+    __slots__ = ("stream_id", "first_version", "data", "offsets", "type_codes", "encoding_codes", "positions", "recorded_ats", "subject_codes", "subjects", "event_ids", "__types", "__encodings")
+
+    def __init__(self, stream_id : str, types : InternTable, encodings : InternTable) -> None:
+        """
+        Args:
+            stream_id (str): ID of the stream.
+            types (InternTable): Event type names, shared by the streams of a store.
+            encodings (InternTable): Pairs of compression name and payload kind, shared by the streams of a store.
+        """
+        self.stream_id = stream_id
+        self.first_version = 0
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.type_codes = array("H")
+        self.encoding_codes = array("B")
+        self.positions = array("Q")
+        self.recorded_ats = array("d")
+        self.subject_codes = array("I")
+        self.subjects : list[str] = []
+        self.event_ids : list[str | None] | None = None
+        self.__types = types
+        self.__encodings = encodings
+
+    @property
+    def last_version(self) -> int:
+        return self.first_version + len(self) - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the buffers of the stream, excluding the shared intern tables."""
+        arrays = (self.offsets, self.type_codes, self.encoding_codes, self.positions, self.recorded_ats, self.subject_codes)
+        return len(self.data) + sum(len(a) * a.itemsize for a in arrays)
+
+    def __len__(self) -> int:
+        return len(self.type_codes)
+
+    def append(self, desc : EventDescriptor) -> None:
+        if not self.type_codes:
+            self.first_version = desc.version
+        elif desc.version != self.last_version + 1:
+            raise ValueError(f"Version {desc.version} does not follow version {self.last_version} of {self.stream_id}")
+        is_bytes = not isinstance(desc.event_data, str)
+        self.data += desc.event_data if is_bytes else desc.event_data.encode("utf-8")
+        self.offsets.append(len(self.data))
+        self.type_codes.append(self.__types.code(desc.event_type))
+        self.encoding_codes.append(self.__encodings.code((desc.compression, is_bytes)))
+        self.positions.append(desc.position or 0)
+        self.recorded_ats.append(desc.recorded_at)
+        self.subject_codes.append(self.__subject_code(desc.subject_id))
+        if desc.event_id is not None and self.event_ids is None:
+            self.event_ids = [None] * (len(self) - 1)
+        if self.event_ids is not None:
+            self.event_ids.append(desc.event_id)
+
+    def __subject_code(self, subject_id : str | None) -> int:
+        if subject_id is None:
+            return 0
+        try:
+            return self.subjects.index(subject_id) + 1
+        except ValueError:
+            self.subjects.append(subject_id)
+            return len(self.subjects)
+
+    @overload
+    def __getitem__(self, index : int) -> EventDescriptor: ...
+    @overload
+    def __getitem__(self, index : slice) -> list[EventDescriptor]: ...
+    def __getitem__(self, index):
+        with memoryview(self.data) as view:
+            if isinstance(index, slice):
+                return [self.__descriptor(view, i) for i in range(*index.indices(len(self)))]
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("stream index out of range")
+            return self.__descriptor(view, index)
+
+    def __iter__(self) -> Iterator[EventDescriptor]:
+        return iter(self[:])
+
+    def __descriptor(self, view : memoryview, i : int) -> EventDescriptor:
+        compression, is_bytes = self.__encodings.values[self.encoding_codes[i]]
+        payload = view[self.offsets[i]:self.offsets[i + 1]]
+        event_data = bytes(payload) if is_bytes else str(payload, "utf-8")
+        subject_code = self.subject_codes[i]
+        return EventDescriptor(
+            self.stream_id,
+            self.__types.values[self.type_codes[i]],
+            event_data,
+            self.first_version + i,
+            compression,
+            self.recorded_ats[i],
+            self.positions[i] or None,
+            self.event_ids[i] if self.event_ids is not None else None,
+            self.subjects[subject_code - 1] if subject_code else None)
+
+    def __delitem__(self, index : slice) -> None:
+        if not isinstance(index, slice) or index.start not in (None, 0) or index.step not in (None, 1):
+            raise TypeError("Only a prefix of an arena stream can be deleted")
+        dropped = min(len(self), index.stop if index.stop is not None else len(self))
+        if dropped <= 0:
+            return
+        base = self.offsets[dropped]
+        del self.data[:base]
+        self.offsets = array("Q", (offset - base for offset in self.offsets[dropped:]))
+        for name in ("type_codes", "encoding_codes", "positions", "recorded_ats", "subject_codes"):
+            del getattr(self, name)[:dropped]
+        if self.event_ids is not None:
+            del self.event_ids[:dropped]
+        self.first_version += dropped
+
+    def index_at(self, timestamp : float) -> int:
+        """Get the number of events recorded at or before `timestamp`."""
+        return bisect_right(self.recorded_ats, timestamp)
+
+class ArenaEventStore(InMemEventStore):
+    """
+    In-memory event store keeping each stream in an `ArenaStream`.
+
+    It stores an event in a few dozen bytes beyond its payload instead of one
+    `EventDescriptor` with its own strings, floats and ints, which suits large fixtures
+    and long-lived in-memory stores. Descriptors are rebuilt when read, so it behaves
+    as `InMemEventStore` at some extra cost per read event.
+    """
+
+    def __init__(self, event_cache : DecodedEventCache | None = None, compressor : PayloadCompressor | None = None, outbox : Outbox | None = None, dedup_index : DedupIndex | None = None, decode_executor : Executor | None = None, inline_decode_threshold : int = 256) -> None:
+        super().__init__(event_cache=event_cache, compressor=compressor, outbox=outbox, dedup_index=dedup_index, decode_executor=decode_executor, inline_decode_threshold=inline_decode_threshold)
+        self.current : dict[str, ArenaStream] = {}
+        self.type_index : dict[str, tuple[list[str], array]] = {}
+        self.event_types = InternTable()
+        self.encodings = InternTable()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(stream.nbytes for stream in self.current.values())
+
+    def _create_stream(self, aggregate_id : str) -> ArenaStream:
+        stream = ArenaStream(aggregate_id, self.event_types, self.encodings)
+        self.current[aggregate_id] = stream
+        self.category_index.setdefault(stream_category(aggregate_id), {})[aggregate_id] = None
+        return stream
+
+    def _head_version(self, aggregate_id : str, event_descriptors : ArenaStream) -> int:
+        if event_descriptors:
+            return event_descriptors.last_version
+        return self._stream_starts.get(aggregate_id, 0) - 1
+
+    def _slice_stream(self, event_descriptors : ArenaStream, from_version : int, to_version : int | None = None) -> list[EventDescriptor]:
+        first = event_descriptors.first_version
+        stop = len(event_descriptors) if to_version is None else max(0, to_version - first + 1)
+        return event_descriptors[max(0, from_version - first):stop]
+
+    def _replace(self, aggregate_id : str, event_descriptors : ArenaStream, replacements : dict[int, EventDescriptor]) -> None:
+        # Payload sizes change, so the arena is rebuilt in one pass.
+        stream = ArenaStream(aggregate_id, self.event_types, self.encodings)
+        for index, desc in enumerate(event_descriptors):
+            stream.append(replacements.get(index, desc))
+        self.current[aggregate_id] = stream
+
+    def _index_type(self, event_type : str, aggregate_id : str, version : int) -> None:
+        # Parallel lists rather than one tuple per event; the stream ID strings are shared.
+        stream_ids, versions = self.type_index.setdefault(event_type, ([], array("q")))
+        stream_ids.append(aggregate_id)
+        versions.append(version)
+
+    def _type_entries(self, event_type : str) -> Iterable[tuple[str, int]]:
+        stream_ids, versions = self.type_index.get(event_type, ((), ()))
+        return zip(stream_ids, versions)
+
+    def _type_count(self, event_type : str) -> int:
+        return len(self.type_index[event_type][1]) if event_type in self.type_index else 0
+
+    def _prune_types(self, event_type : str) -> None:
+        kept = list(self._live_type_entries(event_type))
+        self.type_index[event_type] = ([stream_id for stream_id, _ in kept], array("q", (version for _, version in kept)))
+
+    async def get_event_descriptors_by_type(self, event_type : str) -> list[EventDescriptor]:
+        res = []
+        for stream_id, version in self._live_type_entries(event_type):
+            stream = self._get_stream(stream_id)
+            res.append(stream[version - stream.first_version])
+        return res
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        stream = self._get_stream(aggregate_id)
+        if stream is None:
+            return -1
+        index = stream.index_at(timestamp)
+        return stream.first_version + index - 1 if index else self._stream_starts.get(aggregate_id, 0) - 1
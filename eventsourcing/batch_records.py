@@ -0,0 +1,203 @@
+import json
+import time
+import asyncio
+from array import array
+from bisect import bisect_right
+from .compression import PayloadCompressor
+from .encryption import CryptoRepository, get_subject_id
+from .event import IEvent
+from .event_stores import IEventStore, EventDescriptor, decode_records
+from .exceptions import ArgumentError, ConcurrencyError
+from .outbox import Outbox
+from .upcasting import upcasters
+
+class BatchRecord:
+    """
+    The events of one append stored as a single encoded record.
+
+    `payload` is the JSON list of the events' dictionaries, compressed as a whole when
+    `compression` is set; the event at index `n` has version `first_version + n`.
+    """
+    __slots__ = ("stream_id", "first_version", "event_types", "payload", "compression", "recorded_at", "position", "event_ids", "subject_ids")
+
+    def __init__(self, stream_id : str, first_version : int, event_types : list[str], payload : str | bytes, compression : str | None = None, recorded_at : float | None = None, position : int | None = None, event_ids : list[str] | None = None, subject_ids : list[str] | None = None) -> None:
+        self.stream_id = stream_id
+        self.first_version = first_version
+        self.event_types = event_types
+        self.payload = payload
+        self.compression = compression
+        self.recorded_at = time.time() if recorded_at is None else recorded_at
+        self.position = position
+        self.event_ids = event_ids
+        self.subject_ids = subject_ids or []
+
+    def __len__(self) -> int:
+        return len(self.event_types)
+
+    @property
+    def last_version(self) -> int:
+        return self.first_version + len(self.event_types) - 1
+
+    def __repr__(self) -> str:
+        return f"(batch:{self.stream_id} - versions:{self.first_version}..{self.last_version})"
+
+class BatchRecordEventStore(IEventStore):
+    """
+    In-memory event store writing each `save_events` call as one `BatchRecord`.
+
+    An append costs one record, one `json.dumps` and one entry in the version index of
+    its stream, whatever its number of events; reads parse each record once and decode
+    its events in one call. The index holds the first version of every record, so the
+    record holding any version is found by binary search.
+
+    `get_event_descriptors` still returns one `EventDescriptor` per event, re-encoding
+    each of them, for the tools working on per-event records.
+    """
+
+    def __init__(self, compressor : PayloadCompressor | None = None, outbox : Outbox | None = None) -> None:
+        self.compressor = compressor
+        self.outbox = outbox
+        self.position = 0
+        self.records : dict[str, list[BatchRecord]] = {}
+        self.__index : dict[str, array] = {}
+
+    @property
+    def record_count(self) -> int:
+        return sum(len(records) for records in self.records.values())
+
+    @property
+    def index_entries(self) -> int:
+        return sum(len(index) for index in self.__index.values())
+
+    def __head_version(self, aggregate_id : str) -> int:
+        records = self.records.get(aggregate_id)
+        return records[-1].last_version if records else -1
+
+    def __is_replay(self, aggregate_id : str, event_ids : list[str], expected_version : int) -> bool:
+        if self.__head_version(aggregate_id) < expected_version + len(event_ids):
+            return False
+        stored = []
+        for record in self.__records_from(aggregate_id, expected_version + 1):
+            if record.event_ids is None:
+                return False
+            start = max(0, expected_version + 1 - record.first_version)
+            stored.extend(record.event_ids[start:])
+            if len(stored) >= len(event_ids):
+                break
+        return stored[:len(event_ids)] == event_ids
+
+    async def save_events(self, aggregate_id : str, events : list[IEvent], expected_version : int, event_ids : list[str] | None = None) -> None:
+        if event_ids is not None and len(event_ids) != len(events):
+            raise ArgumentError("One event id is required for each event")
+        if event_ids and self.__is_replay(aggregate_id, event_ids, expected_version):
+            return
+        if self.__head_version(aggregate_id) != expected_version:
+            raise ConcurrencyError()
+        if not events:
+            return
+        payload, compression = self.__encode([upcasters.stamp(event.type, event.to_dict()) for event in events], events[0].type)
+        subject_ids = list(dict.fromkeys(subject_id for subject_id in (get_subject_id(event) for event in events) if subject_id is not None))
+        self.position += 1
+        record = BatchRecord(aggregate_id, expected_version + 1, [event.type for event in events], payload, compression, position=self.position, event_ids=event_ids, subject_ids=subject_ids)
+        self.__append(record)
+        if self.outbox is not None:
+            self.outbox.append(aggregate_id, expected_version + 1, events)
+
+    def __encode(self, values : list[dict], event_type : str) -> tuple[str | bytes, str | None]:
+        data = json.dumps(values)
+        if self.compressor is None:
+            return data, None
+        compression, compressed = self.compressor.compress(event_type, data.encode("utf-8"))
+        if compression is None:
+            return data, None
+        return compressed, compression
+
+    def __append(self, record : BatchRecord) -> None:
+        self.records.setdefault(record.stream_id, []).append(record)
+        self.__index.setdefault(record.stream_id, array("q")).append(record.first_version)
+
+    async def append_descriptors(self, aggregate_id : str, descriptors : list[EventDescriptor], expected_version : int) -> None:
+        head_version = self.__head_version(aggregate_id)
+        if head_version != expected_version and not (head_version == -1 and expected_version >= 0):
+            raise ConcurrencyError()
+        if not descriptors:
+            return
+        for i, desc in enumerate(descriptors):
+            if desc.version != expected_version + 1 + i:
+                raise ArgumentError(f"Version {desc.version} does not follow version {expected_version + i} of {aggregate_id}")
+        values = [self._read_payload(desc) for desc in descriptors]
+        payload, compression = self.__encode(values, descriptors[0].event_type)
+        subject_ids = list(dict.fromkeys(desc.subject_id for desc in descriptors if desc.subject_id is not None))
+        event_ids = [desc.event_id for desc in descriptors] if all(desc.event_id is not None for desc in descriptors) else None
+        self.position += 1
+        self.__append(BatchRecord(aggregate_id, expected_version + 1, [desc.event_type for desc in descriptors], payload, compression, descriptors[0].recorded_at, self.position, event_ids, subject_ids))
+
+    def __records_from(self, aggregate_id : str, from_version : int) -> list[BatchRecord]:
+        records = self.records.get(aggregate_id)
+        if not records:
+            return []
+        start = max(0, bisect_right(self.__index[aggregate_id], from_version) - 1)
+        return records[start:]
+
+    def __parse(self, record : BatchRecord) -> list[dict]:
+        if record.compression is None:
+            return json.loads(record.payload)
+        if self.compressor is None:
+            raise ValueError(f"Batch {record.stream_id}@{record.first_version} is compressed with '{record.compression}' but the store has no compressor")
+        return json.loads(self.compressor.decompress(record.compression, record.payload))
+
+    async def __decode(self, records : list[BatchRecord], from_version : int = 0, to_version : int | None = None) -> list[IEvent]:
+        subject_ids = {subject_id for record in records for subject_id in record.subject_ids}
+        fetch = asyncio.ensure_future(CryptoRepository.fetch_existing_or_none_many(subject_ids)) if subject_ids else None
+        if fetch is not None:
+            await asyncio.sleep(0)
+        batches = []
+        for record in records:
+            start = max(0, from_version - record.first_version)
+            stop = len(record) if to_version is None else max(0, min(len(record), to_version - record.first_version + 1))
+            if start < stop:
+                batches.append(list(zip(record.event_types[start:stop], self.__parse(record)[start:stop])))
+        keys = await fetch if fetch is not None else {}
+        return [event for batch in batches for event in decode_records(batch, keys)]
+
+    async def get_events_for_aggregate(self, aggregate_id : str, from_version : int = 0, to_version : int | None = None) -> list[IEvent]:
+        records = self.__records_from(aggregate_id, from_version)
+        if to_version is not None:
+            records = [record for record in records if record.first_version <= to_version]
+        return await self.__decode(records, from_version, to_version)
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        records = self.records.get(aggregate_id)
+        if not records:
+            return -1
+        index = bisect_right(records, timestamp, key=lambda record: record.recorded_at)
+        return records[index - 1].last_version if index else records[0].first_version - 1
+
+    async def get_events_for_aggregates(self, aggregate_ids : list[str], max_concurrency : int = 8, from_versions : dict[str, int] | None = None) -> dict[str, list[IEvent]]:
+        from_versions = from_versions or {}
+        res = {}
+        for aggregate_id in dict.fromkeys(aggregate_ids):
+            events = await self.get_events_for_aggregate(aggregate_id, from_versions.get(aggregate_id, 0))
+            if events:
+                res[aggregate_id] = events
+        return res
+
+    async def get_event(self, aggregate_id : str, version : int) -> IEvent | None:
+        """Get the event of a stream at `version`, decoding only the record holding it."""
+        if version < 0 or version > self.__head_version(aggregate_id):
+            return None
+        records = self.__records_from(aggregate_id, version)
+        events = await self.__decode(records[:1], version, version)
+        return events[0] if events else None
+
+    async def get_stream_ids(self) -> list[str]:
+        return list(self.records)
+
+    async def get_event_descriptors(self, aggregate_id : str) -> list[EventDescriptor]:
+        res = []
+        for record in self.records.get(aggregate_id, []):
+            for n, (event_type, values) in enumerate(zip(record.event_types, self.__parse(record))):
+                subject_id = record.subject_ids[0] if len(record.subject_ids) == 1 else None
+                event_id = record.event_ids[n] if record.event_ids is not None else None
+                res.append(EventDescriptor(aggregate_id, event_type, json.dumps(values), record.first_version + n, None, record.recorded_at, record.position, event_id, subject_id))
+        return res
@@ -0,0 +1,56 @@
+import math
+import hashlib
+from typing import Iterable
+
+class BloomFilter:
+    """
+    Probabilistic set of strings answering "definitely absent" or "possibly present".
+
+    The filter is sized for `capacity` keys at a `false_positive_rate` chance of
+    reporting an absent key as present; adding more keys than its capacity raises that
+    rate. Keys cannot be removed.
+    """
+
+    def __init__(self, capacity : int, false_positive_rate : float = 0.01) -> None:
+        """
+        Args:
+            capacity (int): Number of keys the filter is sized for.
+            false_positive_rate (float): Chance of a false positive once `capacity` keys are added.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def __indexes(self, key : str) -> Iterable[int]:
+        # Double hashing: the k indexes are h1 + i * h2 of one 128-bit digest.
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key : str) -> None:
+        for index in self.__indexes(key):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def update(self, keys : Iterable[str]) -> None:
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key : str) -> bool:
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self.__indexes(key))
+
+    def clear(self) -> None:
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
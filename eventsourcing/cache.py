@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Optional
+from .event import IEvent
+from .encryption import CryptoRepository, get_subject_id
+
+class DecodedEventCache:
+    """
+    Memory-bounded LRU cache of decoded events keyed by (stream ID, version).
+
+    Stored events never change once written, so a decoded event can be shared by every
+    reader of the same store. Entries belonging to a subject are evicted as soon as its
+    encryption key is deleted through `CryptoRepository`, so shredded data is never
+    served from memory. Cached events are shared objects and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: Optional[int] = None) -> None:
+        """
+        Args:
+            max_entries (int): Maximum number of decoded events kept.
+            max_bytes (Optional[int]): Optional bound on the summed encoded size of the cached events.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__size = 0
+        self.__entries : OrderedDict[tuple[str, int], tuple[IEvent, int, Optional[str]]] = OrderedDict()
+        self.__by_subject : dict[str, set[tuple[str, int]]] = {}
+        self.__by_stream : dict[str, set[int]] = {}
+        CryptoRepository.on_key_deleted(self.evict_subject)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key: tuple[str, int]) -> bool:
+        return key in self.__entries
+
+    @property
+    def size(self) -> int:
+        """Summed encoded size of the cached events."""
+        return self.__size
+
+    @property
+    def hit_rate(self) -> float:
+        """Ratio of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, stream_id: str, version: int) -> Optional[IEvent]:
+        """Return the cached event and mark it as recently used, or None on a miss."""
+        key = (stream_id, version)
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, stream_id: str, version: int, event: IEvent, size: int = 0) -> None:
+        """Cache a decoded event; `size` is the length of its encoded form."""
+        key = (stream_id, version)
+        if key in self.__entries:
+            self.__remove(key)
+        subject_id = get_subject_id(event)
+        self.__entries[key] = (event, size, subject_id)
+        self.__size += size
+        if subject_id is not None:
+            self.__by_subject.setdefault(subject_id, set()).add(key)
+        self.__by_stream.setdefault(stream_id, set()).add(version)
+        while len(self.__entries) > self.max_entries or (self.max_bytes is not None and self.__size > self.max_bytes and len(self.__entries) > 1):
+            self.__remove(next(iter(self.__entries)))
+            self.evictions += 1
+
+    def evict_subject(self, subject_id: str) -> None:
+        """Drop every cached event encrypted with the key of `subject_id`."""
+        for key in self.__by_subject.pop(subject_id, set()):
+            self.__remove(key)
+
+    def evict_stream(self, stream_id: str) -> None:
+        """Drop every cached event of a stream."""
+        for version in self.__by_stream.pop(stream_id, set()):
+            self.__remove((stream_id, version))
+
+    def clear(self) -> None:
+        """Drop every entry and reset the statistics."""
+        self.__entries.clear()
+        self.__by_subject.clear()
+        self.__by_stream.clear()
+        self.__size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters."""
+        return {"entries": len(self.__entries), "size": self.__size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_rate": self.hit_rate}
+
+    def __remove(self, key: tuple[str, int]) -> None:
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return
+        _, size, subject_id = entry
+        self.__size -= size
+        versions = self.__by_stream.get(key[0])
+        if versions is not None:
+            versions.discard(key[1])
+            if not versions:
+                del self.__by_stream[key[0]]
+        if subject_id is not None:
+            keys = self.__by_subject.get(subject_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.__by_subject[subject_id]
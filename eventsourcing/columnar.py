@@ -0,0 +1,143 @@
+from array import array
+from dataclasses import dataclass, field, fields
+from typing import Any, AsyncIterator, get_type_hints
+from .event_stores import IEventStore, EventDescriptor, get_event_class
+from .upcasting import upcasters
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+ARRAY = "array"
+NUMPY = "numpy"
+ARROW = "arrow"
+
+_TYPECODES = {bool : "b", int : "q", float : "d"}
+_NUMPY_DTYPES = {bool : "bool", int : "int64", float : "float64"}
+
+def _resolve_type(field_type : Any) -> Any:
+    while hasattr(field_type, "__supertype__"):
+        field_type = field_type.__supertype__
+    return field_type
+
+def _default_backend() -> str:
+    if pyarrow is not None:
+        return ARROW
+    if numpy is not None:
+        return NUMPY
+    return ARRAY
+
+@dataclass
+class ColumnBatch:
+    """
+    A batch of events of one type laid out as one array per dataclass field.
+
+    Columns of `int`, `float` and `bool` fields are typed arrays of the selected backend
+    (`array.array`, `numpy.ndarray` or `pyarrow.Array`); other fields, and fields holding
+    values of another type such as still encrypted members, are lists, object arrays or
+    inferred Arrow arrays.
+    """
+    event_type : str
+    stream_ids : list[str]
+    versions : Any
+    recorded_at : Any
+    columns : dict[str, Any] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.stream_ids)
+
+    def to_arrow(self) -> "pyarrow.RecordBatch":
+        """Convert the batch to an Arrow record batch."""
+        if pyarrow is None:
+            raise ImportError("The pyarrow package is required to convert to Arrow")
+        names = ["stream_id", "version", "recorded_at", *self.columns]
+        values = [self.stream_ids, self.versions, self.recorded_at, *self.columns.values()]
+        return pyarrow.RecordBatch.from_arrays([v if isinstance(v, pyarrow.Array) else pyarrow.array(list(v)) for v in values], names=names)
+
+class _ColumnBuilder:
+    def __init__(self, event_type : str, field_types : dict[str, Any], backend : str) -> None:
+        self.event_type = event_type
+        self.field_types = field_types
+        self.backend = backend
+        self.stream_ids : list[str] = []
+        self.versions : list[int] = []
+        self.recorded_at : list[float] = []
+        self.values : dict[str, list] = {name : [] for name in field_types}
+
+    def __len__(self) -> int:
+        return len(self.stream_ids)
+
+    def add(self, desc : EventDescriptor, values : dict) -> None:
+        self.stream_ids.append(desc.id)
+        self.versions.append(desc.version)
+        self.recorded_at.append(desc.recorded_at)
+        for name, column in self.values.items():
+            column.append(values.get(name))
+
+    def build(self) -> ColumnBatch:
+        batch = ColumnBatch(self.event_type, self.stream_ids, self.__column(int, self.versions), self.__column(float, self.recorded_at))
+        for name, values in self.values.items():
+            batch.columns[name] = self.__column(self.field_types[name], values)
+        return batch
+
+    def __column(self, field_type : Any, values : list) -> Any:
+        typed = field_type in _TYPECODES and all(type(value) is field_type or (field_type is float and type(value) is int) for value in values)
+        if self.backend == ARROW:
+            return pyarrow.array(values) if not typed else pyarrow.array(values, type={bool : pyarrow.bool_(), int : pyarrow.int64(), float : pyarrow.float64()}[field_type])
+        if self.backend == NUMPY:
+            return numpy.array(values, dtype=_NUMPY_DTYPES[field_type] if typed else object)
+        if typed:
+            return array(_TYPECODES[field_type], values)
+        return values
+
+async def scan_columns(event_store : IEventStore, event_type : str, stream_ids : list[str] | None = None, batch_size : int = 10_000, decrypt : bool = False, backend : str | None = None) -> AsyncIterator[ColumnBatch]:
+    """
+    Scan every event of one type and yield it as columnar batches.
+
+    Without decryption, payloads are only parsed: encrypted members are returned as
+    their ciphertext and no `from_dict` call or key lookup is made.
+
+    Args:
+        event_store (IEventStore): Store exposing its streams and records.
+        event_type (str): Type of the scanned events.
+        stream_ids (list[str] | None): Streams to scan, every stream of the store by default.
+        batch_size (int): Maximum number of events per batch.
+        decrypt (bool): Decode the events through `from_dict`, decrypting their encrypted members.
+        backend (str | None): `"arrow"`, `"numpy"` or `"array"`; the first one installed by default.
+    """
+    backend = backend or _default_backend()
+    if backend == ARROW and pyarrow is None:
+        raise ImportError("The pyarrow package is required for the arrow backend")
+    if backend == NUMPY and numpy is None:
+        raise ImportError("The numpy package is required for the numpy backend")
+    if backend not in (ARRAY, NUMPY, ARROW):
+        raise ValueError(f"Unknown columnar backend '{backend}'")
+
+    cls = get_event_class(event_type)
+    hints = get_type_hints(cls)
+    encrypted_members = set(getattr(cls, "__encrypted_members__", [])) if not decrypt else set()
+    field_types = {f.name : str if f.name in encrypted_members else _resolve_type(hints.get(f.name, Any)) for f in fields(cls)}
+
+    if stream_ids is None:
+        descriptors = await event_store.get_event_descriptors_by_type(event_type)
+    else:
+        descriptors = [desc for stream_id in stream_ids for desc in await event_store.get_event_descriptors(stream_id) if desc.event_type == event_type]
+
+    builder = _ColumnBuilder(event_type, field_types, backend)
+    for desc in descriptors:
+        values = upcasters.upcast(event_type, event_store.read_payload(desc))
+        if decrypt:
+            event = cls.from_dict(values)
+            values = {f.name : getattr(event, f.name) for f in fields(cls)}
+        builder.add(desc, values)
+        if len(builder) >= batch_size:
+            yield builder.build()
+            builder = _ColumnBuilder(event_type, field_types, backend)
+    if len(builder):
+        yield builder.build()
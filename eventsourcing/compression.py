@@ -0,0 +1,164 @@
+import re
+import zlib
+import hashlib
+from collections import Counter
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+def train_dictionary(samples : list[bytes], size : int = 2048) -> bytes:
+    """
+    Build a raw preset dictionary from sample payloads.
+
+    JSON event payloads share their keys, separators and the prefix of every encrypted
+    value. Those fragments are ranked by how many samples contain them and the most
+    common ones are placed at the end of the dictionary, where zlib and zstd reach
+    them with the shortest distances. The most recent sample is appended last so the
+    usual key order is matched as a whole.
+    """
+    if not samples:
+        raise ValueError("At least one sample is needed to train a dictionary")
+    counts : Counter[bytes] = Counter()
+    for sample in samples:
+        tokens = set()
+        for token in re.findall(rb'"[^"]*"|[^"]+', sample):
+            if len(token) > 24:
+                token = token[:16]
+            if len(token) >= 3:
+                tokens.add(token)
+        counts.update(tokens)
+    threshold = max(2, len(samples) // 4) if len(samples) > 1 else 1
+    common = [token for token, count in sorted(counts.items(), key=lambda item: (item[1], len(item[0]))) if count >= threshold]
+    dictionary = b"".join(common) + samples[-1]
+    return dictionary[-size:]
+
+class PayloadCompressor:
+    """
+    Compresses encoded event payloads with a preset dictionary per event type.
+
+    Every compressed payload is returned with a compression ID (`"zlib"`, `"zlib:<dict>"`,
+    `"zstd:<dict>"`) that must be stored next to it so it can be decompressed later,
+    whatever the compressor configuration is at that time. Dictionaries are identified by
+    a hash of their content, so they can be persisted and registered again on startup.
+    """
+
+    def __init__(self, codec : Optional[str] = None, level : int = 6, min_size : int = 64, train_after : Optional[int] = 128, dictionary_size : int = 2048) -> None:
+        """
+        Args:
+            codec (Optional[str]): `"zlib"` or `"zstd"`; zstd is used by default when the `zstandard` package is installed.
+            level (int): Compression level passed to the codec.
+            min_size (int): Payloads shorter than this are stored uncompressed.
+            train_after (Optional[int]): Number of payloads of an event type to collect before training its dictionary, None to disable training.
+            dictionary_size (int): Size in bytes of the trained dictionaries.
+        """
+        if codec is None:
+            codec = ZSTD if zstandard is not None else ZLIB
+        if codec not in (ZLIB, ZSTD):
+            raise ValueError(f"Unknown compression codec '{codec}'")
+        if codec == ZSTD and zstandard is None:
+            raise ImportError("The zstandard package is required for zstd compression")
+        self.codec = codec
+        self.level = level
+        self.min_size = min_size
+        self.train_after = train_after
+        self.dictionary_size = dictionary_size
+        self.__dictionaries : dict[str, bytes] = {}
+        self.__type_dictionaries : dict[str, str] = {}
+        self.__samples : dict[str, list[bytes]] = {}
+        self.__zstd_dicts : dict[str, "zstandard.ZstdCompressionDict"] = {}
+
+    @property
+    def dictionaries(self) -> dict[str, bytes]:
+        """Every registered dictionary by ID, to be persisted next to the store."""
+        return dict(self.__dictionaries)
+
+    def dictionary_for(self, event_type : str) -> Optional[str]:
+        """ID of the dictionary used to compress an event type, if any."""
+        return self.__type_dictionaries.get(event_type)
+
+    def add_dictionary(self, dictionary : bytes, event_type : Optional[str] = None) -> str:
+        """Register a dictionary, optionally making it the one used for `event_type`, and return its ID."""
+        dictionary_id = hashlib.blake2b(dictionary, digest_size=6).hexdigest()
+        self.__dictionaries[dictionary_id] = dictionary
+        if event_type is not None:
+            self.__type_dictionaries[event_type] = dictionary_id
+        return dictionary_id
+
+    def train(self, event_type : str, samples : list[bytes]) -> str:
+        """Train and register the dictionary of an event type from sample payloads."""
+        self.__samples.pop(event_type, None)
+        return self.add_dictionary(self.__train(samples), event_type)
+
+    def compress(self, event_type : str, data : bytes) -> tuple[Optional[str], bytes]:
+        """
+        Compress a payload.
+
+        Returns:
+            The compression ID and the compressed payload, or None and the untouched
+            payload when compressing would not make it smaller.
+        """
+        if len(data) < self.min_size:
+            return None, data
+        dictionary_id = self.__type_dictionaries.get(event_type)
+        if dictionary_id is None and self.train_after is not None:
+            samples = self.__samples.setdefault(event_type, [])
+            samples.append(data)
+            if len(samples) >= self.train_after:
+                dictionary_id = self.train(event_type, samples)
+
+        if self.codec == ZSTD and dictionary_id is not None:
+            compression = f"{ZSTD}:{dictionary_id}"
+            compressed = zstandard.ZstdCompressor(level=self.level, dict_data=self.__zstd_dict(dictionary_id)).compress(data)
+        elif self.codec == ZSTD:
+            compression = ZSTD
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(data)
+        elif dictionary_id is not None:
+            compression = f"{ZLIB}:{dictionary_id}"
+            compressor = zlib.compressobj(self.level, zdict=self.__dictionaries[dictionary_id])
+            compressed = compressor.compress(data) + compressor.flush()
+        else:
+            compression = ZLIB
+            compressed = zlib.compress(data, self.level)
+
+        if len(compressed) >= len(data):
+            return None, data
+        return compression, compressed
+
+    def decompress(self, compression : str, data : bytes) -> bytes:
+        """Decompress a payload stored with the given compression ID."""
+        codec, _, dictionary_id = compression.partition(":")
+        if dictionary_id and dictionary_id not in self.__dictionaries:
+            raise ValueError(f"Unknown compression dictionary '{dictionary_id}'")
+        if codec == ZLIB:
+            if not dictionary_id:
+                return zlib.decompress(data)
+            decompressor = zlib.decompressobj(zdict=self.__dictionaries[dictionary_id])
+            return decompressor.decompress(data) + decompressor.flush()
+        if codec == ZSTD:
+            if zstandard is None:
+                raise ImportError("The zstandard package is required to read zstd compressed payloads")
+            if not dictionary_id:
+                return zstandard.ZstdDecompressor().decompress(data)
+            return zstandard.ZstdDecompressor(dict_data=self.__zstd_dict(dictionary_id)).decompress(data)
+        raise ValueError(f"Unknown compression codec '{codec}'")
+
+    def __train(self, samples : list[bytes]) -> bytes:
+        if self.codec == ZSTD and len(samples) >= 32:
+            try:
+                return zstandard.train_dictionary(self.dictionary_size, samples).as_bytes()
+            except zstandard.ZstdError:
+                pass
+        return train_dictionary(samples, self.dictionary_size)
+
+    def __zstd_dict(self, dictionary_id : str) -> "zstandard.ZstdCompressionDict":
+        zstd_dict = self.__zstd_dicts.get(dictionary_id)
+        if zstd_dict is None:
+            zstd_dict = zstandard.ZstdCompressionDict(self.__dictionaries[dictionary_id], dict_type=zstandard.DICT_TYPE_AUTO)
+            self.__zstd_dicts[dictionary_id] = zstd_dict
+        return zstd_dict
@@ -1,8 +1,17 @@
-from functools import wraps
-from cryptography.fernet import Fernet
+from functools import lru_cache, wraps
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+import os
 import abc
-from copy import deepcopy
-from typing import Optional, List, Type, Callable
+import base64
+import inspect
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, List, Type, Callable, Any, Dict, Iterable, Iterator
 from eventsourcing.data import Data
 
 class ICryptoStore(abc.ABC):
@@ -20,10 +29,145 @@ class ICryptoStore(abc.ABC):
     def remove(self, id: str) -> None:
         """Remove an encryption key by ID."""
 
+    def get_encryption_keys(self, ids: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """Retrieve several encryption keys at once; stores with a batch API should override this."""
+        return {id: self.get_encryption_key(id=id) for id in ids}
+
+    async def fetch_encryption_keys(self, ids: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """
+        Retrieve several encryption keys without blocking the event loop.
+
+        Stores backed by a remote service should override this to issue their requests
+        concurrently or as one batch; by default it calls `get_encryption_keys`.
+        """
+        return self.get_encryption_keys(ids=ids)
+
+KEY_SEPARATOR = b","
+
+def key_generations(key: bytes) -> List[bytes]:
+    """
+    Split a stored key into its generations, newest first.
+
+    During a key rotation the store holds the new key followed by the previous ones,
+    joined by `KEY_SEPARATOR`: payloads are encrypted with the newest key and decrypted
+    with whichever generation encrypted them.
+    """
+    return key.split(KEY_SEPARATOR)
+
+def _cipher(key: bytes) -> Fernet | MultiFernet:
+    generations = key_generations(key)
+    if len(generations) == 1:
+        return Fernet(key)
+    return MultiFernet([Fernet(generation) for generation in generations])
+
+FERNET = "fernet"
+AES_GCM = "aes-gcm"
+CHACHA20_POLY1305 = "chacha20-poly1305"
+
+# Every encrypted value starts with the tag of the cipher suite that produced it.
+_FERNET_TAG = "encrypted_"
+_AEAD_TAGS = {AES_GCM : "$g1$", CHACHA20_POLY1305 : "$c1$"}
+_AEAD_TYPES = {AES_GCM : AESGCM, CHACHA20_POLY1305 : ChaCha20Poly1305}
+_NONCE_SIZE = 12
+
+@lru_cache(maxsize=1024)
+def _aead(generation: bytes, cipher: str) -> AESGCM | ChaCha20Poly1305:
+    # The stored key is a Fernet key; each suite gets its own 256-bit key derived from it.
+    material = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=f"eventsourcing {cipher}".encode("ascii")).derive(base64.urlsafe_b64decode(generation))
+    return _AEAD_TYPES[cipher](material)
+
+def _value_cipher(value: str) -> Optional[str]:
+    if value.startswith(_FERNET_TAG):
+        return FERNET
+    for cipher, tag in _AEAD_TAGS.items():
+        if value.startswith(tag):
+            return cipher
+    return None
+
+def _encryptor(key: bytes, cipher: str) -> Callable[[bytes, bytes], str]:
+    """Get a function encrypting a plaintext bound to associated data with the newest generation of `key`."""
+    if cipher == FERNET:
+        fernet = _cipher(key)
+        return lambda plaintext, associated_data: _FERNET_TAG + fernet.encrypt(plaintext).decode()
+    aead = _aead(key_generations(key)[0], cipher)
+    tag = _AEAD_TAGS[cipher]
+
+    def encrypt(plaintext: bytes, associated_data: bytes) -> str:
+        nonce = os.urandom(_NONCE_SIZE)
+        return tag + base64.urlsafe_b64encode(nonce + aead.encrypt(nonce, plaintext, associated_data)).rstrip(b"=").decode("ascii")
+    return encrypt
+
+def _decryptor(key: bytes) -> Callable[[str, bytes], bytes]:
+    """Get a function decrypting a value of any cipher suite encrypted with any generation of `key`."""
+    fernet = None
+
+    def decrypt(value: str, associated_data: bytes) -> bytes:
+        nonlocal fernet
+        cipher = _value_cipher(value)
+        if cipher is None or cipher == FERNET:
+            if fernet is None:
+                fernet = _cipher(key)
+            return fernet.decrypt(value.removeprefix(_FERNET_TAG))
+        data = value[len(_AEAD_TAGS[cipher]):]
+        data = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        for generation in key_generations(key):
+            try:
+                return _aead(generation, cipher).decrypt(data[:_NONCE_SIZE], data[_NONCE_SIZE:], associated_data)
+            except InvalidTag:
+                continue
+        raise InvalidTag()
+    return decrypt
+
+def _associated_data(subject: Any, member: str) -> bytes:
+    # Binds each value to its subject and member, so values cannot be swapped between them.
+    return f"{subject}/{member}".encode("utf-8")
+
+class _Ciphertext:
+    """Stored value of an encrypted member, with what it takes to decrypt it."""
+    __slots__ = ("value", "key", "associated_data")
+
+    def __init__(self, value: str, key: bytes, associated_data: bytes) -> None:
+        self.value = value
+        self.key = key
+        self.associated_data = associated_data
+
+    def decrypt(self) -> str:
+        return _decryptor(self.key)(self.value, self.associated_data).decode('utf-8')
+
+class _EncryptedMember:
+    """
+    Data descriptor of an encrypted member, decrypting its stored value on first read.
+
+    Decoded instances hold a `_Ciphertext` in their `__dict__` until the member is read,
+    then the converted plaintext replaces it.
+    """
+    __slots__ = ("name", "field_type")
+
+    def __init__(self, name: str, field_type: Any) -> None:
+        self.name = name
+        self.field_type = field_type
+
+    def __get__(self, instance: Any, owner: Any = None) -> Any:
+        if instance is None:
+            return self
+        try:
+            value = instance.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+        if type(value) is _Ciphertext:
+            value = instance.__dict__[self.name] = self.field_type(value.decrypt())
+        return value
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        instance.__dict__[self.name] = value
+
+_preloaded_keys: ContextVar[Optional[Dict[str, Optional[bytes]]]] = ContextVar("preloaded_keys", default=None)
+
 class CryptoRepository:
     """Repository for managing encryption keys."""
 
     crypto_store: ICryptoStore
+    key_deleted_listeners: List[Callable[[], Optional[Callable[[str], None]]]] = []
 
     @staticmethod
     def get_existing_or_new(id: str) -> bytes:
@@ -40,24 +184,140 @@ class CryptoRepository:
     @staticmethod
     def get_existing_or_none(id: str) -> Optional[bytes]:
         """Get an existing key or return None if not found."""
+        preloaded = _preloaded_keys.get()
+        if preloaded is not None and id in preloaded:
+            return preloaded[id]
         return CryptoRepository.crypto_store.get_encryption_key(id=id)
 
+    @staticmethod
+    def get_existing_or_none_many(ids: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """Get the existing keys of several subjects with a single store call."""
+        return CryptoRepository.crypto_store.get_encryption_keys(ids=list(ids))
+
+    @staticmethod
+    async def fetch_existing_or_none_many(ids: Iterable[str]) -> Dict[str, Optional[bytes]]:
+        """Get the existing keys of several subjects through the store's asynchronous fetch."""
+        return await CryptoRepository.crypto_store.fetch_encryption_keys(ids=list(ids))
+
+    @staticmethod
+    @contextmanager
+    def preloaded_keys(keys: Dict[str, Optional[bytes]]) -> Iterator[None]:
+        """Serve key lookups for the given subjects from `keys` instead of the store while active."""
+        token = _preloaded_keys.set(keys)
+        try:
+            yield
+        finally:
+            _preloaded_keys.reset(token)
+
+    @staticmethod
+    def rotate_key(id: str) -> Optional[bytes]:
+        """
+        Make a new key the one encrypting the payloads of a subject, keeping the previous
+        generations to decrypt the payloads not re-encrypted yet.
+
+        Returns:
+            The new key, or None when the subject has no key or its key was deleted.
+        """
+        key_stored = CryptoRepository.crypto_store.get_encryption_key(id=id)
+        if key_stored is None:
+            return None
+        new_encryption_key = Fernet.generate_key()
+        CryptoRepository.crypto_store.add(id=id, new_encryption_key=new_encryption_key + KEY_SEPARATOR + key_stored)
+        return new_encryption_key
+
+    @staticmethod
+    def retire_previous_keys(id: str) -> None:
+        """Drop the previous key generations of a subject once none of its payloads uses them."""
+        key_stored = CryptoRepository.crypto_store.get_encryption_key(id=id)
+        if key_stored is not None and KEY_SEPARATOR in key_stored:
+            CryptoRepository.crypto_store.add(id=id, new_encryption_key=key_generations(key_stored)[0])
+
     @staticmethod
     def delete_encryption_key(id: str) -> None:
         """Delete an encryption key by ID."""
         CryptoRepository.crypto_store.remove(id=id)
+        _aead.cache_clear()
+        for ref in list(CryptoRepository.key_deleted_listeners):
+            listener = ref()
+            if listener is None:
+                CryptoRepository.key_deleted_listeners.remove(ref)
+            else:
+                listener(id)
+
+    @staticmethod
+    def on_key_deleted(listener: Callable[[str], None]) -> None:
+        """
+        Register a callback invoked with the subject ID each time a key is deleted.
+
+        Bound methods are held weakly so that registering does not keep their owner alive.
+        """
+        if inspect.ismethod(listener):
+            CryptoRepository.key_deleted_listeners.append(weakref.WeakMethod(listener))
+        else:
+            CryptoRepository.key_deleted_listeners.append(lambda: listener)
+
+def get_subject_id(obj: Any) -> Optional[str]:
+    """Return the subject ID of an object whose class is decorated with `encrypted`, or None."""
+    subject_id = getattr(type(obj), "__encryption_subject__", None)
+    if subject_id is None:
+        return None
+    return getattr(obj, subject_id, None)
+
+def decrypt_members(obj: Any) -> None:
+    """Decrypt every encrypted member of a decoded instance that has not been read yet."""
+    for member in getattr(type(obj), "__encrypted_members__", ()):
+        getattr(obj, member)
+
+def reencrypt_members(cls: Type[Data], values: dict, key: bytes) -> Optional[dict]:
+    """
+    Re-encrypt the encrypted members of a payload of `cls` with the newest generation of
+    `key` and the cipher suite of `cls`.
+
+    Returns:
+        The new payload, or None when every member is already encrypted that way.
+    """
+    cipher = cls.__encryption_cipher__
+    subject = values[cls.__encryption_subject__]
+    decrypt_newest = _decryptor(key_generations(key)[0])
+    decrypt = _decryptor(key)
+    encrypt = _encryptor(key, cipher)
+    res = None
+    for member in cls.__encrypted_members__:
+        value = str(values[member])
+        associated_data = _associated_data(subject, member)
+        if _value_cipher(value) == cipher:
+            try:
+                decrypt_newest(value, associated_data)
+                continue
+            except (InvalidToken, InvalidTag):
+                pass
+        plaintext = decrypt(value, associated_data)
+        if res is None:
+            res = dict(values)
+        res[member] = encrypt(plaintext, associated_data)
+    return res
 
-def encrypted(subject_id: str, encrypted_members: List[str]) -> Callable:
+def encrypted(subject_id: str, encrypted_members: List[str], cipher: str = FERNET) -> Callable:
     """
     Decorator for encrypting specified members of a Data class.
+
+    Values are stored as strings tagged with their cipher suite, so changing `cipher`
+    keeps the values written with the previous one readable. Decoded instances decrypt
+    each member the first time it is read, so readers of other members do no crypto work;
+    the key is resolved when decoding, so a key deleted afterwards does not hide them.
     
     Args:
         subject_id (str): The ID field used for encryption key lookup.
         encrypted_members (List[str]): List of member names to be encrypted.
+        cipher (str): `FERNET`, or the faster and more compact AEAD suites `AES_GCM` and
+            `CHACHA20_POLY1305`, whose values are bound to their subject and member.
     
     Returns:
         Callable: A decorator function.
     """
+    if cipher != FERNET and cipher not in _AEAD_TAGS:
+        raise ValueError(f"Unknown cipher suite '{cipher}'")
+
     def encrypt(cls: Type[Data]) -> Type[Data]:
         if not issubclass(cls, Data):
             raise TypeError("Class must inherit from Data")
@@ -69,6 +329,12 @@ def encrypted(subject_id: str, encrypted_members: List[str]) -> Callable:
         if not_exist:
             raise AttributeError(f"{cls} does not have {', '.join(not_exist)} member(s)")
 
+        cls.__encryption_subject__ = subject_id
+        cls.__encrypted_members__ = list(encrypted_members)
+        cls.__encryption_cipher__ = cipher
+        for member in encrypted_members:
+            setattr(cls, member, _EncryptedMember(member, cls.__dict__["__dataclass_fields__"][member].type))
+
         old_to_dict = cls.to_dict
 
         @wraps(old_to_dict)
@@ -76,10 +342,18 @@ def encrypted(subject_id: str, encrypted_members: List[str]) -> Callable:
             """Overridden to_dict method to encrypt specified members."""
             res = old_to_dict(self)
             encryption_key = CryptoRepository.get_existing_or_new(res[subject_id])
-            fernet = Fernet(encryption_key)
+            encrypt_value = _encryptor(encryption_key, cipher)
 
             for member_name in encrypted_members:
-                res[member_name] = "encrypted_" + fernet.encrypt(str(res[member_name]).encode('utf-8')).decode()
+                value = res[member_name]
+                associated_data = _associated_data(res[subject_id], member_name)
+                if type(value) is _Ciphertext:
+                    # A member never read since decoding keeps its stored value when nothing changed.
+                    if value.key == encryption_key and value.associated_data == associated_data and _value_cipher(value.value) == cipher:
+                        res[member_name] = value.value
+                        continue
+                    value = value.decrypt()
+                res[member_name] = encrypt_value(str(value).encode('utf-8'), associated_data)
             return res
 
         cls.to_dict = new_to_dict
@@ -88,18 +362,15 @@ def encrypted(subject_id: str, encrypted_members: List[str]) -> Callable:
 
         @wraps(old_from_dict)
         def new_from_dict(dict_values: dict) -> Data:
-            """Overridden from_dict method to decrypt specified members."""
+            """Overridden from_dict method deferring the decryption of specified members to their first read."""
             encryption_key = CryptoRepository.get_existing_or_none(dict_values[subject_id])
 
             if encryption_key is None:
                 return old_from_dict(dict_values)
 
-            fernet = Fernet(encryption_key)
-            new_dict = deepcopy(dict_values)
+            new_dict = dict(dict_values)
             for member in encrypted_members:
-                field_type = cls.__dict__["__dataclass_fields__"][member].type
-                decrypted_value = fernet.decrypt(str(dict_values[member]).removeprefix("encrypted_")).decode('utf-8')
-                new_dict[member] = field_type(decrypted_value)
+                new_dict[member] = _Ciphertext(str(dict_values[member]), encryption_key, _associated_data(dict_values[subject_id], member))
 
             return old_from_dict(new_dict)
 
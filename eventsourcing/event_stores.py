@@ -1,17 +1,270 @@
 import abc
 import sys
 import json
+import asyncio
+import time
+import base64
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Iterable
 from .event import IEvent
-from .exceptions import ConcurrencyError
+from .exceptions import ArgumentError, ConcurrencyError
+from .cache import DecodedEventCache
+from .compression import PayloadCompressor
+from .encryption import CryptoRepository, decrypt_members, get_subject_id
+from .outbox import Outbox
+from .idempotency import DedupIndex
+from .upcasting import upcasters
 
 
+@dataclass
+class PendingAppend:
+    """
+    The arguments of one `save_events` call, gathered with others to be written in one batch.
+    """
+    aggregate_id : str
+    events : list[IEvent]
+    expected_version : int
+    event_ids : list[str] | None = None
+
 class IEventStore(abc.ABC):
+    event_cache : DecodedEventCache | None = None
+    compressor : PayloadCompressor | None = None
+    decode_executor : Executor | None = None
+    inline_decode_threshold : int = 256
+    decode_batch_size : int = 512
+
     @abc.abstractmethod
-    async def save_events(self, aggregate_id : str, events : list[IEvent], expected_version : int) -> None:...
+    async def save_events(self, aggregate_id : str, events : list[IEvent], expected_version : int, event_ids : list[str] | None = None) -> None:...
 
     @abc.abstractmethod
-    async def get_events_for_aggregate(self, aggregate_id : str) -> list[IEvent]:...
-    
+    async def get_events_for_aggregate(self, aggregate_id : str, from_version : int = 0, to_version : int | None = None) -> list[IEvent]:...
+
+    async def save_events_batch(self, appends : list[PendingAppend]) -> list[Exception | None]:
+        """
+        Write several appends, each checked against its own expected version, and return
+        the error of each one or None when it succeeded. Durable stores override this to
+        write the whole batch in a single transaction.
+        """
+        res : list[Exception | None] = []
+        for append in appends:
+            try:
+                await self.save_events(append.aggregate_id, append.events, append.expected_version, append.event_ids)
+                res.append(None)
+            except Exception as e:
+                res.append(e)
+        return res
+
+    async def get_stream_start(self, aggregate_id : str) -> int:
+        return 0
+
+    async def get_stream_starts(self, aggregate_ids : list[str]) -> dict[str, int]:
+        """Get the first version kept in each of several streams; durable stores answer with one query."""
+        aggregate_ids = list(dict.fromkeys(aggregate_ids))
+        return dict(zip(aggregate_ids, await asyncio.gather(*(self.get_stream_start(aggregate_id) for aggregate_id in aggregate_ids))))
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        """Get the last version of a stream recorded at or before `timestamp`, or -1 when there is none."""
+        descs = await self.get_event_descriptors(aggregate_id)
+        index = bisect_right(descs, timestamp, key=lambda desc: desc.recorded_at)
+        return descs[index - 1].version if index else -1
+
+    async def get_stream_ids(self) -> list[str]:
+        raise NotImplementedError(f"{self.__class__.__name__} cannot list its streams")
+
+    async def get_event_descriptors(self, aggregate_id : str) -> list["EventDescriptor"]:
+        raise NotImplementedError(f"{self.__class__.__name__} does not expose its records")
+
+    async def truncate_stream(self, aggregate_id : str, before_version : int) -> int:
+        raise NotImplementedError(f"{self.__class__.__name__} does not support truncation")
+
+    async def append_descriptors(self, aggregate_id : str, descriptors : list["EventDescriptor"], expected_version : int) -> None:
+        raise NotImplementedError(f"{self.__class__.__name__} does not accept encoded records")
+
+    async def append_descriptors_batch(self, appends : list[tuple[str, list["EventDescriptor"], int]]) -> None:
+        """
+        Append the records of several streams, in order; durable stores write them in one transaction.
+
+        Args:
+            appends (list[tuple[str, list[EventDescriptor], int]]): Stream ID, records and expected version of each append.
+        """
+        for aggregate_id, descriptors, expected_version in appends:
+            await self.append_descriptors(aggregate_id, descriptors, expected_version)
+
+    async def replace_payloads(self, aggregate_id : str, descriptors : list["EventDescriptor"], payloads : list[dict]) -> None:
+        """
+        Atomically replace the payloads of stored events, keeping everything else about them.
+
+        Args:
+            aggregate_id (str): Stream of the events.
+            descriptors (list[EventDescriptor]): The events as they were read.
+            payloads (list[dict]): New payload of each event, encoded as the store encodes new events.
+
+        Raises:
+            ConcurrencyError: When any of the events is no longer stored as it was read;
+                no payload is replaced then.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support rewriting payloads")
+
+    async def get_stream_ids_by_category(self, category : str) -> list[str]:
+        return [stream_id for stream_id in await self.get_stream_ids() if stream_category(stream_id) == category]
+
+    async def get_event_descriptors_by_type(self, event_type : str) -> list["EventDescriptor"]:
+        res = []
+        for stream_id in await self.get_stream_ids():
+            res.extend(desc for desc in await self.get_event_descriptors(stream_id) if desc.event_type == event_type)
+        return res
+
+    async def get_events_by_type(self, event_type : str) -> list[IEvent]:
+        return [self._decode_event(desc) for desc in await self.get_event_descriptors_by_type(event_type)]
+
+    async def get_events_for_aggregates(self, aggregate_ids : list[str], max_concurrency : int = 8, from_versions : dict[str, int] | None = None) -> dict[str, list[IEvent]]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        from_versions = from_versions or {}
+
+        async def read(aggregate_id : str) -> list[IEvent]:
+            async with semaphore:
+                return await self.get_events_for_aggregate(aggregate_id, from_versions.get(aggregate_id, 0))
+
+        aggregate_ids = list(dict.fromkeys(aggregate_ids))
+        results = await asyncio.gather(*(read(aggregate_id) for aggregate_id in aggregate_ids))
+        return {aggregate_id : events for aggregate_id, events in zip(aggregate_ids, results) if events}
+
+    async def _decode_streams(self, streams : dict[str, list["EventDescriptor"]], max_concurrency : int = 8) -> dict[str, list[IEvent]]:
+        # Keys of the subjects recorded on the descriptors are fetched while the payloads
+        # are read; subjects only found in older payloads are fetched afterwards.
+        decoded : dict[str, list[IEvent | None]] = {}
+        pending : dict[str, list[tuple[int, "EventDescriptor"]]] = {}
+        for stream_id, descs in streams.items():
+            events = [self.event_cache.get(desc.id, desc.version) if self.event_cache is not None else None for desc in descs]
+            decoded[stream_id] = events
+            pending[stream_id] = [(n, desc) for n, desc in enumerate(descs) if events[n] is None]
+        subject_ids = {desc.subject_id for items in pending.values() for _, desc in items if desc.subject_id is not None}
+        fetch = asyncio.ensure_future(CryptoRepository.fetch_existing_or_none_many(subject_ids)) if subject_ids else None
+        if fetch is not None:
+            await asyncio.sleep(0)
+
+        count = sum(len(items) for items in pending.values())
+        offload = self.decode_executor is not None and count >= self.inline_decode_threshold
+        records : dict[str, list[tuple[str, str | bytes | dict]]] = {}
+        late_subject_ids : set[str] = set()
+        try:
+            for stream_id, items in pending.items():
+                records[stream_id] = []
+                for _, desc in items:
+                    if offload and len(records[stream_id]) % self.decode_batch_size == 0:
+                        # Large reads yield while they are prepared to keep the loop responsive.
+                        await asyncio.sleep(0)
+                    payload = self._read_payload_text(desc)
+                    if desc.subject_id is None:
+                        subject_field = getattr(get_event_class(desc.event_type), "__encryption_subject__", None)
+                        if subject_field is not None:
+                            payload = json.loads(payload)
+                            if payload.get(subject_field) is not None and payload[subject_field] not in subject_ids:
+                                late_subject_ids.add(payload[subject_field])
+                    records[stream_id].append((desc.event_type, payload))
+        except BaseException:
+            if fetch is not None:
+                fetch.cancel()
+            raise
+
+        keys = await fetch if fetch is not None else {}
+        if late_subject_ids:
+            keys = {**keys, **await CryptoRepository.fetch_existing_or_none_many(late_subject_ids)}
+
+        if offload:
+            results = await self.__decode_in_executor(records, keys)
+        else:
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def decode(stream_records : list[tuple[str, str | bytes | dict]]) -> list[IEvent]:
+                async with semaphore:
+                    await asyncio.sleep(0)
+                    return decode_records(stream_records, keys)
+
+            results = dict(zip(records, await asyncio.gather(*(decode(stream_records) for stream_records in records.values()))))
+
+        for stream_id, items in pending.items():
+            events = decoded[stream_id]
+            for (n, desc), event in zip(items, results[stream_id]):
+                events[n] = event
+                if self.event_cache is not None:
+                    self.event_cache.put(desc.id, desc.version, event, len(desc.event_data))
+        return decoded
+
+    async def __decode_in_executor(self, records : dict[str, list[tuple[str, str | bytes | dict]]], keys : dict[str, bytes | None]) -> dict[str, list[IEvent]]:
+        flat = [record for stream_records in records.values() for record in stream_records]
+        loop = asyncio.get_running_loop()
+        size = self.decode_batch_size
+        batches = await asyncio.gather(*(loop.run_in_executor(self.decode_executor, decode_records, flat[i:i + size], keys, True) for i in range(0, len(flat), size)))
+        events = iter(event for batch in batches for event in batch)
+        return {stream_id : [next(events) for _ in stream_records] for stream_id, stream_records in records.items()}
+
+    def _encode_payload(self, event : IEvent) -> tuple[str | bytes, str | None]:
+        return self._encode_values(event.type, upcasters.stamp(event.type, event.to_dict()))
+
+    def _encode_values(self, event_type : str, values : dict) -> tuple[str | bytes, str | None]:
+        data = json.dumps(values)
+        if self.compressor is None:
+            return data, None
+        compression, compressed = self.compressor.compress(event_type, data.encode("utf-8"))
+        if compression is None:
+            return data, None
+        return compressed, compression
+
+    def read_payload(self, desc : "EventDescriptor") -> dict:
+        """Get the stored values of a record as they were written: decompressed, but neither upcast nor decrypted."""
+        return self._read_payload(desc)
+
+    def _read_payload(self, desc : "EventDescriptor") -> dict:
+        return json.loads(self._read_payload_text(desc))
+
+    def _read_payload_text(self, desc : "EventDescriptor") -> str | bytes:
+        if desc.compression is None:
+            return desc.event_data
+        if self.compressor is None:
+            raise ValueError(f"Event {desc.id}@{desc.version} is compressed with '{desc.compression}' but the store has no compressor")
+        return self.compressor.decompress(desc.compression, desc.event_data)
+
+    def _decode_event(self, desc : "EventDescriptor") -> IEvent:
+        if self.event_cache is None:
+            return get_event_class(desc.event_type).from_dict(upcasters.upcast(desc.event_type, self._read_payload(desc)))
+        event = self.event_cache.get(desc.id, desc.version)
+        if event is None:
+            event = get_event_class(desc.event_type).from_dict(upcasters.upcast(desc.event_type, self._read_payload(desc)))
+            self.event_cache.put(desc.id, desc.version, event, len(desc.event_data))
+        return event
+
+
+def decode_records(records : list[tuple[str, str | bytes | dict]], keys : dict[str, bytes | None], decrypt : bool = False) -> list[IEvent]:
+    """
+    Decode `(event type, JSON payload)` records, decrypting with the given keys only.
+    Payloads of older schema versions are upcast first.
+
+    Runs on the event loop for small reads and in the decode executor of the store for
+    large ones, where it must not touch any state of the store.
+
+    Args:
+        decrypt (bool): Decrypt the encrypted members before returning, rather than when
+            they are first read; the executor sets it so the crypto work stays off the loop.
+    """
+    classes : dict[str, type[IEvent]] = {}
+    res = []
+    with CryptoRepository.preloaded_keys(keys):
+        for event_type, payload in records:
+            cls = classes.get(event_type)
+            if cls is None:
+                cls = classes[event_type] = get_event_class(event_type)
+            event = cls.from_dict(upcasters.upcast(event_type, payload if isinstance(payload, dict) else json.loads(payload)))
+            if decrypt:
+                decrypt_members(event)
+            res.append(event)
+    return res
+
+def stream_category(stream_id : str) -> str:
+    return stream_id.split("-", 1)[0]
 
 def get_event_class(class_name) -> type[IEvent]:
     for module in sys.modules.values():
@@ -23,20 +276,46 @@ def get_event_class(class_name) -> type[IEvent]:
     raise ValueError(f"Class '{class_name}' not found.")
 
 class EventDescriptor:
-    def __init__(self, id : str, event_type: str, event_data : str, version : int) -> None:
+    def __init__(self, id : str, event_type: str, event_data : str | bytes, version : int, compression : str | None = None, recorded_at : float | None = None, position : int | None = None, event_id : str | None = None, subject_id : str | None = None) -> None:
         self.event_type = event_type
         self.__event_data = event_data
         self.__version = version
         self.__id = id
+        self.__compression = compression
+        self.__recorded_at = time.time() if recorded_at is None else recorded_at
+        self.__position = position
+        self.__event_id = event_id
+        self.__subject_id = subject_id
 
     @property
-    def event_data(self) -> IEvent:
+    def event_data(self) -> str | bytes:
         return self.__event_data
 
+    @property
+    def compression(self) -> str | None:
+        return self.__compression
+
     @property
     def version(self) -> int:
         return self.__version
 
+    @property
+    def recorded_at(self) -> float:
+        return self.__recorded_at
+
+    @property
+    def position(self) -> int | None:
+        return self.__position
+
+    @property
+    def event_id(self) -> str | None:
+        return self.__event_id
+
+    @property
+    def subject_id(self) -> str | None:
+        """Subject whose key encrypts the payload, recorded so that keys can be fetched before payloads are parsed."""
+        return self.__subject_id
+
     @property
     def id(self) -> str:
         return self.__id
@@ -44,30 +323,251 @@ class EventDescriptor:
     def __repr__(self) -> str:
         return f"(event:{self.event_type} - version:{self.version})"
 
+    def to_record(self) -> dict:
+        record = {"stream_id" : self.id, "event_type" : self.event_type, "version" : self.version, "event_data" : self.event_data, "recorded_at" : self.recorded_at}
+        if isinstance(self.event_data, bytes):
+            record["event_data"] = base64.b64encode(self.event_data).decode("ascii")
+            record["encoding"] = "base64"
+        if self.compression is not None:
+            record["compression"] = self.compression
+        if self.position is not None:
+            record["position"] = self.position
+        if self.event_id is not None:
+            record["event_id"] = self.event_id
+        if self.subject_id is not None:
+            record["subject_id"] = self.subject_id
+        return record
+
+    @staticmethod
+    def from_record(record : dict) -> "EventDescriptor":
+        event_data = record["event_data"]
+        if record.get("encoding") == "base64":
+            event_data = base64.b64decode(event_data)
+        return EventDescriptor(record["stream_id"], record["event_type"], event_data, record["version"], record.get("compression"), record.get("recorded_at"), record.get("position"), record.get("event_id"), record.get("subject_id"))
+
 class InMemEventStore(IEventStore):
 
-    def __init__(self) -> None:
+    def __init__(self, event_cache : DecodedEventCache | None = None, compressor : PayloadCompressor | None = None, outbox : Outbox | None = None, dedup_index : DedupIndex | None = None, decode_executor : Executor | None = None, inline_decode_threshold : int = 256) -> None:
         self.current : dict[str, list[EventDescriptor]] = {}
+        self.event_cache = event_cache
+        self.compressor = compressor
+        self.decode_executor = decode_executor
+        self.inline_decode_threshold = inline_decode_threshold
+        self.outbox = outbox
+        self.dedup_index = dedup_index
+        self.position = 0
+        self.category_index : dict[str, dict[str, None]] = {}
+        self.type_index : dict[str, list[tuple[str, int]]] = {}
+        # Type index entries of truncated events, skipped when read until the index is pruned.
+        self._stale_type_entries : Counter[str] = Counter()
+        self._stream_starts : dict[str, int] = {}
 
-    async def save_events(self, aggregate_id: str, events: list[IEvent], expected_version: int) -> None:
-        event_descriptors = self.current.get(aggregate_id)
-        if not event_descriptors:
+    def _get_stream(self, aggregate_id : str) -> list[EventDescriptor] | None:
+        return self.current.get(aggregate_id)
+
+    def _create_stream(self, aggregate_id : str) -> list[EventDescriptor]:
+        event_descriptors = []
+        self.current[aggregate_id] = event_descriptors
+        self.category_index.setdefault(stream_category(aggregate_id), {})[aggregate_id] = None
+        return event_descriptors
+
+    def _stream_written(self, aggregate_id : str, event_descriptors : list[EventDescriptor]) -> None:...
+
+    def _head_version(self, aggregate_id : str, event_descriptors : list[EventDescriptor]) -> int:
+        if event_descriptors:
+            return event_descriptors[len(event_descriptors)-1].version
+        return self._stream_starts.get(aggregate_id, 0) - 1
+
+    def _is_replay(self, aggregate_id : str, event_descriptors : list[EventDescriptor] | None, event_ids : list[str], expected_version : int) -> bool:
+        expected = [(aggregate_id, expected_version + 1 + i) for i in range(len(event_ids))]
+        if self.dedup_index is not None:
+            found = [self.dedup_index.get(aggregate_id, event_id) for event_id in event_ids]
+            if found == expected:
+                return True
+            for event_id, position, location in zip(event_ids, expected, found):
+                if location is not None and location != position:
+                    raise ArgumentError(f"Event {event_id} was already appended to {location[0]} at version {location[1]}")
+        if not event_descriptors or self._head_version(aggregate_id, event_descriptors) < expected[-1][1]:
+            return False
+        first = event_descriptors[0].version
+        if expected_version + 1 < first:
+            return False
+        stored = [event_descriptors[version - first].event_id for _, version in expected]
+        return stored == event_ids
+
+    async def save_events(self, aggregate_id: str, events: list[IEvent], expected_version: int, event_ids : list[str] | None = None) -> None:
+        if event_ids is not None and len(event_ids) != len(events):
+            raise ArgumentError("One event id is required for each event")
+        event_descriptors = self._get_stream(aggregate_id)
+        if event_ids and self._is_replay(aggregate_id, event_descriptors, event_ids, expected_version):
+            return
+
+        event_descriptors = self._open_stream(aggregate_id, event_descriptors, expected_version)
+
+        i = expected_version
+        new_descriptors = []
+
+        for n, event in enumerate(events):
+            i += 1
+            event_data, compression = self._encode_payload(event)
+            self.position += 1
+            event_id = event_ids[n] if event_ids is not None else None
+            new_descriptors.append(EventDescriptor(aggregate_id, event.type, event_data, i, compression, position=self.position, event_id=event_id, subject_id=get_subject_id(event)))
+        self._append(aggregate_id, event_descriptors, new_descriptors)
+        if self.outbox is not None:
+            self.outbox.append(aggregate_id, expected_version + 1, events)
+
+    async def append_descriptors(self, aggregate_id : str, descriptors : list[EventDescriptor], expected_version : int) -> None:
+        event_descriptors = self._get_stream(aggregate_id)
+        if event_descriptors is None and expected_version >= 0:
+            # The records of a truncated stream start after its dropped versions.
+            event_descriptors = self._create_stream(aggregate_id)
+            self._stream_starts[aggregate_id] = expected_version + 1
+        event_descriptors = self._open_stream(aggregate_id, event_descriptors, expected_version)
+        new_descriptors = []
+        for i, desc in enumerate(descriptors):
+            if desc.version != expected_version + 1 + i:
+                raise ArgumentError(f"Version {desc.version} does not follow version {expected_version + i} of {aggregate_id}")
+            self.position += 1
+            new_descriptors.append(EventDescriptor(aggregate_id, desc.event_type, desc.event_data, desc.version, desc.compression, desc.recorded_at, self.position, desc.event_id, desc.subject_id))
+        self._append(aggregate_id, event_descriptors, new_descriptors)
+
+    def _open_stream(self, aggregate_id : str, event_descriptors : list[EventDescriptor] | None, expected_version : int) -> list[EventDescriptor]:
+        if event_descriptors is None:
             if expected_version != -1:
                 raise ConcurrencyError()
-            event_descriptors = []
-            self.current[aggregate_id] = event_descriptors
+            return self._create_stream(aggregate_id)
+        if self._head_version(aggregate_id, event_descriptors) != expected_version:
+            raise ConcurrencyError()
+        return event_descriptors
 
-        elif event_descriptors[len(event_descriptors)-1].version != expected_version:
+    def _append(self, aggregate_id : str, event_descriptors : list[EventDescriptor], new_descriptors : list[EventDescriptor]) -> None:
+        for desc in new_descriptors:
+            event_descriptors.append(desc)
+            self._index_type(desc.event_type, aggregate_id, desc.version)
+            if desc.event_id is not None and self.dedup_index is not None:
+                self.dedup_index.add(aggregate_id, desc.event_id, desc.version)
+        self._stream_written(aggregate_id, event_descriptors)
+
+    async def replace_payloads(self, aggregate_id : str, descriptors : list[EventDescriptor], payloads : list[dict]) -> None:
+        event_descriptors = self._get_stream(aggregate_id)
+        if not event_descriptors:
             raise ConcurrencyError()
+        first = event_descriptors[0].version
+        replacements = {}
+        for desc, values in zip(descriptors, payloads):
+            index = desc.version - first
+            if not 0 <= index < len(event_descriptors):
+                raise ConcurrencyError()
+            current = event_descriptors[index]
+            if current.event_data != desc.event_data or current.compression != desc.compression:
+                raise ConcurrencyError()
+            event_data, compression = self._encode_values(current.event_type, values)
+            replacements[index] = EventDescriptor(aggregate_id, current.event_type, event_data, current.version, compression, current.recorded_at, current.position, current.event_id, current.subject_id)
+        self._replace(aggregate_id, event_descriptors, replacements)
 
-        i = expected_version
+    def _replace(self, aggregate_id : str, event_descriptors : list[EventDescriptor], replacements : dict[int, EventDescriptor]) -> None:
+        for index, desc in replacements.items():
+            event_descriptors[index] = desc
+        self._stream_written(aggregate_id, event_descriptors)
 
-        for event in events:
-            i += 1
-            event_descriptors.append(EventDescriptor(aggregate_id, event.type,json.dumps(event.to_dict()), i))
+    def _index_type(self, event_type : str, aggregate_id : str, version : int) -> None:
+        self.type_index.setdefault(event_type, []).append((aggregate_id, version))
+
+    def _type_entries(self, event_type : str) -> Iterable[tuple[str, int]]:
+        return self.type_index.get(event_type, ())
+
+    def _type_count(self, event_type : str) -> int:
+        return len(self.type_index.get(event_type, ()))
 
-    async def get_events_for_aggregate(self, aggregate_id: str) -> list[IEvent]:
-        event_descriptors = self.current.get(aggregate_id)
+    def _prune_types(self, event_type : str) -> None:
+        """Remove the entries of truncated events from the index of a type."""
+        self.type_index[event_type] = list(self._live_type_entries(event_type))
+
+    def _live_type_entries(self, event_type : str) -> Iterable[tuple[str, int]]:
+        starts = self._stream_starts
+        return ((stream_id, version) for stream_id, version in self._type_entries(event_type) if version >= starts.get(stream_id, 0))
+
+    def _slice_stream(self, event_descriptors : list[EventDescriptor], from_version : int, to_version : int | None = None) -> list[EventDescriptor]:
+        if not event_descriptors:
+            return event_descriptors
+        first = event_descriptors[0].version
+        if to_version is not None:
+            return event_descriptors[max(0, from_version - first):max(0, to_version - first + 1)]
+        if from_version <= first:
+            return event_descriptors
+        return event_descriptors[from_version - first:]
+
+    async def get_events_for_aggregate(self, aggregate_id: str, from_version : int = 0, to_version : int | None = None) -> list[IEvent]:
+        event_descriptors = self._get_stream(aggregate_id)
         if event_descriptors is None:
             return []
-        return [get_event_class(desc.event_type).from_dict(json.loads(desc.event_data)) for desc in event_descriptors]
+        event_descriptors = self._slice_stream(event_descriptors, from_version, to_version)
+        if not event_descriptors:
+            return []
+        return (await self._decode_streams({aggregate_id : event_descriptors}))[aggregate_id]
+
+    async def get_events_for_aggregates(self, aggregate_ids : list[str], max_concurrency : int = 8, from_versions : dict[str, int] | None = None) -> dict[str, list[IEvent]]:
+        streams = {}
+        from_versions = from_versions or {}
+        for aggregate_id in dict.fromkeys(aggregate_ids):
+            event_descriptors = self._get_stream(aggregate_id)
+            if event_descriptors:
+                event_descriptors = self._slice_stream(event_descriptors, from_versions.get(aggregate_id, 0))
+            if event_descriptors:
+                streams[aggregate_id] = event_descriptors
+        return await self._decode_streams(streams, max_concurrency)
+
+    async def get_stream_start(self, aggregate_id : str) -> int:
+        return self._stream_starts.get(aggregate_id, 0)
+
+    async def get_stream_starts(self, aggregate_ids : list[str]) -> dict[str, int]:
+        return {aggregate_id : self._stream_starts.get(aggregate_id, 0) for aggregate_id in aggregate_ids}
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        event_descriptors = self._get_stream(aggregate_id)
+        if event_descriptors is None:
+            return -1
+        index = bisect_right(event_descriptors, timestamp, key=lambda desc: desc.recorded_at)
+        return event_descriptors[index - 1].version if index else self._stream_starts.get(aggregate_id, 0) - 1
+
+    async def get_stream_ids(self) -> list[str]:
+        return list(self.current)
+
+    async def get_event_descriptors(self, aggregate_id : str) -> list[EventDescriptor]:
+        event_descriptors = self._get_stream(aggregate_id)
+        return [] if event_descriptors is None else list(event_descriptors)
+
+    async def get_stream_ids_by_category(self, category : str) -> list[str]:
+        return list(self.category_index.get(category, ()))
+
+    async def get_event_descriptors_by_type(self, event_type : str) -> list[EventDescriptor]:
+        res = []
+        for stream_id, version in self._live_type_entries(event_type):
+            event_descriptors = self._get_stream(stream_id)
+            res.append(event_descriptors[version - event_descriptors[0].version])
+        return res
+
+    async def truncate_stream(self, aggregate_id : str, before_version : int) -> int:
+        event_descriptors = self._get_stream(aggregate_id)
+        if event_descriptors is None:
+            return 0
+        start = self._stream_starts.get(aggregate_id, 0)
+        before_version = min(before_version, self._head_version(aggregate_id, event_descriptors) + 1)
+        if before_version <= start:
+            return 0
+        dropped = before_version - start
+        stale = Counter(desc.event_type for desc in event_descriptors[:dropped])
+        del event_descriptors[:dropped]
+        self._stream_starts[aggregate_id] = before_version
+        # The index of a type is pruned once half of it is stale, so each truncated event
+        # costs O(1) amortized instead of a pass over the whole index.
+        for event_type, count in stale.items():
+            self._stale_type_entries[event_type] += count
+            if 2 * self._stale_type_entries[event_type] > self._type_count(event_type):
+                self._prune_types(event_type)
+                del self._stale_type_entries[event_type]
+        if self.event_cache is not None:
+            self.event_cache.evict_stream(aggregate_id)
+        self._stream_written(aggregate_id, event_descriptors)
+        return dropped
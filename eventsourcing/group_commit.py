@@ -0,0 +1,154 @@
+import asyncio
+from .event import IEvent
+from .event_stores import IEventStore, EventDescriptor, PendingAppend
+
+class GroupCommitEventStore(IEventStore):
+    """
+    Event store gathering concurrent appends into batches written by another store.
+
+    `save_events` calls arriving within `window` seconds of the first one of a batch, or
+    until `max_batch` appends are waiting, are handed together to
+    `store.save_events_batch`, which durable stores write in a single transaction. Each
+    caller still gets the outcome of its own append: it returns once the batch is
+    committed, or raises the `ConcurrencyError` of its own expected version check.
+    Batches are written one at a time, in arrival order. Reads go straight to `store`.
+    """
+
+    def __init__(self, store : IEventStore, window : float = 0.002, max_batch : int = 64) -> None:
+        """
+        Args:
+            store (IEventStore): Store writing the batches.
+            window (float): Seconds an append may wait for others to join its batch.
+            max_batch (int): Number of appends that triggers a write without waiting for the window.
+        """
+        if window < 0:
+            raise ValueError("window must not be negative")
+        if max_batch <= 0:
+            raise ValueError("max_batch must be positive")
+        self.store = store
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.appends = 0
+        self.__pending : list[tuple[PendingAppend, asyncio.Future]] = []
+        self.__timer : asyncio.TimerHandle | None = None
+        self.__lock : asyncio.Lock | None = None
+        self.__tasks : set[asyncio.Task] = set()
+
+    @property
+    def event_cache(self):
+        return self.store.event_cache
+
+    @property
+    def compressor(self):
+        return self.store.compressor
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.appends / self.batches if self.batches else 0.0
+
+    async def save_events(self, aggregate_id : str, events : list[IEvent], expected_version : int, event_ids : list[str] | None = None) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__pending.append((PendingAppend(aggregate_id, events, expected_version, event_ids), future))
+        if len(self.__pending) >= self.max_batch:
+            self.__flush()
+        elif self.__timer is None:
+            self.__timer = loop.call_later(self.window, self.__flush)
+        await future
+
+    async def flush(self) -> None:
+        """Write the waiting appends now and wait until every batch is written."""
+        self.__flush()
+        while self.__tasks:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+
+    def __flush(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if not self.__pending:
+            return
+        batch, self.__pending = self.__pending, []
+        task = asyncio.get_running_loop().create_task(self.__write(batch))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def __write(self, batch : list[tuple[PendingAppend, asyncio.Future]]) -> None:
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+        try:
+            async with self.__lock:
+                try:
+                    results : list[Exception | None] = await self.store.save_events_batch([append for append, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                self.batches += 1
+                self.appends += len(batch)
+                for (_, future), error in zip(batch, results):
+                    if future.done():
+                        continue
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+        finally:
+            # When the write is cancelled, or dies of another BaseException, its callers
+            # must not wait forever; whether their appends were written is unknown.
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+
+    async def save_events_batch(self, appends : list[PendingAppend]) -> list[Exception | None]:
+        return await self.store.save_events_batch(appends)
+
+    async def get_events_for_aggregate(self, aggregate_id : str, from_version : int = 0, to_version : int | None = None) -> list[IEvent]:
+        return await self.store.get_events_for_aggregate(aggregate_id, from_version, to_version)
+
+    async def get_events_for_aggregates(self, aggregate_ids : list[str], max_concurrency : int = 8, from_versions : dict[str, int] | None = None) -> dict[str, list[IEvent]]:
+        return await self.store.get_events_for_aggregates(aggregate_ids, max_concurrency, from_versions)
+
+    async def get_stream_start(self, aggregate_id : str) -> int:
+        return await self.store.get_stream_start(aggregate_id)
+
+    async def get_stream_starts(self, aggregate_ids : list[str]) -> dict[str, int]:
+        return await self.store.get_stream_starts(aggregate_ids)
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        return await self.store.get_version_at(aggregate_id, timestamp)
+
+    async def get_stream_ids(self) -> list[str]:
+        return await self.store.get_stream_ids()
+
+    async def get_event_descriptors(self, aggregate_id : str) -> list[EventDescriptor]:
+        return await self.store.get_event_descriptors(aggregate_id)
+
+    async def truncate_stream(self, aggregate_id : str, before_version : int) -> int:
+        return await self.store.truncate_stream(aggregate_id, before_version)
+
+    async def append_descriptors(self, aggregate_id : str, descriptors : list[EventDescriptor], expected_version : int) -> None:
+        await self.store.append_descriptors(aggregate_id, descriptors, expected_version)
+
+    async def replace_payloads(self, aggregate_id : str, descriptors : list[EventDescriptor], payloads : list[dict]) -> None:
+        await self.store.replace_payloads(aggregate_id, descriptors, payloads)
+
+    async def append_descriptors_batch(self, appends : list[tuple[str, list[EventDescriptor], int]]) -> None:
+        await self.store.append_descriptors_batch(appends)
+
+    async def get_stream_ids_by_category(self, category : str) -> list[str]:
+        return await self.store.get_stream_ids_by_category(category)
+
+    async def get_event_descriptors_by_type(self, event_type : str) -> list[EventDescriptor]:
+        return await self.store.get_event_descriptors_by_type(event_type)
+
+    async def get_events_by_type(self, event_type : str) -> list[IEvent]:
+        return await self.store.get_events_by_type(event_type)
+
+    def _read_payload(self, desc : EventDescriptor) -> dict:
+        return self.store._read_payload(desc)
+
+    def _decode_event(self, desc : EventDescriptor) -> IEvent:
+        return self.store._decode_event(desc)
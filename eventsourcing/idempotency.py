@@ -0,0 +1,37 @@
+from collections import OrderedDict
+
+class DedupIndex:
+    """
+    Bounded index of the event IDs appended to a store, mapped to their stream and version.
+
+    Only the most recent IDs are kept, either across the whole store or per stream, so
+    the index answers retries of recent appends without any read of the stream.
+    """
+
+    def __init__(self, max_entries : int = 100_000, per_stream : bool = False) -> None:
+        """
+        Args:
+            max_entries (int): Number of IDs kept, in total or for each stream when `per_stream` is set.
+            per_stream (bool): Bound and look up IDs per stream instead of globally.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.per_stream = per_stream
+        self.__entries : dict[str, OrderedDict[str, tuple[str, int]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.__entries.values())
+
+    def get(self, stream_id : str, event_id : str) -> tuple[str, int] | None:
+        """Get the stream ID and version an event ID was appended at, if it is still indexed."""
+        entries = self.__entries.get(stream_id if self.per_stream else "")
+        return entries.get(event_id) if entries is not None else None
+
+    def add(self, stream_id : str, event_id : str, version : int) -> None:
+        """Record that an event ID was appended to a stream at `version`."""
+        entries = self.__entries.setdefault(stream_id if self.per_stream else "", OrderedDict())
+        entries[event_id] = (stream_id, version)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
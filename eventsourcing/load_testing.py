@@ -0,0 +1,267 @@
+"""
+Drive a repository with concurrent simulated clients.
+
+Each client repeatedly picks an aggregate and either reads it or runs a
+get → command → save cycle on it. Aggregates are picked from a Zipf distribution so
+that a few hot keys can be made to take most of the traffic, which is where optimistic
+concurrency conflicts show up.
+
+Usage:
+    python -m eventsourcing.load_testing [--clients N] [--aggregates K] [--duration S]
+                                         [--read-ratio R] [--skew Z] [--think-time S]
+"""
+import sys
+import math
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from dataclasses import dataclass, field
+from typing import Callable, Generic, TypeVar
+from .aggregates import AggregateRoot
+from .exceptions import ConcurrencyError
+from .repositories import IRepository
+
+T = TypeVar('T', bound=AggregateRoot)
+
+@dataclass
+class LoadTestConfig:
+    """
+    Args:
+        clients (int): Number of concurrent simulated clients.
+        aggregates (int): Number of aggregates created before the run and shared by the clients.
+        duration (float): Length of the run in seconds.
+        operations (int | None): Stop after this many operations in total, if reached before `duration`.
+        read_ratio (float): Share of operations that only read an aggregate.
+        key_skew (float): Zipf exponent of the aggregate choice; 0 is uniform, 1 and above concentrate on a few keys.
+        think_time (float): Seconds a client waits between getting an aggregate and saving it.
+        interval (float): Width in seconds of the buckets of the timeline.
+        seed (int | None): Seed of the random choices, for reproducible runs.
+    """
+    clients : int = 16
+    aggregates : int = 100
+    duration : float = 5.0
+    operations : int | None = None
+    read_ratio : float = 0.5
+    key_skew : float = 0.0
+    think_time : float = 0.0
+    interval : float = 1.0
+    seed : int | None = None
+
+    def __post_init__(self) -> None:
+        if self.clients <= 0 or self.aggregates <= 0:
+            raise ValueError("clients and aggregates must be positive")
+        if not 0 <= self.read_ratio <= 1:
+            raise ValueError("read_ratio must be between 0 and 1")
+        if self.key_skew < 0:
+            raise ValueError("key_skew must not be negative")
+        if self.interval <= 0:
+            raise ValueError("interval must be positive")
+
+@dataclass
+class IntervalStats:
+    """
+    Operations completed during one interval of a run, `start` seconds after it began.
+    """
+    start : float
+    length : float
+    reads : int = 0
+    writes : int = 0
+    conflicts : int = 0
+    errors : int = 0
+
+    @property
+    def operations(self) -> int:
+        return self.reads + self.writes + self.conflicts + self.errors
+
+    @property
+    def throughput(self) -> float:
+        """Operations per second."""
+        return self.operations / self.length
+
+    @property
+    def conflict_rate(self) -> float:
+        """Share of the attempted writes rejected with a `ConcurrencyError`."""
+        attempts = self.writes + self.conflicts
+        return self.conflicts / attempts if attempts else 0.0
+
+def percentile(values : list[float], p : float) -> float:
+    """Nearest-rank percentile of sorted `values`, 0 when there are none."""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(p / 100 * len(values)))) - 1]
+
+@dataclass
+class LoadTestReport:
+    """
+    Outcome of a run. Latencies are in seconds and cover the whole operation: the read,
+    and for writes the command and the save, including the think time.
+    """
+    duration : float
+    read_latencies : list[float] = field(default_factory=list)
+    write_latencies : list[float] = field(default_factory=list)
+    conflicts : int = 0
+    errors : int = 0
+    timeline : list[IntervalStats] = field(default_factory=list)
+
+    @property
+    def operations(self) -> int:
+        return len(self.read_latencies) + len(self.write_latencies) + self.conflicts + self.errors
+
+    @property
+    def throughput(self) -> float:
+        """Operations per second over the whole run."""
+        return self.operations / self.duration if self.duration else 0.0
+
+    @property
+    def conflict_rate(self) -> float:
+        """Share of the attempted writes rejected with a `ConcurrencyError`."""
+        attempts = len(self.write_latencies) + self.conflicts
+        return self.conflicts / attempts if attempts else 0.0
+
+    def latency(self, p : float, kind : str | None = None) -> float:
+        """Latency percentile of the successful `"read"` or `"write"` operations, or of both."""
+        if kind == "read":
+            values = self.read_latencies
+        elif kind == "write":
+            values = self.write_latencies
+        else:
+            values = self.read_latencies + self.write_latencies
+        return percentile(sorted(values), p)
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.operations} operations in {self.duration:.2f}s: {self.throughput:.0f} ops/s, "
+            f"{self.conflicts} conflicts ({self.conflict_rate:.1%} of writes), {self.errors} errors",
+            f"{'latency ms':<12}{'p50':>10}{'p95':>10}{'p99':>10}",
+        ]
+        for kind in ("read", "write", None):
+            lines.append(f"{kind or 'all':<12}" + "".join(f"{self.latency(p, kind) * 1000:>10.3f}" for p in (50, 95, 99)))
+        lines.append(f"{'interval s':<12}{'ops/s':>10}{'conflicts':>10}")
+        for stats in self.timeline:
+            lines.append(f"{stats.start:<12.2f}{stats.throughput:>10.0f}{stats.conflict_rate:>10.1%}")
+        return "\n".join(lines)
+
+class LoadTester(Generic[T]):
+    """
+    Runs simulated clients against a repository and measures them.
+    """
+
+    def __init__(self, repository : IRepository[T], create : Callable[[str], T], command : Callable[[T], None], config : LoadTestConfig | None = None) -> None:
+        """
+        Args:
+            repository (IRepository[T]): Repository under test, over any event store.
+            create (Callable[[str], T]): Create a new aggregate with the given ID.
+            command (Callable[[T], None]): Apply a command to an aggregate, leaving uncommitted changes.
+            config (LoadTestConfig | None): Shape of the load.
+        """
+        self.repository = repository
+        self.create = create
+        self.command = command
+        self.config = config or LoadTestConfig()
+        self.ids : list[str] = []
+        self.__random = random.Random(self.config.seed)
+        weights = [1 / (rank ** self.config.key_skew) for rank in range(1, self.config.aggregates + 1)]
+        self.__cum_weights = list(itertools.accumulate(weights))
+
+    async def seed(self) -> list[str]:
+        """Create the shared aggregates, IDs ordered from the hottest to the coldest."""
+        self.ids = [f"{i:08d}" for i in range(self.config.aggregates)]
+        for id in self.ids:
+            await self.repository.save(self.create(id), -1)
+        return self.ids
+
+    def choose_id(self) -> str:
+        return self.__random.choices(self.ids, cum_weights=self.__cum_weights)[0]
+
+    async def run(self) -> LoadTestReport:
+        """Seed the aggregates if needed and run the clients until the duration or the operation budget is spent."""
+        if not self.ids:
+            await self.seed()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.config.duration
+        report = LoadTestReport(0.0)
+        budget = itertools.count(1)
+        last_index = max(0, math.ceil(self.config.duration / self.config.interval) - 1)
+
+        def bucket(now : float) -> IntervalStats:
+            # Operations in flight at the deadline are counted in the last interval.
+            index = min(int((now - started) / self.config.interval), last_index)
+            while len(report.timeline) <= index:
+                report.timeline.append(IntervalStats(len(report.timeline) * self.config.interval, self.config.interval))
+            return report.timeline[index]
+
+        async def client() -> None:
+            while loop.time() < deadline:
+                if self.config.operations is not None and next(budget) > self.config.operations:
+                    return
+                id = self.choose_id()
+                is_read = self.__random.random() < self.config.read_ratio
+                begin = time.perf_counter()
+                try:
+                    aggregate = await self.repository.get_by_id(id)
+                    if not is_read:
+                        self.command(aggregate)
+                        await asyncio.sleep(self.config.think_time)
+                        await self.repository.save(aggregate, aggregate.version)
+                except ConcurrencyError:
+                    report.conflicts += 1
+                    bucket(loop.time()).conflicts += 1
+                except Exception:
+                    report.errors += 1
+                    bucket(loop.time()).errors += 1
+                else:
+                    latency = time.perf_counter() - begin
+                    stats = bucket(loop.time())
+                    if is_read:
+                        report.read_latencies.append(latency)
+                        stats.reads += 1
+                    else:
+                        report.write_latencies.append(latency)
+                        stats.writes += 1
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(client() for _ in range(self.config.clients)))
+        report.duration = loop.time() - started
+        if report.timeline:
+            last = report.timeline[-1]
+            last.length = max(report.duration - last.start, last.length)
+        return report
+
+async def run_user_load(config : LoadTestConfig) -> LoadTestReport:
+    """Run the load against `example.user` aggregates in an `InMemEventStore` with a throwaway crypto store."""
+    from datetime import date
+    from example.user import User
+    from .encryption import CryptoRepository, InMemCryptoStore
+    from .event_stores import InMemEventStore
+    from .repositories import EventStoreRepository
+    CryptoRepository.crypto_store = InMemCryptoStore()
+    counter = itertools.count()
+    tester = LoadTester[User](
+        EventStoreRepository[User](InMemEventStore(), User),
+        lambda id: User(id, "First", "Last", date(1990, 1, 1)),
+        lambda user: user.change_last_name(f"Last {next(counter)}"),
+        config,
+    )
+    return await tester.run()
+
+def main(argv : list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m eventsourcing.load_testing", description="Run concurrent clients against example.user aggregates.")
+    defaults = LoadTestConfig()
+    parser.add_argument("--clients", type=int, default=defaults.clients)
+    parser.add_argument("--aggregates", type=int, default=defaults.aggregates)
+    parser.add_argument("--duration", type=float, default=defaults.duration)
+    parser.add_argument("--operations", type=int, default=defaults.operations)
+    parser.add_argument("--read-ratio", type=float, default=defaults.read_ratio)
+    parser.add_argument("--skew", type=float, default=defaults.key_skew, help="Zipf exponent of the key choice")
+    parser.add_argument("--think-time", type=float, default=defaults.think_time)
+    parser.add_argument("--interval", type=float, default=defaults.interval)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args(argv)
+    config = LoadTestConfig(args.clients, args.aggregates, args.duration, args.operations, args.read_ratio, args.skew, args.think_time, args.interval, args.seed)
+    print(asyncio.run(run_user_load(config)).summary())
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
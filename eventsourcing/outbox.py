@@ -0,0 +1,243 @@
+import abc
+import time
+import asyncio
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from .event import IEvent
+
+@dataclass
+class OutboxEntry:
+    """
+    A committed event waiting to be delivered to subscribers.
+    """
+    position : int
+    stream_id : str
+    version : int
+    event : IEvent
+
+class IOutbox(abc.ABC):
+    """
+    Committed events not yet delivered to every subscriber, as read by `OutboxDispatcher`.
+
+    Stores queue events in the same step as they write them, so an event is either both
+    stored and queued for delivery or neither. Entries stay in the outbox until they are
+    acknowledged, which makes delivery at-least-once: a dispatcher started after a crash
+    delivers again whatever was not acknowledged.
+    """
+    __new_entries : asyncio.Event | None = None
+
+    @abc.abstractmethod
+    def __len__(self) -> int:...
+
+    @abc.abstractmethod
+    def pending(self, after_position : int = 0, limit : int | None = None) -> list[OutboxEntry]:
+        """Get unacknowledged entries with a position greater than `after_position`, oldest first."""
+
+    @abc.abstractmethod
+    def acknowledge(self, positions : list[int]) -> None:
+        """Remove delivered entries."""
+
+    def _notify(self) -> None:
+        """Wake up the dispatcher waiting for new entries."""
+        if self.__new_entries is not None:
+            self.__new_entries.set()
+
+    async def wait(self, timeout : float) -> None:
+        """Wait until new entries are appended or `timeout` seconds have passed."""
+        if self.__new_entries is None:
+            self.__new_entries = asyncio.Event()
+        try:
+            await asyncio.wait_for(self.__new_entries.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.__new_entries.clear()
+
+class Outbox(IOutbox):
+    """
+    In-memory outbox, appended to by the in-memory stores; its entries do not survive the process.
+    """
+
+    def __init__(self) -> None:
+        self.__entries : dict[int, OutboxEntry] = {}
+        # Positions in append order, hence sorted; acknowledged ones are dropped lazily.
+        self.__positions : list[int] = []
+        self.__position = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def position(self) -> int:
+        """Position of the last entry appended."""
+        return self.__position
+
+    def append(self, stream_id : str, first_version : int, events : list[IEvent]) -> None:
+        """Queue events appended to a stream, the first one having version `first_version`."""
+        for i, event in enumerate(events):
+            self.__position += 1
+            self.__entries[self.__position] = OutboxEntry(self.__position, stream_id, first_version + i, event)
+            self.__positions.append(self.__position)
+        self._notify()
+
+    def pending(self, after_position : int = 0, limit : int | None = None) -> list[OutboxEntry]:
+        res = []
+        for i in range(bisect_right(self.__positions, after_position), len(self.__positions)):
+            entry = self.__entries.get(self.__positions[i])
+            if entry is None:
+                continue
+            res.append(entry)
+            if limit is not None and len(res) >= limit:
+                break
+        return res
+
+    def acknowledge(self, positions : list[int]) -> None:
+        for position in positions:
+            self.__entries.pop(position, None)
+        if len(self.__positions) > 2 * len(self.__entries) + 64:
+            self.__positions = [position for position in self.__positions if position in self.__entries]
+
+Handler = Callable[[list[OutboxEntry]], Awaitable[None]]
+
+@dataclass
+class _Batch:
+    entries : list[OutboxEntry]
+    remaining : int
+
+@dataclass
+class Subscription:
+    """
+    An async subscriber receiving batches of outbox entries, with its own concurrency limit.
+    """
+    name : str
+    handler : Handler
+    concurrency : int
+    queue : asyncio.Queue
+    delivered : int = 0
+    failures : int = 0
+    tasks : list[asyncio.Task] = field(default_factory=list)
+
+class OutboxDispatcher:
+    """
+    Delivers outbox entries in batches to async subscribers.
+
+    Every subscriber has a bounded queue: when a subscriber falls behind, its queue fills
+    up and the dispatcher stops reading the outbox until it drains. A failing handler is
+    retried until it succeeds, and a batch is acknowledged once every subscriber handled
+    it. Subscribers with a concurrency above one may receive batches out of order.
+    """
+
+    def __init__(self, outbox : IOutbox, batch_size : int = 100, queue_size : int = 8, poll_interval : float = 0.1, retry_delay : float = 0.1) -> None:
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.subscriptions : list[Subscription] = []
+        self.delivered = 0
+        self.__last_position = 0
+        self.__in_flight = 0
+        self.__started_at : float | None = None
+        self.__task : asyncio.Task | None = None
+        self.__idle : asyncio.Event | None = None
+
+    def subscribe(self, handler : Handler, concurrency : int = 1, name : str | None = None) -> Subscription:
+        """Register a subscriber; must be called before `start`."""
+        if self.__task is not None:
+            raise RuntimeError("Subscribers must be registered before the dispatcher starts")
+        subscription = Subscription(name or getattr(handler, "__name__", f"subscriber-{len(self.subscriptions)}"), handler, concurrency, asyncio.Queue(self.queue_size))
+        self.subscriptions.append(subscription)
+        return subscription
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of batches waiting in the subscriber queues."""
+        return sum(subscription.queue.qsize() for subscription in self.subscriptions)
+
+    @property
+    def throughput(self) -> float:
+        """Events acknowledged per second since the dispatcher started."""
+        if self.__started_at is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.__started_at
+        return self.delivered / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "pending" : len(self.outbox),
+            "queue_depth" : self.queue_depth,
+            "delivered" : self.delivered,
+            "throughput" : self.throughput,
+            "subscribers" : {s.name : {"delivered" : s.delivered, "failures" : s.failures, "queue_depth" : s.queue.qsize()} for s in self.subscriptions},
+        }
+
+    def start(self) -> None:
+        """Start delivering in the background of the current event loop."""
+        if self.__task is not None:
+            return
+        if not self.subscriptions:
+            raise RuntimeError("The dispatcher has no subscriber")
+        self.__started_at = time.perf_counter()
+        self.__idle = asyncio.Event()
+        for subscription in self.subscriptions:
+            subscription.tasks = [asyncio.create_task(self.__consume(subscription)) for _ in range(subscription.concurrency)]
+        self.__task = asyncio.create_task(self.__produce())
+
+    async def stop(self) -> None:
+        """Stop delivering; entries not yet acknowledged stay in the outbox."""
+        if self.__task is None:
+            return
+        tasks = [self.__task] + [task for subscription in self.subscriptions for task in subscription.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for subscription in self.subscriptions:
+            subscription.queue = asyncio.Queue(self.queue_size)
+            subscription.tasks = []
+        self.__task = None
+        self.__last_position = 0
+        self.__in_flight = 0
+
+    async def drain(self) -> None:
+        """Wait until the outbox is empty and every batch is acknowledged."""
+        if self.__task is None:
+            raise RuntimeError("The dispatcher must be started before it can be drained")
+        while len(self.outbox) or self.__in_flight:
+            self.__idle.clear()
+            try:
+                await asyncio.wait_for(self.__idle.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __produce(self) -> None:
+        while True:
+            entries = self.outbox.pending(self.__last_position, self.batch_size)
+            if not entries:
+                await self.outbox.wait(self.poll_interval)
+                continue
+            self.__last_position = entries[-1].position
+            batch = _Batch(entries, len(self.subscriptions))
+            self.__in_flight += 1
+            for subscription in self.subscriptions:
+                await subscription.queue.put(batch)
+
+    async def __consume(self, subscription : Subscription) -> None:
+        while True:
+            batch = await subscription.queue.get()
+            while True:
+                try:
+                    await subscription.handler(batch.entries)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    subscription.failures += 1
+                    await asyncio.sleep(self.retry_delay)
+            subscription.delivered += len(batch.entries)
+            subscription.queue.task_done()
+            batch.remaining -= 1
+            if batch.remaining == 0:
+                self.outbox.acknowledge([entry.position for entry in batch.entries])
+                self.delivered += len(batch.entries)
+                self.__in_flight -= 1
+                self.__idle.set()
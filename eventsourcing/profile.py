@@ -0,0 +1,238 @@
+"""
+Break the replay of aggregates down by phase.
+
+Usage:
+    python -m eventsourcing.profile [--dump FILE --keys FILE] [--users N --changes M]
+                                    [--repeat R] [--allocations]
+                                    [--cprofile FILE] [--flamegraph FILE]
+                                    [--save-dump FILE]
+
+Without `--dump`, a synthetic store of `example.user` events is generated. Each stream
+is then loaded through `EventStoreRepository.get_by_id` and the time spent in every
+phase is reported exclusive of the phases nested in it.
+"""
+import sys
+import json
+import time
+import asyncio
+import inspect
+import argparse
+import importlib
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from cryptography.fernet import Fernet
+from . import data, encryption, event_stores
+from .aggregates import AggregateRoot
+from .encryption import CryptoRepository, InMemCryptoStore
+from .event_stores import IEventStore, InMemEventStore
+from .repositories import EventStoreRepository
+from .transfer import export_events, import_events
+
+STORE_READ = "store read"
+JSON_DECODE = "JSON decode"
+GET_EVENT_CLASS = "get_event_class"
+KEY_LOOKUP = "key lookup"
+DECRYPTION = "Fernet decryption"
+FROM_DICT = "from_dict"
+APPLY = "_apply"
+PHASES = [STORE_READ, JSON_DECODE, GET_EVENT_CLASS, KEY_LOOKUP, DECRYPTION, FROM_DICT, APPLY]
+
+class PhaseProfiler:
+    """
+    Accumulates the exclusive time, call count and allocated memory of nested phases.
+    """
+
+    def __init__(self, track_allocations : bool = False) -> None:
+        self.track_allocations = track_allocations
+        self.times : dict[str, float] = defaultdict(float)
+        self.calls : dict[str, int] = defaultdict(int)
+        self.allocated : dict[str, int] = defaultdict(int)
+        self.stacks : dict[tuple[str, ...], float] = defaultdict(float)
+        self.__stack : list[list] = []
+
+    @contextmanager
+    def phase(self, name : str) -> Iterator[None]:
+        memory = tracemalloc.get_traced_memory()[0] if self.track_allocations else 0
+        frame = [name, time.perf_counter(), 0.0, memory, 0]
+        self.__stack.append(frame)
+        try:
+            yield
+        finally:
+            self.__stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            exclusive = elapsed - frame[2]
+            self.times[name] += exclusive
+            self.calls[name] += 1
+            self.stacks[tuple(f[0] for f in self.__stack) + (name,)] += exclusive
+            allocated = 0
+            if self.track_allocations:
+                allocated = max(0, tracemalloc.get_traced_memory()[0] - frame[3])
+                self.allocated[name] += max(0, allocated - frame[4])
+            if self.__stack:
+                self.__stack[-1][2] += elapsed
+                self.__stack[-1][4] += allocated
+
+    def wrap(self, name : str, func : Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            async def async_wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def report(self) -> str:
+        total = sum(self.times.values()) or 1.0
+        lines = [f"{'phase':<20}{'calls':>10}{'total ms':>12}{'share':>8}{'us/call':>10}" + (f"{'alloc KiB':>12}" if self.track_allocations else "")]
+        for name in PHASES:
+            calls = self.calls.get(name, 0)
+            elapsed = self.times.get(name, 0.0)
+            line = f"{name:<20}{calls:>10}{elapsed * 1000:>12.2f}{elapsed / total:>8.1%}{(elapsed / calls * 1e6 if calls else 0):>10.2f}"
+            if self.track_allocations:
+                line += f"{self.allocated.get(name, 0) / 1024:>12.1f}"
+            lines.append(line)
+        lines.append(f"{'total':<20}{'':>10}{total * 1000:>12.2f}")
+        return "\n".join(lines)
+
+    def write_folded(self, path : str) -> None:
+        """Write the phase stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, elapsed in self.stacks.items():
+                file.write(f"{';'.join(s.replace(' ', '_') for s in ('replay',) + stack)} {int(elapsed * 1e6)}\n")
+
+class _TimedJson:
+    def __init__(self, profiler : PhaseProfiler) -> None:
+        self.loads = profiler.wrap(JSON_DECODE, json.loads)
+        self.dumps = json.dumps
+
+@contextmanager
+def instrument(profiler : PhaseProfiler, event_store : IEventStore, aggregate_type : type[AggregateRoot]) -> Iterator[None]:
+    """Patch the replay path so that every phase is recorded by `profiler`."""
+    profiled_fernet = type("ProfiledFernet", (Fernet,), {"decrypt" : profiler.wrap(DECRYPTION, Fernet.decrypt)})
+    apply = inspect.getattr_static(aggregate_type, "_apply")
+
+    def timed_apply(self, e):
+        with profiler.phase(APPLY):
+            return apply.__get__(self, aggregate_type)(e)
+
+    store_type = type(event_store)
+    patches = [
+        (event_stores, "json", _TimedJson(profiler)),
+        (event_stores, "get_event_class", profiler.wrap(GET_EVENT_CLASS, event_stores.get_event_class)),
+        (encryption, "Fernet", profiled_fernet),
+        (CryptoRepository, "get_existing_or_none", staticmethod(profiler.wrap(KEY_LOOKUP, CryptoRepository.get_existing_or_none))),
+        (CryptoRepository, "fetch_existing_or_none_many", staticmethod(profiler.wrap(KEY_LOOKUP, CryptoRepository.fetch_existing_or_none_many))),
+        (data, "from_dict", profiler.wrap(FROM_DICT, data.from_dict)),
+        (aggregate_type, "_apply", timed_apply),
+        (store_type, "get_events_for_aggregate", profiler.wrap(STORE_READ, store_type.get_events_for_aggregate)),
+    ]
+    originals = [(target, name, inspect.getattr_static(target, name)) for target, name, _ in patches]
+    try:
+        for target, name, value in patches:
+            setattr(target, name, value)
+        yield
+    finally:
+        for target, name, value in reversed(originals):
+            setattr(target, name, value)
+
+async def generate_store(users : int, changes : int) -> InMemEventStore:
+    """Build a store of `example.user` events: one `UserCreated` and `changes` `LastNameChanged` per user."""
+    from datetime import date
+    from example.user import User
+    event_store = InMemEventStore()
+    repository = EventStoreRepository[User](event_store, User)
+    for i in range(users):
+        user = User(f"{i:08d}", f"First {i}", f"Last {i}", date(1950 + i % 50, 1 + i % 12, 1 + i % 28))
+        for j in range(changes):
+            user.change_last_name(f"Last {i}-{j}")
+        await repository.save(user, -1)
+    return event_store
+
+async def load_dump(path : str) -> InMemEventStore:
+    """Load a store from a newline-delimited JSON file of `EventDescriptor.to_record()` records."""
+    event_store = InMemEventStore()
+    with open(path, "rb") as file:
+        await import_events(event_store, file)
+    return event_store
+
+async def save_dump(event_store : IEventStore, path : str) -> None:
+    with open(path, "wb") as file:
+        await export_events(event_store, file)
+
+async def replay(event_store : IEventStore, aggregate_type : type[AggregateRoot], repeat : int = 1) -> int:
+    """Load every aggregate of the store `repeat` times and return the number of loads."""
+    repository = EventStoreRepository(event_store, aggregate_type)
+    ids = [stream_id.split("-", 1)[1] for stream_id in await event_store.get_stream_ids()]
+    for _ in range(repeat):
+        for id in ids:
+            await repository.get_by_id(id)
+    return len(ids) * repeat
+
+def _import_aggregate(path : str) -> type[AggregateRoot]:
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+async def run(args : argparse.Namespace) -> str:
+    crypto_store = InMemCryptoStore()
+    CryptoRepository.crypto_store = crypto_store
+    aggregate_type = _import_aggregate(args.aggregate)
+    if args.dump:
+        event_store = await load_dump(args.dump)
+        if args.keys:
+            with open(args.keys, encoding="utf-8") as file:
+                crypto_store.store.update({id : key.encode("ascii") for id, key in json.load(file).items()})
+    else:
+        event_store = await generate_store(args.users, args.changes)
+    if args.save_dump:
+        await save_dump(event_store, args.save_dump)
+        if args.keys:
+            with open(args.keys, "w", encoding="utf-8") as file:
+                json.dump({id : key.decode("ascii") for id, key in crypto_store.store.items() if key is not None}, file)
+
+    profiler = PhaseProfiler()
+    with instrument(profiler, event_store, aggregate_type):
+        loads = await replay(event_store, aggregate_type, args.repeat)
+    output = [f"{loads} aggregate loads", profiler.report()]
+    if args.flamegraph:
+        profiler.write_folded(args.flamegraph)
+
+    if args.allocations:
+        allocations = PhaseProfiler(track_allocations=True)
+        tracemalloc.start()
+        try:
+            with instrument(allocations, event_store, aggregate_type):
+                await replay(event_store, aggregate_type, args.repeat)
+        finally:
+            tracemalloc.stop()
+        output += ["", "allocations (timings inflated by tracemalloc)", allocations.report()]
+
+    if args.cprofile:
+        import cProfile
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+        await replay(event_store, aggregate_type, args.repeat)
+        cprofiler.disable()
+        cprofiler.dump_stats(args.cprofile)
+    return "\n".join(output)
+
+def main(argv : list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m eventsourcing.profile", description="Break the replay of aggregates down by phase.")
+    parser.add_argument("--dump", help="newline-delimited JSON dump of the store to replay")
+    parser.add_argument("--keys", help="JSON file of encryption keys by subject, read with --dump and written with --save-dump")
+    parser.add_argument("--aggregate", default="example.user:User", help="aggregate class as module:Class (default: %(default)s)")
+    parser.add_argument("--users", type=int, default=1000, help="users in the synthetic store (default: %(default)s)")
+    parser.add_argument("--changes", type=int, default=9, help="last name changes per synthetic user (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="number of replays of every aggregate (default: %(default)s)")
+    parser.add_argument("--allocations", action="store_true", help="run a second replay tracing allocations by phase")
+    parser.add_argument("--cprofile", help="write cProfile stats of a replay to this file")
+    parser.add_argument("--flamegraph", help="write the phase stacks in collapsed format to this file")
+    parser.add_argument("--save-dump", help="write the replayed store as a dump to this file")
+    print(asyncio.run(run(parser.parse_args(argv))))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,35 +1,120 @@
 from __future__ import annotations
 import abc
+import asyncio
 
 from .aggregates import AggregateRoot
 from typing import Generic, TypeVar
 from .event_stores import IEventStore
-from .exceptions import AggregateNotFoundError
+from .exceptions import AggregateNotFoundError, GenericError, InvalidOperationError
+from .snapshots import ISnapshotStore, Snapshot
 
 T = TypeVar('T', bound=AggregateRoot)
 
 class IRepository(Generic[T], abc.ABC):
     @abc.abstractmethod
-    async def save(self, aggregate : AggregateRoot, expected_version : int) -> None:...
+    async def save(self, aggregate : AggregateRoot, expected_version : int, event_ids : list[str] | None = None) -> None:...
 
     @abc.abstractmethod
-    async def get_by_id(self, id : str) -> T: ...
+    async def get_by_id(self, id : str, as_of_version : int | None = None, as_of_time : float | None = None) -> T: ...
+
+    async def get_by_ids(self, ids : list[str]) -> dict[str, T | AggregateNotFoundError]:
+        res : dict[str, T | AggregateNotFoundError] = {}
+        for id in ids:
+            try:
+                res[id] = await self.get_by_id(id)
+            except AggregateNotFoundError as e:
+                res[id] = e
+        return res
 
 class EventStoreRepository(IRepository[T], Generic[T]):
     __storage : IEventStore
 
-    def __init__(self, storage : IEventStore, class_type : type[T]) -> None:
+    def __init__(self, storage : IEventStore, class_type : type[T], max_concurrency : int = 8, snapshot_store : ISnapshotStore | None = None, snapshot_every : int | None = None) -> None:
         self.__storage = storage
         self.class_type = class_type
+        self.max_concurrency = max_concurrency
+        self.snapshot_store = snapshot_store
+        self.snapshot_every = snapshot_every
 
-    async def save(self, aggregate : AggregateRoot, expected_version : int) -> None:
-        await self.__storage.save_events(aggregate.to_stream_id(aggregate.id), aggregate.get_uncommitted_changes(), aggregate.version)
+    async def save(self, aggregate : AggregateRoot, expected_version : int, event_ids : list[str] | None = None) -> None:
+        changes = aggregate.get_uncommitted_changes()
+        await self.__storage.save_events(aggregate.to_stream_id(aggregate.id), changes, aggregate.version, event_ids)
+        if self.snapshot_store is not None and self.snapshot_every and changes:
+            new_version = aggregate.version + len(changes)
+            if (new_version + 1) // self.snapshot_every > (aggregate.version + 1) // self.snapshot_every:
+                await self.save_snapshot(aggregate)
         aggregate.mark_changes_as_committed()
 
-    async def get_by_id(self, id: str) -> T:
-        obj = self.class_type()
-        e = await self.__storage.get_events_for_aggregate(obj.to_stream_id(id))
-        if not e:
+    async def save_snapshot(self, aggregate : AggregateRoot) -> Snapshot:
+        if self.snapshot_store is None:
+            raise InvalidOperationError("The repository has no snapshot store")
+        version = aggregate.version + len(aggregate.get_uncommitted_changes())
+        snapshot = Snapshot(aggregate.to_stream_id(aggregate.id), version, aggregate.get_snapshot_state(), subject_ids=sorted(aggregate.subject_ids))
+        await self.snapshot_store.save_snapshot(snapshot)
+        return snapshot
+
+    async def get_by_id(self, id: str, as_of_version : int | None = None, as_of_time : float | None = None) -> T:
+        """
+        Load an aggregate, as it is now or as it was at an earlier point of its stream.
+
+        Args:
+            id (str): Aggregate ID.
+            as_of_version (int | None): Last version to apply.
+            as_of_time (float | None): Load the state recorded at this UNIX timestamp; the
+                earlier of the two points is used when both are given.
+        """
+        stream_id = self.class_type.to_stream_id(id)
+        if as_of_time is not None:
+            version = await self.__storage.get_version_at(stream_id, as_of_time)
+            if version < 0:
+                raise AggregateNotFoundError(id)
+            as_of_version = version if as_of_version is None else min(as_of_version, version)
+        if as_of_version is not None and as_of_version < 0:
+            raise AggregateNotFoundError(id)
+        snapshot = await self.snapshot_store.get_snapshot(stream_id, as_of_version) if self.snapshot_store is not None else None
+        from_version = snapshot.version + 1 if snapshot is not None else 0
+        self.__check_stream_start(stream_id, await self.__storage.get_stream_start(stream_id), from_version)
+        e = await self.__storage.get_events_for_aggregate(stream_id, from_version, as_of_version)
+        if not e and snapshot is None:
             raise AggregateNotFoundError(id)
-        obj.loads_from_history(e)
+        return self.__build(snapshot, e)
+
+    async def get_by_ids(self, ids : list[str]) -> dict[str, T | GenericError]:
+        stream_ids = {id : self.class_type.to_stream_id(id) for id in ids}
+        res : dict[str, T | GenericError] = {}
+        snapshots : dict[str, Snapshot]
+        if self.snapshot_store is not None:
+            snapshots, starts = await asyncio.gather(self.snapshot_store.get_snapshots(list(stream_ids.values())), self.__storage.get_stream_starts(list(stream_ids.values())))
+        else:
+            snapshots, starts = {}, await self.__storage.get_stream_starts(list(stream_ids.values()))
+        from_versions = {stream_id : snapshot.version + 1 for stream_id, snapshot in snapshots.items()}
+        for id, stream_id in stream_ids.items():
+            try:
+                self.__check_stream_start(stream_id, starts.get(stream_id, 0), from_versions.get(stream_id, 0))
+            except InvalidOperationError as e:
+                res[id] = e
+        to_read = [stream_id for id, stream_id in stream_ids.items() if id not in res]
+        histories = await self.__storage.get_events_for_aggregates(to_read, self.max_concurrency, from_versions)
+        for id, stream_id in stream_ids.items():
+            if id in res:
+                continue
+            history = histories.get(stream_id, [])
+            snapshot = snapshots.get(stream_id)
+            if not history and snapshot is None:
+                res[id] = AggregateNotFoundError(id)
+                continue
+            res[id] = self.__build(snapshot, history)
+        return {id : res[id] for id in stream_ids}
+
+    def __build(self, snapshot : Snapshot | None, history : list) -> T:
+        obj = self.class_type()
+        if snapshot is None:
+            obj.loads_from_history(history)
+        else:
+            obj.loads_from_snapshot(snapshot.state, snapshot.version, history, snapshot.subject_ids)
         return obj
+
+    @staticmethod
+    def __check_stream_start(stream_id : str, stream_start : int, from_version : int) -> None:
+        if stream_start > from_version:
+            raise InvalidOperationError(f"{stream_id} is truncated before version {stream_start} and no snapshot covers the dropped events")
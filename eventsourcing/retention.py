@@ -0,0 +1,106 @@
+import time
+import asyncio
+from dataclasses import dataclass
+from .event_stores import IEventStore
+from .snapshots import ISnapshotStore
+
+@dataclass
+class RetentionPolicy:
+    """
+    Retention rules of a stream category; when several are set, the most aggressive one wins.
+
+    No rule drops events that the latest snapshot of the stream does not cover, so that
+    aggregates can always be loaded again: `max_count` and `max_age` keep more events
+    than they ask for until a recent enough snapshot is taken, and nothing at all while
+    the stream has no snapshot.
+
+    Attributes:
+        max_count: Number of most recent events kept in each stream.
+        max_age: Age in seconds after which events are dropped.
+        truncate_before_snapshot: Drop the events covered by the latest snapshot of the stream.
+    """
+    max_count : int | None = None
+    max_age : float | None = None
+    truncate_before_snapshot : bool = False
+
+class Compactor:
+    """
+    Background job physically dropping the events that retention policies no longer keep.
+    """
+
+    def __init__(self, event_store : IEventStore, policies : dict[str, RetentionPolicy], snapshot_store : ISnapshotStore | None = None) -> None:
+        """
+        Args:
+            event_store (IEventStore): Store to compact; it must list, expose and truncate its streams.
+            policies (dict[str, RetentionPolicy]): Retention policy of each stream category.
+            snapshot_store (ISnapshotStore | None): Snapshots bounding what the policies drop; required
+                as soon as a policy drops anything.
+        """
+        if snapshot_store is None and any(policy.truncate_before_snapshot or policy.max_count is not None or policy.max_age is not None for policy in policies.values()):
+            raise ValueError("A snapshot store is required to truncate streams, so that they can be loaded again")
+        self.event_store = event_store
+        self.policies = policies
+        self.snapshot_store = snapshot_store
+        self.dropped = 0
+        self.__task : asyncio.Task | None = None
+
+    async def get_truncation_version(self, stream_id : str, policy : RetentionPolicy, now : float | None = None) -> int:
+        """Get the version before which the policy drops the events of a stream."""
+        descriptors = await self.event_store.get_event_descriptors(stream_id)
+        if not descriptors:
+            return 0
+        head = descriptors[-1].version
+        before_version = descriptors[0].version
+        if policy.max_count is not None:
+            before_version = max(before_version, head - policy.max_count + 1)
+        if policy.max_age is not None:
+            limit = (time.time() if now is None else now) - policy.max_age
+            kept = next((desc.version for desc in descriptors if desc.recorded_at >= limit), head + 1)
+            before_version = max(before_version, kept)
+        snapshot = await self.snapshot_store.get_snapshot(stream_id) if self.snapshot_store is not None else None
+        # Events after the latest snapshot are needed to load the aggregate.
+        limit = snapshot.version + 1 if snapshot is not None else descriptors[0].version
+        if policy.truncate_before_snapshot:
+            before_version = max(before_version, limit)
+        return min(before_version, limit)
+
+    async def run_once(self, now : float | None = None) -> dict[str, int]:
+        """
+        Enforce the policies on every stream once.
+
+        Returns:
+            The number of events dropped from each truncated stream.
+        """
+        res = {}
+        for category, policy in self.policies.items():
+            for stream_id in await self.event_store.get_stream_ids_by_category(category):
+                before_version = await self.get_truncation_version(stream_id, policy, now)
+                dropped = await self.event_store.truncate_stream(stream_id, before_version)
+                if dropped:
+                    res[stream_id] = dropped
+                    self.dropped += dropped
+                await asyncio.sleep(0)
+        return res
+
+    async def run_forever(self, interval : float) -> None:
+        """Enforce the policies every `interval` seconds until cancelled."""
+        while True:
+            await self.run_once()
+            await asyncio.sleep(interval)
+
+    def start(self, interval : float) -> asyncio.Task:
+        """Run the job in the background of the current event loop."""
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run_forever(interval))
+        return self.__task
+
+    async def stop(self) -> None:
+        """Cancel the background job and wait for it to finish."""
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
@@ -0,0 +1,215 @@
+import os
+import abc
+import json
+import time
+import asyncio
+from .encryption import CryptoRepository, reencrypt_members
+from .event_stores import IEventStore, EventDescriptor, get_event_class
+from .exceptions import ConcurrencyError
+
+class IJobCheckpoint(abc.ABC):
+    """Persists how far a background job walking the streams of a store has gone."""
+
+    @abc.abstractmethod
+    def load(self) -> str | None:
+        """Get the last stream completed by the job, or None to start from the first one."""
+
+    @abc.abstractmethod
+    def save(self, stream_id : str | None) -> None:
+        """Record the last stream completed by the job, or None once the job is over."""
+
+class InMemCheckpoint(IJobCheckpoint):
+    def __init__(self) -> None:
+        self.stream_id : str | None = None
+
+    def load(self) -> str | None:
+        return self.stream_id
+
+    def save(self, stream_id : str | None) -> None:
+        self.stream_id = stream_id
+
+class FileCheckpoint(IJobCheckpoint):
+    """
+    Checkpoint kept in a JSON file, replaced atomically on every save.
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+
+    def load(self) -> str | None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)["stream_id"]
+        except FileNotFoundError:
+            return None
+
+    def save(self, stream_id : str | None) -> None:
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({"stream_id" : stream_id}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+class RateLimiter:
+    """
+    Spaces out units of work so that no more than `rate` of them start per second.
+    """
+
+    def __init__(self, rate : float) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.__next = 0.0
+
+    async def acquire(self, units : int = 1) -> None:
+        now = time.monotonic()
+        start = max(now, self.__next)
+        self.__next = start + units / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+class ReEncryptionJob:
+    """
+    Background job re-encrypting the payloads of `encrypted` events with the newest key
+    of their subject.
+
+    Rotate keys with `CryptoRepository.rotate_key` first: readers and writers keep working
+    during the job, since payloads are decrypted with any key generation and encrypted
+    with the newest one. The job walks the streams in order of their ID, `batch_size`
+    streams at a time rewritten by `workers` concurrent tasks, and records the last
+    stream of every completed batch in its checkpoint so that an interrupted job resumes
+    from there. The payloads of a stream are swapped with one `replace_payloads` call,
+    and a stream written in the meantime is read again. A stream failing to be rewritten
+    does not stop the pass: it is recorded in `failed`, and the checkpoint never moves
+    past it, so that the next run starts over from there. The checkpoint is only cleared
+    by a pass without failures; only then can the previous generations be dropped with
+    `CryptoRepository.retire_previous_keys`.
+    The same pass moves the values written with another cipher suite than the one of
+    their event class to that suite.
+    """
+
+    def __init__(self, event_store : IEventStore, checkpoint : IJobCheckpoint | None = None, batch_size : int = 100, workers : int = 4, max_events_per_second : float | None = None, max_attempts : int = 3) -> None:
+        """
+        Args:
+            event_store (IEventStore): Store to rewrite; it must list, expose and rewrite its streams.
+            checkpoint (IJobCheckpoint | None): Where progress is recorded; kept in memory by default.
+            batch_size (int): Number of streams rewritten between two checkpoints.
+            workers (int): Number of streams rewritten concurrently.
+            max_events_per_second (float | None): Limit on the events read per second, None for no limit.
+            max_attempts (int): Number of times a stream is read again when it was written during its rewrite.
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        if workers <= 0:
+            raise ValueError("workers must be positive")
+        if max_attempts <= 0:
+            raise ValueError("max_attempts must be positive")
+        self.event_store = event_store
+        self.checkpoint = checkpoint if checkpoint is not None else InMemCheckpoint()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.limiter = RateLimiter(max_events_per_second) if max_events_per_second is not None else None
+        self.streams = 0
+        self.events_read = 0
+        self.events_rewritten = 0
+        self.conflicts = 0
+        self.failed : dict[str, Exception] = {}
+        self.__task : asyncio.Task | None = None
+
+    async def run(self) -> None:
+        """Rewrite every stream after the checkpoint, then clear the checkpoint unless a stream failed."""
+        after = self.checkpoint.load()
+        stream_ids = sorted(stream_id for stream_id in await self.event_store.get_stream_ids() if after is None or stream_id > after)
+        semaphore = asyncio.Semaphore(self.workers)
+        self.failed = {}
+
+        async def rewrite(stream_id : str) -> None:
+            async with semaphore:
+                await self.reencrypt_stream(stream_id)
+
+        for start in range(0, len(stream_ids), self.batch_size):
+            batch = stream_ids[start:start + self.batch_size]
+            results = await asyncio.gather(*(rewrite(stream_id) for stream_id in batch), return_exceptions=True)
+            blocked = bool(self.failed)
+            for n, (stream_id, result) in enumerate(zip(batch, results)):
+                if isinstance(result, Exception):
+                    if not blocked:
+                        # Resume from the stream before the first failure.
+                        self.checkpoint.save(stream_ids[start + n - 1] if start + n else after)
+                        blocked = True
+                    self.failed[stream_id] = result
+                elif isinstance(result, BaseException):
+                    raise result
+            if not blocked:
+                self.checkpoint.save(batch[-1])
+        if not self.failed:
+            self.checkpoint.save(None)
+
+    async def reencrypt_stream(self, stream_id : str) -> int:
+        """
+        Rewrite the payloads of one stream that are not encrypted with the newest keys.
+
+        Returns:
+            The number of rewritten events.
+
+        Raises:
+            ConcurrencyError: When the stream kept being written during `max_attempts` rewrites.
+        """
+        for attempt in range(self.max_attempts):
+            descriptors = await self.event_store.get_event_descriptors(stream_id)
+            if self.limiter is not None:
+                await self.limiter.acquire(len(descriptors))
+            self.events_read += len(descriptors)
+            rewritten, payloads = await self.__reencrypt(descriptors)
+            if not rewritten:
+                break
+            try:
+                await self.event_store.replace_payloads(stream_id, rewritten, payloads)
+            except ConcurrencyError:
+                self.conflicts += 1
+                if attempt == self.max_attempts - 1:
+                    raise
+                continue
+            self.events_rewritten += len(rewritten)
+            break
+        self.streams += 1
+        return len(rewritten)
+
+    async def __reencrypt(self, descriptors : list[EventDescriptor]) -> tuple[list[EventDescriptor], list[dict]]:
+        encrypted = []
+        for desc in descriptors:
+            cls = get_event_class(desc.event_type)
+            if getattr(cls, "__encrypted_members__", None):
+                encrypted.append((desc, cls, self.event_store.read_payload(desc)))
+        if not encrypted:
+            return [], []
+        keys = await CryptoRepository.fetch_existing_or_none_many({values[cls.__encryption_subject__] for _, cls, values in encrypted})
+        rewritten, payloads = [], []
+        for desc, cls, values in encrypted:
+            key = keys.get(values[cls.__encryption_subject__])
+            if key is None:
+                continue
+            payload = reencrypt_members(cls, values, key)
+            if payload is not None:
+                rewritten.append(desc)
+                payloads.append(payload)
+        return rewritten, payloads
+
+    def start(self) -> asyncio.Task:
+        """Run the job in the background of the current event loop."""
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.run())
+        return self.__task
+
+    async def stop(self) -> None:
+        """Cancel the background job and wait for it to finish; a later run resumes from the checkpoint."""
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
@@ -0,0 +1,231 @@
+import abc
+import heapq
+import asyncio
+import hashlib
+from bisect import bisect_right
+from typing import Iterable
+from .event import IEvent
+from .event_stores import IEventStore, EventDescriptor, PendingAppend, stream_category
+from .exceptions import ArgumentError, ConcurrencyError
+
+class IStreamRouter(abc.ABC):
+    """Chooses the shard holding each stream."""
+
+    @abc.abstractmethod
+    def route(self, stream_id : str) -> str:
+        """Get the name of the shard holding `stream_id`."""
+
+    def shards_for_category(self, category : str) -> list[str] | None:
+        """Get the only shards that can hold streams of `category`, or None when it may be any of them."""
+        return None
+
+class CategoryRouter(IStreamRouter):
+    """
+    Routes streams by their category, the stream ID prefix before the first "-".
+    """
+
+    def __init__(self, routes : dict[str, str], default : str | None = None) -> None:
+        """
+        Args:
+            routes (dict[str, str]): Shard name of each category.
+            default (str | None): Shard of the categories without a route; unrouted streams are rejected when None.
+        """
+        self.routes = dict(routes)
+        self.default = default
+
+    def route(self, stream_id : str) -> str:
+        shard = self.routes.get(stream_category(stream_id), self.default)
+        if shard is None:
+            raise ArgumentError(f"No shard is configured for the category of {stream_id}")
+        return shard
+
+    def shards_for_category(self, category : str) -> list[str] | None:
+        shard = self.routes.get(category, self.default)
+        return [] if shard is None else [shard]
+
+class ConsistentHashRouter(IStreamRouter):
+    """
+    Routes streams by consistent hashing of their ID.
+
+    Each shard owns `replicas` points of a hash ring and a stream goes to the shard owning
+    the first point after the hash of its ID, so adding or removing a shard only moves
+    the streams of the ring segments it gains or loses.
+    """
+
+    def __init__(self, shards : Iterable[str], replicas : int = 128) -> None:
+        if replicas <= 0:
+            raise ValueError("replicas must be positive")
+        self.replicas = replicas
+        self.__ring : list[tuple[int, str]] = []
+        self.__hashes : list[int] = []
+        for shard in shards:
+            self.add_shard(shard)
+
+    @staticmethod
+    def _hash(key : str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    @property
+    def shards(self) -> list[str]:
+        return sorted({shard for _, shard in self.__ring})
+
+    def add_shard(self, shard : str) -> None:
+        self.__ring.extend((self._hash(f"{shard}#{n}"), shard) for n in range(self.replicas))
+        self.__ring.sort()
+        self.__hashes = [point for point, _ in self.__ring]
+
+    def remove_shard(self, shard : str) -> None:
+        self.__ring = [(point, owner) for point, owner in self.__ring if owner != shard]
+        self.__hashes = [point for point, _ in self.__ring]
+
+    def route(self, stream_id : str) -> str:
+        if not self.__ring:
+            raise ArgumentError("The hash ring has no shard")
+        index = bisect_right(self.__hashes, self._hash(stream_id))
+        return self.__ring[index % len(self.__ring)][1]
+
+class RoutingEventStore(IEventStore):
+    """
+    Event store spreading its streams over several backend stores.
+
+    Every operation on one stream goes to the shard chosen by the router. Multi-stream
+    and global reads fan out to the shards concurrently and merge their results. Event
+    positions are only ordered within a shard, so global reads by type are merged by
+    recording time.
+    """
+
+    def __init__(self, shards : dict[str, IEventStore], router : IStreamRouter) -> None:
+        """
+        Args:
+            shards (dict[str, IEventStore]): Backend stores by shard name.
+            router (IStreamRouter): Router choosing the shard of each stream.
+        """
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.shards = dict(shards)
+        self.router = router
+
+    def shard_for(self, stream_id : str) -> IEventStore:
+        return self.shards[self.__route(stream_id)]
+
+    def __route(self, stream_id : str) -> str:
+        name = self.router.route(stream_id)
+        if name not in self.shards:
+            raise ArgumentError(f"{stream_id} is routed to unknown shard '{name}'")
+        return name
+
+    def __group(self, stream_ids : Iterable[str]) -> dict[str, list[str]]:
+        groups : dict[str, list[str]] = {}
+        for stream_id in dict.fromkeys(stream_ids):
+            groups.setdefault(self.__route(stream_id), []).append(stream_id)
+        return groups
+
+    async def save_events(self, aggregate_id : str, events : list[IEvent], expected_version : int, event_ids : list[str] | None = None) -> None:
+        await self.shard_for(aggregate_id).save_events(aggregate_id, events, expected_version, event_ids)
+
+    async def save_events_batch(self, appends : list[PendingAppend]) -> list[Exception | None]:
+        groups : dict[str, list[int]] = {}
+        for n, append in enumerate(appends):
+            groups.setdefault(self.__route(append.aggregate_id), []).append(n)
+        names = list(groups)
+        results = await asyncio.gather(*(self.shards[name].save_events_batch([appends[n] for n in groups[name]]) for name in names))
+        res : list[Exception | None] = [None] * len(appends)
+        for name, shard_results in zip(names, results):
+            for n, error in zip(groups[name], shard_results):
+                res[n] = error
+        return res
+
+    async def get_events_for_aggregate(self, aggregate_id : str, from_version : int = 0, to_version : int | None = None) -> list[IEvent]:
+        return await self.shard_for(aggregate_id).get_events_for_aggregate(aggregate_id, from_version, to_version)
+
+    async def get_events_for_aggregates(self, aggregate_ids : list[str], max_concurrency : int = 8, from_versions : dict[str, int] | None = None) -> dict[str, list[IEvent]]:
+        groups = self.__group(aggregate_ids)
+        results = await asyncio.gather(*(self.shards[name].get_events_for_aggregates(stream_ids, max_concurrency, from_versions) for name, stream_ids in groups.items()))
+        merged = {stream_id : events for shard_results in results for stream_id, events in shard_results.items()}
+        return {aggregate_id : merged[aggregate_id] for aggregate_id in dict.fromkeys(aggregate_ids) if aggregate_id in merged}
+
+    async def get_stream_start(self, aggregate_id : str) -> int:
+        return await self.shard_for(aggregate_id).get_stream_start(aggregate_id)
+
+    async def get_stream_starts(self, aggregate_ids : list[str]) -> dict[str, int]:
+        results = await asyncio.gather(*(self.shards[name].get_stream_starts(stream_ids) for name, stream_ids in self.__group(aggregate_ids).items()))
+        return {stream_id : start for shard_results in results for stream_id, start in shard_results.items()}
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        return await self.shard_for(aggregate_id).get_version_at(aggregate_id, timestamp)
+
+    async def get_event_descriptors(self, aggregate_id : str) -> list[EventDescriptor]:
+        return await self.shard_for(aggregate_id).get_event_descriptors(aggregate_id)
+
+    async def truncate_stream(self, aggregate_id : str, before_version : int) -> int:
+        return await self.shard_for(aggregate_id).truncate_stream(aggregate_id, before_version)
+
+    async def append_descriptors(self, aggregate_id : str, descriptors : list[EventDescriptor], expected_version : int) -> None:
+        await self.shard_for(aggregate_id).append_descriptors(aggregate_id, descriptors, expected_version)
+
+    async def append_descriptors_batch(self, appends : list[tuple[str, list[EventDescriptor], int]]) -> None:
+        """
+        Append the records of several streams, each shard writing its own in one batch.
+
+        Atomicity only holds within a shard. A batch spanning several shards is checked
+        against every shard before any write, so a stale expected version or misnumbered
+        records fail the whole batch; a shard failing afterwards, or a concurrent writer
+        getting in between, can still leave the other shards written.
+
+        Raises:
+            ConcurrencyError: When an expected version does not match its stream; nothing is written then.
+            ArgumentError: When records do not follow their expected version; nothing is written then.
+        """
+        groups : dict[str, list[tuple[str, list[EventDescriptor], int]]] = {}
+        for append in appends:
+            groups.setdefault(self.__route(append[0]), []).append(append)
+        if len(groups) > 1:
+            await self.__check_appends(appends)
+        await asyncio.gather(*(self.shards[name].append_descriptors_batch(group) for name, group in groups.items()))
+
+    async def __check_appends(self, appends : list[tuple[str, list[EventDescriptor], int]]) -> None:
+        stream_ids = list(dict.fromkeys(aggregate_id for aggregate_id, _, _ in appends))
+        streams, starts = await asyncio.gather(
+            asyncio.gather(*(self.get_event_descriptors(stream_id) for stream_id in stream_ids)),
+            self.get_stream_starts(stream_ids))
+        heads = {stream_id : descs[-1].version if descs else starts.get(stream_id, 0) - 1 for stream_id, descs in zip(stream_ids, streams)}
+        for aggregate_id, descriptors, expected_version in appends:
+            head_version = heads[aggregate_id]
+            # The records of a truncated stream start after its dropped versions.
+            if head_version != expected_version and not (head_version == -1 and expected_version >= 0):
+                raise ConcurrencyError()
+            for i, desc in enumerate(descriptors):
+                if desc.version != expected_version + 1 + i:
+                    raise ArgumentError(f"Version {desc.version} does not follow version {expected_version + i} of {aggregate_id}")
+            heads[aggregate_id] = expected_version + len(descriptors)
+
+    async def replace_payloads(self, aggregate_id : str, descriptors : list[EventDescriptor], payloads : list[dict]) -> None:
+        await self.shard_for(aggregate_id).replace_payloads(aggregate_id, descriptors, payloads)
+
+    async def get_stream_ids(self) -> list[str]:
+        results = await asyncio.gather(*(shard.get_stream_ids() for shard in self.shards.values()))
+        return [stream_id for stream_ids in results for stream_id in stream_ids]
+
+    async def get_stream_ids_by_category(self, category : str) -> list[str]:
+        names = self.router.shards_for_category(category)
+        shards = self.shards.values() if names is None else [self.shards[name] for name in names]
+        results = await asyncio.gather(*(shard.get_stream_ids_by_category(category) for shard in shards))
+        return [stream_id for stream_ids in results for stream_id in stream_ids]
+
+    async def __descriptors_by_type(self, event_type : str) -> list[tuple[EventDescriptor, IEventStore]]:
+        shards = list(self.shards.values())
+        results = await asyncio.gather(*(shard.get_event_descriptors_by_type(event_type) for shard in shards))
+        runs = [[(desc, shard) for desc in descs] for shard, descs in zip(shards, results)]
+        return list(heapq.merge(*runs, key=lambda item: item[0].recorded_at))
+
+    async def get_event_descriptors_by_type(self, event_type : str) -> list[EventDescriptor]:
+        return [desc for desc, _ in await self.__descriptors_by_type(event_type)]
+
+    async def get_events_by_type(self, event_type : str) -> list[IEvent]:
+        return [shard._decode_event(desc) for desc, shard in await self.__descriptors_by_type(event_type)]
+
+    def _read_payload(self, desc : EventDescriptor) -> dict:
+        return self.shard_for(desc.id)._read_payload(desc)
+
+    def _decode_event(self, desc : EventDescriptor) -> IEvent:
+        return self.shard_for(desc.id)._decode_event(desc)
@@ -0,0 +1,81 @@
+import abc
+import time
+import asyncio
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from .encryption import CryptoRepository
+
+@dataclass
+class Snapshot:
+    """
+    State of an aggregate root after applying every event of its stream up to `version`.
+
+    The state holds the decrypted values of the encrypted events applied, so the subjects
+    of those events are listed in `subject_ids`.
+    """
+    stream_id : str
+    version : int
+    state : dict
+    taken_at : float = field(default_factory=time.time)
+    subject_ids : list[str] = field(default_factory=list)
+
+class ISnapshotStore(abc.ABC):
+    """
+    Abstract base class for snapshot storage.
+
+    Snapshots hold decrypted state, so stores must drop the snapshots listing a subject
+    as soon as its encryption key is deleted through `CryptoRepository`; otherwise they
+    would keep serving shredded data.
+    """
+
+    @abc.abstractmethod
+    async def save_snapshot(self, snapshot : Snapshot) -> None:
+        """Store a snapshot."""
+
+    @abc.abstractmethod
+    async def get_snapshot(self, stream_id : str, max_version : int | None = None) -> Snapshot | None:
+        """Get the latest snapshot of a stream, or the latest one taken at or before `max_version`."""
+
+    async def get_snapshots(self, stream_ids : list[str]) -> dict[str, Snapshot]:
+        """Get the latest snapshot of each of several streams, leaving out those without one; durable stores should batch this."""
+        stream_ids = list(dict.fromkeys(stream_ids))
+        snapshots = await asyncio.gather(*(self.get_snapshot(stream_id) for stream_id in stream_ids))
+        return {stream_id : snapshot for stream_id, snapshot in zip(stream_ids, snapshots) if snapshot is not None}
+
+class InMemSnapshotStore(ISnapshotStore):
+    def __init__(self) -> None:
+        self.current : dict[str, list[Snapshot]] = {}
+        self.__by_subject : dict[str, set[str]] = {}
+        CryptoRepository.on_key_deleted(self.evict_subject)
+
+    def evict_subject(self, subject_id : str) -> None:
+        """Drop every snapshot holding the decrypted data of `subject_id`."""
+        for stream_id in self.__by_subject.pop(subject_id, set()):
+            snapshots = [s for s in self.current.get(stream_id, []) if subject_id not in s.subject_ids]
+            if snapshots:
+                self.current[stream_id] = snapshots
+            else:
+                self.current.pop(stream_id, None)
+
+    async def save_snapshot(self, snapshot : Snapshot) -> None:
+        for subject_id in snapshot.subject_ids:
+            self.__by_subject.setdefault(subject_id, set()).add(snapshot.stream_id)
+        snapshots = self.current.setdefault(snapshot.stream_id, [])
+        versions = [s.version for s in snapshots]
+        index = bisect_right(versions, snapshot.version)
+        if index and versions[index - 1] == snapshot.version:
+            snapshots[index - 1] = snapshot
+        else:
+            snapshots.insert(index, snapshot)
+
+    async def get_snapshots(self, stream_ids : list[str]) -> dict[str, Snapshot]:
+        return {stream_id : self.current[stream_id][-1] for stream_id in stream_ids if self.current.get(stream_id)}
+
+    async def get_snapshot(self, stream_id : str, max_version : int | None = None) -> Snapshot | None:
+        snapshots = self.current.get(stream_id)
+        if not snapshots:
+            return None
+        if max_version is None:
+            return snapshots[-1]
+        index = bisect_right([s.version for s in snapshots], max_version)
+        return snapshots[index - 1] if index else None
@@ -0,0 +1,392 @@
+import sqlite3
+from concurrent.futures import Executor
+from typing import Callable
+from .bloom import BloomFilter
+from .cache import DecodedEventCache
+from .compression import PayloadCompressor
+from .event import IEvent
+from .encryption import get_subject_id
+from .event_stores import IEventStore, EventDescriptor, PendingAppend, stream_category
+from .exceptions import ArgumentError, ConcurrencyError
+from .outbox import IOutbox, OutboxEntry
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    stream_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    event_data BLOB NOT NULL,
+    compression TEXT,
+    recorded_at REAL NOT NULL,
+    event_id TEXT,
+    subject_id TEXT,
+    UNIQUE (stream_id, version)
+);
+CREATE INDEX IF NOT EXISTS events_by_type ON events (event_type, position);
+CREATE INDEX IF NOT EXISTS events_by_time ON events (stream_id, recorded_at);
+CREATE TABLE IF NOT EXISTS stream_starts (
+    stream_id TEXT PRIMARY KEY,
+    start INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    stream_id TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS compression_dictionaries (
+    id TEXT PRIMARY KEY,
+    dictionary BLOB NOT NULL,
+    event_type TEXT
+);
+"""
+
+_INSERT = "INSERT INTO events (stream_id, version, event_type, event_data, compression, recorded_at, event_id, subject_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+# Streams read by one query of `get_events_for_aggregates`, two parameters each.
+_STREAMS_PER_QUERY = 400
+
+_COLUMNS = "stream_id, event_type, event_data, version, compression, recorded_at, position, event_id, subject_id"
+
+class SqliteOutbox(IOutbox):
+    """
+    Outbox kept in the `outbox` table of an SQLite event store.
+
+    The store inserts the rows of an append in the transaction, and the savepoint, that
+    writes its events, so the entries not acknowledged yet survive a crash. Rows only
+    reference the events, which are read and decoded by `pending`.
+    """
+
+    def __init__(self, connection : sqlite3.Connection, decode : Callable[[EventDescriptor], IEvent]) -> None:
+        self.__connection = connection
+        self.__decode = decode
+
+    def __len__(self) -> int:
+        return self.__connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def pending(self, after_position : int = 0, limit : int | None = None) -> list[OutboxEntry]:
+        rows = self.__connection.execute(f"SELECT outbox.position, {', '.join('events.' + column for column in _COLUMNS.split(', '))} FROM outbox JOIN events ON events.stream_id = outbox.stream_id AND events.version = outbox.version WHERE outbox.position > ? ORDER BY outbox.position LIMIT ?", (after_position, -1 if limit is None else limit)).fetchall()
+        return [OutboxEntry(row[0], row[1], row[4], self.__decode(EventDescriptor(*row[1:]))) for row in rows]
+
+    def acknowledge(self, positions : list[int]) -> None:
+        cursor = self.__connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany("DELETE FROM outbox WHERE position = ?", [(position,) for position in positions])
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+class SqliteEventStore(IEventStore):
+    """
+    Durable event store on an SQLite database.
+
+    Every transaction is committed with `synchronous=FULL`, so a successful `save_events`
+    has been flushed to disk. `save_events_batch` writes a whole batch in one transaction:
+    each append runs in its own savepoint, so a conflicting append is rolled back alone
+    and the batch pays a single commit. The database is accessed synchronously on the
+    event loop thread.
+
+    The dictionaries of the `compressor` are saved in the transaction writing the first
+    record that uses them, and registered again when the store is opened.
+
+    With `outbox`, the events of every append are queued in a `SqliteOutbox` in the same
+    transaction, available as the `outbox` attribute for an `OutboxDispatcher`.
+
+    With a `stream_filter`, the IDs of the stored streams are kept in a Bloom filter,
+    filled from the database when the store is opened: reads of streams that do not
+    exist and checks of new streams are then answered without querying the database.
+    The filter only sees the appends made through this store, so it must not be used
+    when other processes write to the same database.
+    """
+
+    def __init__(self, path : str, event_cache : DecodedEventCache | None = None, compressor : PayloadCompressor | None = None, outbox : bool = False, decode_executor : Executor | None = None, inline_decode_threshold : int = 256, stream_filter : BloomFilter | None = None) -> None:
+        """
+        Args:
+            path (str): Database file, created if it does not exist; ":memory:" for a private in-memory database.
+            outbox (bool): Queue the events of each append in the `outbox` table.
+            decode_executor (Executor | None): Thread or process pool decoding reads of at least `inline_decode_threshold` records.
+            stream_filter (BloomFilter | None): Empty filter sized for the expected number of streams.
+        """
+        self.event_cache = event_cache
+        self.compressor = compressor
+        self.decode_executor = decode_executor
+        self.inline_decode_threshold = inline_decode_threshold
+        self.commits = 0
+        self.filtered_lookups = 0
+        self.stream_filter = stream_filter
+        self.__connection = sqlite3.connect(path, isolation_level=None)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=FULL")
+        self.__connection.executescript(_SCHEMA)
+        self.outbox = SqliteOutbox(self.__connection, self._decode_event) if outbox else None
+        self.__saved_dictionaries : set[str] = set()
+        if compressor is not None:
+            # In insertion order, so the last dictionary of each type is used for it again.
+            for dictionary_id, dictionary, event_type in self.__connection.execute("SELECT id, dictionary, event_type FROM compression_dictionaries ORDER BY rowid"):
+                compressor.add_dictionary(dictionary, event_type)
+                self.__saved_dictionaries.add(dictionary_id)
+        if stream_filter is not None:
+            stream_filter.clear()
+            # Streams truncated up to their head only remain in their recorded start.
+            stream_filter.update(row[0] for row in self.__connection.execute("SELECT stream_id FROM events UNION SELECT stream_id FROM stream_starts"))
+
+    def __absent(self, aggregate_id : str) -> bool:
+        """Tell whether the stream is known not to exist without querying the database."""
+        if self.stream_filter is None or aggregate_id in self.stream_filter:
+            return False
+        self.filtered_lookups += 1
+        return True
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    async def save_events(self, aggregate_id : str, events : list[IEvent], expected_version : int, event_ids : list[str] | None = None) -> None:
+        error = (await self.save_events_batch([PendingAppend(aggregate_id, events, expected_version, event_ids)]))[0]
+        if error is not None:
+            raise error
+
+    async def save_events_batch(self, appends : list[PendingAppend]) -> list[Exception | None]:
+        res : list[Exception | None] = []
+        committed = False
+        dictionaries : set[str] = set()
+        cursor = self.__connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for append in appends:
+                cursor.execute("SAVEPOINT append")
+                try:
+                    written = set()
+                    committed = self.__write(cursor, append, written) or committed
+                    cursor.execute("RELEASE append")
+                    dictionaries |= written
+                    res.append(None)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO append")
+                    cursor.execute("RELEASE append")
+                    res.append(e)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        self.commits += 1
+        self.__saved_dictionaries |= dictionaries
+        if committed and self.outbox is not None:
+            self.outbox._notify()
+        return res
+
+    def __write(self, cursor : sqlite3.Cursor, append : PendingAppend, dictionaries : set[str]) -> bool:
+        """Write one append, returning False when it is a retry of events already stored."""
+        aggregate_id, events, expected_version, event_ids = append.aggregate_id, append.events, append.expected_version, append.event_ids
+        if event_ids is not None and len(event_ids) != len(events):
+            raise ArgumentError("One event id is required for each event")
+        if self.__absent(aggregate_id):
+            if expected_version != -1:
+                raise ConcurrencyError()
+        else:
+            if event_ids:
+                stored = cursor.execute("SELECT event_id FROM events WHERE stream_id = ? AND version > ? AND version <= ? ORDER BY version", (aggregate_id, expected_version, expected_version + len(event_ids))).fetchall()
+                if [row[0] for row in stored] == event_ids:
+                    return False
+            if self.__head_version(cursor, aggregate_id) != expected_version:
+                raise ConcurrencyError()
+        rows = []
+        for n, event in enumerate(events):
+            event_data, compression = self._encode_payload(event)
+            desc = EventDescriptor(aggregate_id, event.type, event_data, expected_version + 1 + n, compression, event_id=event_ids[n] if event_ids is not None else None, subject_id=get_subject_id(event))
+            rows.append((desc.id, desc.version, desc.event_type, desc.event_data, desc.compression, desc.recorded_at, desc.event_id, desc.subject_id))
+        self.__insert(cursor, aggregate_id, rows)
+        self.__save_dictionaries(cursor, [(row[2], row[4]) for row in rows], dictionaries)
+        if self.outbox is not None:
+            cursor.executemany("INSERT INTO outbox (stream_id, version) VALUES (?, ?)", [(row[0], row[1]) for row in rows])
+        return True
+
+    def __save_dictionaries(self, cursor : sqlite3.Cursor, records : list[tuple[str, str | None]], dictionaries : set[str]) -> None:
+        """Save the compressor dictionaries used by new `(event type, compression)` records, adding their IDs to `dictionaries`."""
+        if self.compressor is None:
+            return
+        for event_type, compression in records:
+            dictionary_id = compression.partition(":")[2] if compression is not None else ""
+            if not dictionary_id or dictionary_id in self.__saved_dictionaries or dictionary_id in dictionaries:
+                continue
+            dictionary = self.compressor.dictionaries.get(dictionary_id)
+            if dictionary is None:
+                continue
+            current = event_type if self.compressor.dictionary_for(event_type) == dictionary_id else None
+            cursor.execute("INSERT OR IGNORE INTO compression_dictionaries (id, dictionary, event_type) VALUES (?, ?, ?)", (dictionary_id, dictionary, current))
+            dictionaries.add(dictionary_id)
+
+    def __insert(self, cursor : sqlite3.Cursor, aggregate_id : str, rows : list[tuple]) -> None:
+        try:
+            cursor.executemany(_INSERT, rows)
+        except sqlite3.IntegrityError:
+            raise ConcurrencyError()
+        if self.stream_filter is not None and rows:
+            # Added before the commit: a rollback only leaves a false positive behind.
+            self.stream_filter.add(aggregate_id)
+
+    @staticmethod
+    def __head_version(cursor : sqlite3.Cursor, aggregate_id : str) -> int:
+        version = cursor.execute("SELECT MAX(version) FROM events WHERE stream_id = ?", (aggregate_id,)).fetchone()[0]
+        if version is not None:
+            return version
+        # A stream truncated up to its head keeps its version in its recorded start.
+        start = cursor.execute("SELECT start FROM stream_starts WHERE stream_id = ?", (aggregate_id,)).fetchone()
+        return -1 if start is None else start[0] - 1
+
+    @staticmethod
+    def __stream_start(cursor : sqlite3.Cursor, aggregate_id : str) -> int:
+        start = cursor.execute("SELECT start FROM stream_starts WHERE stream_id = ?", (aggregate_id,)).fetchone()
+        if start is not None:
+            return start[0]
+        version = cursor.execute("SELECT MIN(version) FROM events WHERE stream_id = ?", (aggregate_id,)).fetchone()[0]
+        return 0 if version is None else version
+
+    async def append_descriptors(self, aggregate_id : str, descriptors : list[EventDescriptor], expected_version : int) -> None:
+        await self.append_descriptors_batch([(aggregate_id, descriptors, expected_version)])
+
+    async def append_descriptors_batch(self, appends : list[tuple[str, list[EventDescriptor], int]]) -> None:
+        """Append the records of several streams in one transaction, none of them when one fails."""
+        dictionaries : set[str] = set()
+        cursor = self.__connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for aggregate_id, descriptors, expected_version in appends:
+                head_version = -1 if self.__absent(aggregate_id) else self.__head_version(cursor, aggregate_id)
+                # The records of a truncated stream start after its dropped versions.
+                if head_version != expected_version and not (head_version == -1 and expected_version >= 0):
+                    raise ConcurrencyError()
+                rows = []
+                for i, desc in enumerate(descriptors):
+                    if desc.version != expected_version + 1 + i:
+                        raise ArgumentError(f"Version {desc.version} does not follow version {expected_version + i} of {aggregate_id}")
+                    rows.append((aggregate_id, desc.version, desc.event_type, desc.event_data, desc.compression, desc.recorded_at, desc.event_id, desc.subject_id))
+                self.__insert(cursor, aggregate_id, rows)
+                self.__save_dictionaries(cursor, [(row[2], row[4]) for row in rows], dictionaries)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        self.commits += 1
+        self.__saved_dictionaries |= dictionaries
+
+    async def replace_payloads(self, aggregate_id : str, descriptors : list[EventDescriptor], payloads : list[dict]) -> None:
+        dictionaries : set[str] = set()
+        cursor = self.__connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            for desc, values in zip(descriptors, payloads):
+                event_data, compression = self._encode_values(desc.event_type, values)
+                cursor.execute("UPDATE events SET event_data = ?, compression = ? WHERE stream_id = ? AND version = ? AND event_data = ? AND compression IS ?", (event_data, compression, aggregate_id, desc.version, desc.event_data, desc.compression))
+                if cursor.rowcount != 1:
+                    raise ConcurrencyError()
+                self.__save_dictionaries(cursor, [(desc.event_type, compression)], dictionaries)
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        self.commits += 1
+        self.__saved_dictionaries |= dictionaries
+
+    def __select(self, where : str, parameters : tuple) -> list[EventDescriptor]:
+        rows = self.__connection.execute(f"SELECT {_COLUMNS} FROM events WHERE {where}", parameters).fetchall()
+        return [EventDescriptor(*row) for row in rows]
+
+    async def get_events_for_aggregate(self, aggregate_id : str, from_version : int = 0, to_version : int | None = None) -> list[IEvent]:
+        if self.__absent(aggregate_id):
+            return []
+        if to_version is None:
+            descriptors = self.__select("stream_id = ? AND version >= ? ORDER BY version", (aggregate_id, from_version))
+        else:
+            descriptors = self.__select("stream_id = ? AND version >= ? AND version <= ? ORDER BY version", (aggregate_id, from_version, to_version))
+        if not descriptors:
+            return []
+        return (await self._decode_streams({aggregate_id : descriptors}))[aggregate_id]
+
+    async def get_events_for_aggregates(self, aggregate_ids : list[str], max_concurrency : int = 8, from_versions : dict[str, int] | None = None) -> dict[str, list[IEvent]]:
+        from_versions = from_versions or {}
+        aggregate_ids = [aggregate_id for aggregate_id in dict.fromkeys(aggregate_ids) if not self.__absent(aggregate_id)]
+        found : dict[str, list[EventDescriptor]] = {}
+        for i in range(0, len(aggregate_ids), _STREAMS_PER_QUERY):
+            chunk = aggregate_ids[i:i + _STREAMS_PER_QUERY]
+            # One query reads every stream of the chunk from its own first version.
+            wanted = ", ".join("(?, ?)" for _ in chunk)
+            parameters = tuple(value for aggregate_id in chunk for value in (aggregate_id, from_versions.get(aggregate_id, 0)))
+            rows = self.__connection.execute(f"WITH wanted (stream_id, from_version) AS (VALUES {wanted}) SELECT {', '.join('events.' + column for column in _COLUMNS.split(', '))} FROM events JOIN wanted ON events.stream_id = wanted.stream_id AND events.version >= wanted.from_version ORDER BY events.stream_id, events.version", parameters)
+            for row in rows:
+                found.setdefault(row[0], []).append(EventDescriptor(*row))
+        streams = {aggregate_id : found[aggregate_id] for aggregate_id in aggregate_ids if aggregate_id in found}
+        return await self._decode_streams(streams, max_concurrency)
+
+    async def get_stream_start(self, aggregate_id : str) -> int:
+        if self.__absent(aggregate_id):
+            return 0
+        return self.__stream_start(self.__connection.cursor(), aggregate_id)
+
+    async def get_stream_starts(self, aggregate_ids : list[str]) -> dict[str, int]:
+        aggregate_ids = list(dict.fromkeys(aggregate_ids))
+        res = dict.fromkeys(aggregate_ids, 0)
+        present = [aggregate_id for aggregate_id in aggregate_ids if not self.__absent(aggregate_id)]
+        for i in range(0, len(present), _STREAMS_PER_QUERY):
+            chunk = present[i:i + _STREAMS_PER_QUERY]
+            marks = ", ".join("?" for _ in chunk)
+            # Recorded starts come last and override the first stored versions.
+            rows = self.__connection.execute(f"SELECT stream_id, MIN(version), 0 FROM events WHERE stream_id IN ({marks}) GROUP BY stream_id UNION ALL SELECT stream_id, start, 1 FROM stream_starts WHERE stream_id IN ({marks}) ORDER BY 3", (*chunk, *chunk))
+            for stream_id, start, _ in rows:
+                res[stream_id] = start
+        return res
+
+    async def truncate_stream(self, aggregate_id : str, before_version : int) -> int:
+        """
+        Delete the events of a stream before `before_version`, recording where the stream
+        now starts so that its version survives even when every event is dropped. Events
+        still waiting in the outbox are kept, so truncation stops at the first of them.
+        """
+        if self.__absent(aggregate_id):
+            return 0
+        cursor = self.__connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            before_version = min(before_version, self.__head_version(cursor, aggregate_id) + 1)
+            undelivered = cursor.execute("SELECT MIN(version) FROM outbox WHERE stream_id = ?", (aggregate_id,)).fetchone()[0]
+            if undelivered is not None:
+                before_version = min(before_version, undelivered)
+            if before_version <= self.__stream_start(cursor, aggregate_id):
+                cursor.execute("COMMIT")
+                return 0
+            cursor.execute("DELETE FROM events WHERE stream_id = ? AND version < ?", (aggregate_id, before_version))
+            dropped = cursor.rowcount
+            cursor.execute("INSERT INTO stream_starts (stream_id, start) VALUES (?, ?) ON CONFLICT (stream_id) DO UPDATE SET start = excluded.start", (aggregate_id, before_version))
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        self.commits += 1
+        if self.event_cache is not None:
+            self.event_cache.evict_stream(aggregate_id)
+        return dropped
+
+    async def get_version_at(self, aggregate_id : str, timestamp : float) -> int:
+        if self.__absent(aggregate_id):
+            return -1
+        cursor = self.__connection.cursor()
+        version = cursor.execute("SELECT MAX(version) FROM events WHERE stream_id = ? AND recorded_at <= ?", (aggregate_id, timestamp)).fetchone()[0]
+        # Without a kept event, the stream was at the version before its start.
+        return self.__stream_start(cursor, aggregate_id) - 1 if version is None else version
+
+    async def get_stream_ids(self) -> list[str]:
+        return [row[0] for row in self.__connection.execute("SELECT stream_id FROM events GROUP BY stream_id ORDER BY MIN(position)")]
+
+    async def get_stream_ids_by_category(self, category : str) -> list[str]:
+        # Stream IDs of the category sort between the category and the category followed by "."
+        # (right after "-"), so the range is read from the (stream_id, version) index.
+        rows = self.__connection.execute("SELECT stream_id FROM events WHERE stream_id >= ? AND stream_id < ? GROUP BY stream_id ORDER BY MIN(position)", (category, category + "."))
+        return [row[0] for row in rows if stream_category(row[0]) == category]
+
+    async def get_event_descriptors(self, aggregate_id : str) -> list[EventDescriptor]:
+        if self.__absent(aggregate_id):
+            return []
+        return self.__select("stream_id = ? ORDER BY version", (aggregate_id,))
+
+    async def get_event_descriptors_by_type(self, event_type : str) -> list[EventDescriptor]:
+        return self.__select("event_type = ? ORDER BY position", (event_type,))
@@ -0,0 +1,155 @@
+import os
+import json
+import zlib
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Optional
+from .cache import DecodedEventCache
+from .compression import PayloadCompressor
+from .event_stores import InMemEventStore, EventDescriptor
+from .outbox import Outbox
+from .idempotency import DedupIndex
+
+class TieredEventStore(InMemEventStore):
+    """
+    In-memory event store keeping only recently used streams in memory.
+
+    `current` holds the hot streams in least recently used order. When the hot tier goes
+    over its budget, the coldest streams are compressed and appended to an on-disk
+    segment file, and loaded back into memory the next time they are read or written.
+    The segment is scratch space owned by the store: it is not a durable backend.
+    """
+
+    def __init__(self, max_hot_events : Optional[int] = None, max_hot_bytes : Optional[int] = None, segment_path : Optional[str] = None, event_cache : Optional[DecodedEventCache] = None, compressor : Optional[PayloadCompressor] = None, outbox : Optional[Outbox] = None, dedup_index : Optional[DedupIndex] = None, decode_executor : Optional[Executor] = None, inline_decode_threshold : int = 256) -> None:
+        """
+        Args:
+            max_hot_events (Optional[int]): Maximum number of events kept in memory.
+            max_hot_bytes (Optional[int]): Maximum summed payload size kept in memory.
+            segment_path (Optional[str]): File used for the cold tier, overwritten if it exists; a temporary file by default.
+        """
+        if max_hot_events is None and max_hot_bytes is None:
+            raise ValueError("A memory budget in events or in bytes is required")
+        super().__init__(event_cache=event_cache, compressor=compressor, outbox=outbox, dedup_index=dedup_index, decode_executor=decode_executor, inline_decode_threshold=inline_decode_threshold)
+        self.current : OrderedDict[str, list[EventDescriptor]] = OrderedDict()
+        self.max_hot_events = max_hot_events
+        self.max_hot_bytes = max_hot_bytes
+        self.hot_events = 0
+        self.hot_bytes = 0
+        self.evictions = 0
+        self.loads = 0
+        self.__sizes : dict[str, tuple[int, int]] = {}
+        self.__cold : dict[str, tuple[int, int]] = {}
+        self.__garbage = 0
+        self.__owns_segment = segment_path is None
+        if segment_path is None:
+            fd, segment_path = tempfile.mkstemp(suffix=".segment")
+            os.close(fd)
+        self.segment_path = segment_path
+        self.__segment = open(segment_path, "w+b")
+
+    @property
+    def cold_stream_ids(self) -> list[str]:
+        return list(self.__cold)
+
+    @property
+    def segment_garbage(self) -> int:
+        """Bytes of the segment file holding streams that were loaded back into memory."""
+        return self.__garbage
+
+    def stats(self) -> dict:
+        return {"hot_streams" : len(self.current), "cold_streams" : len(self.__cold), "hot_events" : self.hot_events, "hot_bytes" : self.hot_bytes, "evictions" : self.evictions, "loads" : self.loads, "segment_garbage" : self.__garbage}
+
+    async def get_stream_ids(self) -> list[str]:
+        return list(self.current) + list(self.__cold)
+
+    def _get_stream(self, aggregate_id : str) -> list[EventDescriptor] | None:
+        event_descriptors = self.current.get(aggregate_id)
+        if event_descriptors is not None:
+            self.current.move_to_end(aggregate_id)
+            return event_descriptors
+        if aggregate_id not in self.__cold:
+            return None
+        event_descriptors = self.__load(aggregate_id)
+        self.current[aggregate_id] = event_descriptors
+        self.__account(aggregate_id, event_descriptors)
+        self.__enforce_budget(keep=aggregate_id)
+        return event_descriptors
+
+    def _stream_written(self, aggregate_id : str, event_descriptors : list[EventDescriptor]) -> None:
+        self.__account(aggregate_id, event_descriptors)
+        self.__enforce_budget(keep=aggregate_id)
+
+    def _replace(self, aggregate_id : str, event_descriptors : list[EventDescriptor], replacements : dict[int, EventDescriptor]) -> None:
+        # The event count is unchanged, so `__account` cannot see the new payload sizes.
+        delta = sum(len(desc.event_data) - len(event_descriptors[index].event_data) for index, desc in replacements.items())
+        events, size = self.__sizes[aggregate_id]
+        self.__sizes[aggregate_id] = (events, size + delta)
+        self.hot_bytes += delta
+        super()._replace(aggregate_id, event_descriptors, replacements)
+
+    def evict(self, aggregate_id : str) -> None:
+        """Move a hot stream to the cold tier."""
+        event_descriptors = self.current.pop(aggregate_id)
+        events, size = self.__sizes.pop(aggregate_id, (0, 0))
+        self.hot_events -= events
+        self.hot_bytes -= size
+        data = zlib.compress(json.dumps([desc.to_record() for desc in event_descriptors]).encode("utf-8"))
+        self.__segment.seek(0, os.SEEK_END)
+        offset = self.__segment.tell()
+        self.__segment.write(data)
+        self.__segment.flush()
+        self.__cold[aggregate_id] = (offset, len(data))
+        self.evictions += 1
+
+    def compact_segment(self) -> None:
+        """Rewrite the segment file without the space left by streams loaded back into memory."""
+        fd, path = tempfile.mkstemp(suffix=".segment", dir=os.path.dirname(os.path.abspath(self.segment_path)))
+        cold = {}
+        with os.fdopen(fd, "w+b") as new_segment:
+            for aggregate_id, (offset, length) in self.__cold.items():
+                self.__segment.seek(offset)
+                cold[aggregate_id] = (new_segment.tell(), length)
+                new_segment.write(self.__segment.read(length))
+        self.__segment.close()
+        os.replace(path, self.segment_path)
+        self.__segment = open(self.segment_path, "r+b")
+        self.__cold = cold
+        self.__garbage = 0
+
+    def close(self) -> None:
+        self.__segment.close()
+        if self.__owns_segment and os.path.exists(self.segment_path):
+            os.remove(self.segment_path)
+
+    def __load(self, aggregate_id : str) -> list[EventDescriptor]:
+        offset, length = self.__cold.pop(aggregate_id)
+        self.__segment.seek(offset)
+        records = json.loads(zlib.decompress(self.__segment.read(length)))
+        self.__garbage += length
+        self.loads += 1
+        return [EventDescriptor.from_record(record) for record in records]
+
+    def __account(self, aggregate_id : str, event_descriptors : list[EventDescriptor]) -> None:
+        old_events, old_size = self.__sizes.get(aggregate_id, (0, 0))
+        events = len(event_descriptors)
+        if events >= old_events:
+            size = old_size + sum(len(desc.event_data) for desc in event_descriptors[old_events:])
+        else:
+            size = sum(len(desc.event_data) for desc in event_descriptors)
+        self.__sizes[aggregate_id] = (events, size)
+        self.hot_events += events - old_events
+        self.hot_bytes += size - old_size
+
+    def __over_budget(self) -> bool:
+        return (self.max_hot_events is not None and self.hot_events > self.max_hot_events) or (self.max_hot_bytes is not None and self.hot_bytes > self.max_hot_bytes)
+
+    def __enforce_budget(self, keep : str) -> None:
+        while self.__over_budget():
+            coldest = next(iter(self.current))
+            if coldest == keep:
+                if len(self.current) == 1:
+                    return
+                self.current.move_to_end(keep)
+                continue
+            self.evict(coldest)
@@ -0,0 +1,161 @@
+"""
+Stream whole event stores to and from files.
+
+Usage:
+    python -m eventsourcing.transfer export DATABASE FILE [--format ndjson|framed]
+    python -m eventsourcing.transfer import DATABASE FILE [--format ndjson|framed] [--batch-size N]
+
+DATABASE is an SQLite event store. Records are `EventDescriptor.to_record()`
+dictionaries, copied with their payloads as stored: encrypted members stay encrypted and
+compressed payloads stay compressed, so an import needs the keys and compression
+dictionaries of the exported store, not the event classes.
+"""
+import sys
+import json
+import struct
+import asyncio
+import argparse
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator
+from .event_stores import IEventStore, EventDescriptor
+
+NDJSON = "ndjson"
+FRAMED = "framed"
+
+_HEADER = struct.Struct("!I")
+_CHUNK_SIZE = 1 << 20
+
+def _frame(record : dict, format : str) -> bytes:
+    data = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    if format == NDJSON:
+        return data + b"\n"
+    return _HEADER.pack(len(data)) + data
+
+def write_records(file : BinaryIO, records : Iterable[dict], format : str = NDJSON) -> int:
+    """
+    Write records to a binary file in chunks of about 1 MiB.
+
+    Args:
+        file (BinaryIO): File opened for binary writing.
+        records (Iterable[dict]): Records to write, consumed lazily.
+        format (str): `NDJSON` for one JSON document per line, `FRAMED` for JSON documents
+            prefixed by their length as a 4-byte big-endian integer.
+
+    Returns:
+        The number of written records.
+    """
+    if format not in (NDJSON, FRAMED):
+        raise ValueError(f"Unknown transfer format '{format}'")
+    count = 0
+    chunk : list[bytes] = []
+    size = 0
+    for record in records:
+        frame = _frame(record, format)
+        chunk.append(frame)
+        size += len(frame)
+        count += 1
+        if size >= _CHUNK_SIZE:
+            file.write(b"".join(chunk))
+            chunk, size = [], 0
+    if chunk:
+        file.write(b"".join(chunk))
+    return count
+
+def read_records(file : BinaryIO, format : str = NDJSON) -> Iterator[dict]:
+    """Read the records of a binary file one at a time, in the format given to `write_records`."""
+    if format == NDJSON:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+    elif format == FRAMED:
+        while True:
+            header = file.read(_HEADER.size)
+            if not header:
+                return
+            if len(header) != _HEADER.size:
+                raise ValueError("Truncated record header")
+            (length,) = _HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) != length:
+                raise ValueError("Truncated record")
+            yield json.loads(data)
+    else:
+        raise ValueError(f"Unknown transfer format '{format}'")
+
+async def iter_descriptors(event_store : IEventStore, stream_ids : Iterable[str] | None = None) -> AsyncIterator[list[EventDescriptor]]:
+    """Yield the stored records of each stream in turn, holding one stream in memory at a time."""
+    for stream_id in (await event_store.get_stream_ids() if stream_ids is None else stream_ids):
+        descriptors = await event_store.get_event_descriptors(stream_id)
+        if descriptors:
+            yield descriptors
+
+async def export_events(event_store : IEventStore, file : BinaryIO, format : str = NDJSON, stream_ids : Iterable[str] | None = None) -> int:
+    """
+    Write the records of every stream, or of `stream_ids`, without decoding their payloads.
+
+    Returns:
+        The number of exported events.
+    """
+    count = 0
+    async for descriptors in iter_descriptors(event_store, stream_ids):
+        count += write_records(file, (desc.to_record() for desc in descriptors), format)
+    return count
+
+async def import_events(event_store : IEventStore, file : BinaryIO, format : str = NDJSON, batch_size : int = 10_000) -> int:
+    """
+    Append the records of a file through `append_descriptors_batch`, `batch_size` events at a time.
+
+    Consecutive records of a stream are appended together, expecting the stream to end
+    right before the first of them: a stream that already holds these versions makes
+    the import fail with `ConcurrencyError`.
+
+    Returns:
+        The number of imported events.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    count = 0
+    batch : list[tuple[str, list[EventDescriptor], int]] = []
+    pending = 0
+    run : list[EventDescriptor] | None = None
+    for record in read_records(file, format):
+        desc = EventDescriptor.from_record(record)
+        if run is None or desc.id != run[-1].id or desc.version != run[-1].version + 1:
+            run = [desc]
+            batch.append((desc.id, run, desc.version - 1))
+        else:
+            run.append(desc)
+        pending += 1
+        if pending >= batch_size:
+            await event_store.append_descriptors_batch(batch)
+            count += pending
+            batch, pending, run = [], 0, None
+    if batch:
+        await event_store.append_descriptors_batch(batch)
+        count += pending
+    return count
+
+async def run(args : argparse.Namespace) -> str:
+    from .sqlite import SqliteEventStore
+    event_store = SqliteEventStore(args.database)
+    try:
+        if args.command == "export":
+            with open(args.file, "wb") as file:
+                count = await export_events(event_store, file, args.format)
+            return f"{count} events exported"
+        with open(args.file, "rb") as file:
+            count = await import_events(event_store, file, args.format, args.batch_size)
+        return f"{count} events imported"
+    finally:
+        event_store.close()
+
+def main(argv : list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m eventsourcing.transfer", description="Stream whole event stores to and from files.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("database", help="SQLite event store")
+    parser.add_argument("file", help="file to write or read")
+    parser.add_argument("--format", choices=[NDJSON, FRAMED], default=NDJSON, help="record framing (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="events appended per transaction on import (default: %(default)s)")
+    print(asyncio.run(run(parser.parse_args(argv))))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
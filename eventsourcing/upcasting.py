@@ -0,0 +1,111 @@
+from typing import Callable
+
+SCHEMA_VERSION = "__schema_version__"
+
+Upcaster = Callable[[dict], dict]
+
+class UpcasterRegistry:
+    """
+    Upcasters bringing stored payloads of older schema versions to the current one.
+
+    Each upcaster takes a payload of one version of an event type and returns it at the
+    next version. The current version of a type is one past its last upcaster, or 1
+    when it has none; stores record it under `SCHEMA_VERSION` in the payloads they write
+    once it is above 1, and payloads without it are at version 1. For each version read,
+    the upcasters up to the current version are composed once into one function, cached
+    until an upcaster of the type is registered.
+
+    Upcasters run on the raw payload, before `from_dict`: encrypted members are still
+    ciphertext, so they can be dropped but not read, and only Fernet values can be
+    renamed since AEAD values are bound to their member name.
+    """
+
+    def __init__(self) -> None:
+        self.__steps : dict[str, dict[int, Upcaster]] = {}
+        self.__versions : dict[str, int] = {}
+        self.__chains : dict[tuple[str, int], Upcaster] = {}
+
+    def register(self, event_type : str, from_version : int, upcaster : Upcaster) -> None:
+        """
+        Args:
+            event_type (str): Stored type of the events.
+            from_version (int): Version of the payloads taken by `upcaster`, from 1.
+            upcaster (Upcaster): Returns the payload at `from_version + 1`; it may modify its argument.
+        """
+        if from_version < 1:
+            raise ValueError("from_version must be at least 1")
+        steps = self.__steps.setdefault(event_type, {})
+        if from_version in steps:
+            raise ValueError(f"An upcaster of '{event_type}' from version {from_version} is already registered")
+        steps[from_version] = upcaster
+        self.__versions[event_type] = max(steps) + 1
+        self.__chains = {key : chain for key, chain in self.__chains.items() if key[0] != event_type}
+
+    def schema_version(self, event_type : str) -> int:
+        return self.__versions.get(event_type, 1)
+
+    def stamp(self, event_type : str, values : dict) -> dict:
+        """Record the current schema version of `event_type` in a payload about to be stored."""
+        version = self.__versions.get(event_type)
+        if version is not None:
+            values[SCHEMA_VERSION] = version
+        return values
+
+    def chain(self, event_type : str, version : int) -> Upcaster | None:
+        """Get the upcasters of `event_type` from `version` composed into one function, or None at the current version."""
+        chain = self.__chains.get((event_type, version))
+        if chain is None:
+            current = self.schema_version(event_type)
+            if version == current:
+                return None
+            if version > current:
+                raise ValueError(f"'{event_type}' payload of version {version} is newer than the current version {current}")
+            steps = self.__steps[event_type]
+            missing = [n for n in range(version, current) if n not in steps]
+            if missing:
+                raise ValueError(f"No upcaster of '{event_type}' from version {missing[0]}")
+            chain = self.__chains[(event_type, version)] = _compose([steps[n] for n in range(version, current)], current)
+        return chain
+
+    def upcast(self, event_type : str, values : dict) -> dict:
+        """Bring a stored payload to the current version of its type; payloads already there are returned as they are."""
+        current = self.__versions.get(event_type)
+        if current is None:
+            return values
+        version = values.get(SCHEMA_VERSION, 1)
+        if version == current:
+            return values
+        return self.chain(event_type, version)(values)
+
+    def clear(self) -> None:
+        self.__steps.clear()
+        self.__versions.clear()
+        self.__chains.clear()
+
+def _compose(steps : list[Upcaster], version : int) -> Upcaster:
+    steps = tuple(steps)
+
+    def chain(values : dict) -> dict:
+        # One copy per payload lets every step modify its argument without touching the caller's.
+        values = dict(values)
+        for step in steps:
+            values = step(values)
+        values[SCHEMA_VERSION] = version
+        return values
+    return chain
+
+upcasters = UpcasterRegistry()
+
+def upcaster(event_type : str, from_version : int, registry : UpcasterRegistry = upcasters) -> Callable[[Upcaster], Upcaster]:
+    """
+    Decorator registering a function as the upcaster of `event_type` payloads from `from_version`.
+
+    Args:
+        event_type (str): Stored type of the events.
+        from_version (int): Version of the payloads taken by the function, from 1.
+        registry (UpcasterRegistry): Registry to add it to; the one read by the event stores by default.
+    """
+    def register(function : Upcaster) -> Upcaster:
+        registry.register(event_type, from_version, function)
+        return function
+    return register
@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+from datetime import date
+from eventsourcing.actors import ActorRuntime
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.exceptions import AggregateNotFoundError
+from eventsourcing.repositories import EventStoreRepository
+from example.user import User, LastNameChanged
+
+def rename(name: str):
+    def command(user: User) -> str:
+        user.change_last_name(name)
+        return name
+    return command
+
+class ActorRuntimeTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for running commands through per-aggregate actors.
+    """
+    def setUp(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        self.event_store = InMemEventStore()
+        self.repository = EventStoreRepository[User](self.event_store, User)
+        self.runtime = ActorRuntime[User](self.repository)
+
+    async def asyncTearDown(self):
+        await self.runtime.stop()
+
+    async def create_user(self, id: str) -> None:
+        await self.repository.save(User(id, "Paul", "Boulanger", date(1997, 2, 18)), -1)
+
+    async def test_should_coalesce_concurrent_commands(self):
+        await self.create_user("1")
+        results = await asyncio.gather(*(self.runtime.execute("1", rename(f"Name {n}")) for n in range(50)))
+
+        assert results == [f"Name {n}" for n in range(50)]
+        assert self.runtime.saves < 50
+        assert self.runtime.conflicts == 0
+        user = await self.repository.get_by_id("1")
+        assert user.version == 50
+        assert user.last_name == "Name 49"
+
+    async def test_should_keep_aggregate_between_ticks(self):
+        await self.create_user("1")
+        await self.runtime.execute("1", rename("Boucher"))
+        await self.runtime.execute("1", rename("Meunier"))
+
+        assert self.runtime.saves == 2
+        assert (await self.repository.get_by_id("1")).version == 2
+
+    async def test_should_fail_only_the_failing_command(self):
+        await self.create_user("1")
+
+        def refuse(user: User) -> None:
+            raise ValueError("refused")
+
+        def rename_then_fail(user: User) -> None:
+            user.change_last_name("Lost")
+            raise ValueError("half done")
+
+        results = await asyncio.gather(
+            self.runtime.execute("1", rename("Boucher")),
+            self.runtime.execute("1", refuse),
+            self.runtime.execute("1", rename_then_fail),
+            self.runtime.execute("1", rename("Meunier")),
+            return_exceptions=True)
+
+        assert results[0] == "Boucher" and results[3] == "Meunier"
+        assert str(results[1]) == "refused" and str(results[2]) == "half done"
+        user = await self.repository.get_by_id("1")
+        assert user.version == 2
+        assert user.last_name == "Meunier"
+
+    async def test_should_replace_actor_stopped_by_cancelled_command(self):
+        await self.create_user("1")
+
+        def cancel(user: User) -> None:
+            raise asyncio.CancelledError()
+
+        results = await asyncio.wait_for(asyncio.gather(
+            self.runtime.execute("1", cancel),
+            self.runtime.execute("1", rename("Lost")),
+            return_exceptions=True), 1)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert self.runtime.active_ids == []
+        assert await asyncio.wait_for(self.runtime.execute("1", rename("Boucher")), 1) == "Boucher"
+        user = await self.repository.get_by_id("1")
+        assert user.version == 1
+        assert user.last_name == "Boucher"
+
+    async def test_should_reload_after_outside_write(self):
+        await self.create_user("1")
+        await self.runtime.execute("1", rename("Boucher"))
+        await self.event_store.save_events("user-1", [LastNameChanged("1", "Outside")], 1)
+
+        assert await self.runtime.execute("1", rename("Meunier")) == "Meunier"
+        assert self.runtime.conflicts == 1
+        assert (await self.repository.get_by_id("1")).version == 3
+
+    async def test_should_evict_idle_actors(self):
+        self.runtime = ActorRuntime[User](self.repository, idle_timeout=0.01)
+        await self.create_user("1")
+        await self.runtime.execute("1", rename("Boucher"))
+        assert self.runtime.active_ids == ["1"]
+
+        await asyncio.sleep(0.05)
+        assert self.runtime.active_ids == []
+        assert self.runtime.evictions == 1
+        assert await self.runtime.execute("1", rename("Meunier")) == "Meunier"
+
+    async def test_should_report_missing_aggregates(self):
+        with self.assertRaises(AggregateNotFoundError):
+            await self.runtime.execute("missing", rename("Boucher"))
+
+    async def test_should_create_missing_aggregates(self):
+        self.runtime = ActorRuntime[User](self.repository, create=lambda id: User(id, "Paul", "Boulanger", date(1997, 2, 18)))
+        await self.runtime.execute("2", rename("Boucher"))
+
+        user = await self.repository.get_by_id("2")
+        assert user.version == 1
+        assert user.last_name == "Boucher"
@@ -0,0 +1,97 @@
+import unittest
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date
+from eventsourcing.arena import ArenaEventStore
+from eventsourcing.compression import PayloadCompressor
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import EventDescriptor, InMemEventStore
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.repositories import EventStoreRepository
+from example.user import User
+
+@dataclass
+class MeterRead(IEvent):
+    meter : str
+    kwh : int
+
+    @property
+    def type(self) -> str:
+        return "MeterRead"
+
+class ArenaEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the in-memory event store packing streams into arenas.
+    """
+    def setUp(self):
+        self.event_store = ArenaEventStore()
+
+    async def test_should_read_back_events(self):
+        events = [MeterRead("m-1", n) for n in range(5)]
+        await self.event_store.save_events("meter-1", events[:3], -1)
+        await self.event_store.save_events("meter-1", events[3:], 2)
+
+        assert await self.event_store.get_events_for_aggregate("meter-1") == events
+        assert await self.event_store.get_events_for_aggregate("meter-1", 2, 3) == events[2:4]
+        assert [desc.version for desc in await self.event_store.get_event_descriptors("meter-1")] == [0, 1, 2, 3, 4]
+        assert [desc.position for desc in await self.event_store.get_event_descriptors("meter-1")] == [1, 2, 3, 4, 5]
+        assert len(await self.event_store.get_event_descriptors_by_type("MeterRead")) == 5
+        assert len(self.event_store.event_types) == 1
+
+    async def test_should_check_expected_version(self):
+        await self.event_store.save_events("meter-1", [MeterRead("m-1", 1)], -1)
+        with self.assertRaises(ConcurrencyError):
+            await self.event_store.save_events("meter-1", [MeterRead("m-1", 2)], -1)
+
+    async def test_should_ignore_retried_append(self):
+        await self.event_store.save_events("meter-1", [MeterRead("m-1", 1)], -1)
+        await self.event_store.save_events("meter-1", [MeterRead("m-1", 2)], 0, ["e2"])
+        await self.event_store.save_events("meter-1", [MeterRead("m-1", 2)], 0, ["e2"])
+
+        assert [desc.event_id for desc in await self.event_store.get_event_descriptors("meter-1")] == [None, "e2"]
+
+    async def test_should_truncate_and_resolve_times(self):
+        for n in range(4):
+            await self.event_store.append_descriptors("meter-1", [EventDescriptor("meter-1", "MeterRead", '{"meter": "m-1", "kwh": %d}' % n, n, recorded_at=100.0 + n)], n - 1)
+
+        assert await self.event_store.get_version_at("meter-1", 101.5) == 1
+        assert await self.event_store.truncate_stream("meter-1", 2) == 2
+        assert await self.event_store.get_stream_start("meter-1") == 2
+        assert await self.event_store.get_events_for_aggregate("meter-1") == [MeterRead("m-1", 2), MeterRead("m-1", 3)]
+        assert await self.event_store.get_version_at("meter-1", 100.5) == 1
+        await self.event_store.save_events("meter-1", [MeterRead("m-1", 4)], 3)
+        assert [desc.version for desc in await self.event_store.get_event_descriptors_by_type("MeterRead")] == [2, 3, 4]
+
+    async def test_should_keep_compressed_payloads(self):
+        self.event_store = ArenaEventStore(compressor=PayloadCompressor(min_size=0))
+        events = [MeterRead("meter " * 40, n) for n in range(3)]
+        await self.event_store.save_events("meter-1", events, -1)
+
+        descriptors = await self.event_store.get_event_descriptors("meter-1")
+        assert all(isinstance(desc.event_data, bytes) and desc.compression is not None for desc in descriptors)
+        assert await self.event_store.get_events_for_aggregate("meter-1") == events
+
+    async def test_should_decrypt_users(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        repository = EventStoreRepository[User](self.event_store, User)
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        user.change_last_name("Boucher")
+        await repository.save(user, -1)
+
+        assert (await self.event_store.get_event_descriptors("user-1"))[0].subject_id == "1"
+        assert (await repository.get_by_id("1")).last_name == "Boucher"
+
+    async def test_should_use_less_memory_than_descriptors(self):
+        async def measure(event_store):
+            tracemalloc.start()
+            try:
+                for n in range(100):
+                    await event_store.save_events(f"meter-{n}", [MeterRead(f"m-{n}", k) for k in range(50)], -1)
+                return tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+        arena = await measure(ArenaEventStore())
+        descriptors = await measure(InMemEventStore())
+        assert arena * 3 < descriptors
@@ -0,0 +1,87 @@
+import unittest
+from dataclasses import dataclass
+from datetime import date
+from eventsourcing.batch_records import BatchRecordEventStore
+from eventsourcing.compression import PayloadCompressor
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event import IEvent
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.repositories import EventStoreRepository
+from example.user import User
+
+@dataclass
+class LineAdded(IEvent):
+    sku : str
+    quantity : int
+
+    @property
+    def type(self) -> str:
+        return "LineAdded"
+
+class BatchRecordEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the store writing one record per append.
+    """
+    def setUp(self):
+        self.event_store = BatchRecordEventStore()
+
+    async def add_lines(self, stream_id: str, batches: int, size: int) -> list[LineAdded]:
+        events = [LineAdded(f"sku-{n}", n) for n in range(batches * size)]
+        for b in range(batches):
+            await self.event_store.save_events(stream_id, events[b * size:(b + 1) * size], b * size - 1)
+        return events
+
+    async def test_should_write_one_record_per_append(self):
+        events = await self.add_lines("cart-1", 3, 4)
+
+        assert self.event_store.record_count == 3
+        assert self.event_store.index_entries == 3
+        assert await self.event_store.get_events_for_aggregate("cart-1") == events
+
+    async def test_should_read_from_any_version(self):
+        events = await self.add_lines("cart-1", 3, 4)
+
+        assert await self.event_store.get_events_for_aggregate("cart-1", 6) == events[6:]
+        assert await self.event_store.get_event("cart-1", 5) == events[5]
+        assert await self.event_store.get_event("cart-1", 12) is None
+
+    async def test_should_read_up_to_version_and_time(self):
+        events = await self.add_lines("cart-1", 3, 4)
+        for n, record in enumerate(self.event_store.records["cart-1"]):
+            record.recorded_at = 100.0 + n
+
+        assert await self.event_store.get_events_for_aggregate("cart-1", 2, 5) == events[2:6]
+        assert await self.event_store.get_version_at("cart-1", 101.5) == 7
+        assert await self.event_store.get_version_at("cart-1", 99.0) == -1
+
+    async def test_should_check_expected_version(self):
+        await self.add_lines("cart-1", 1, 2)
+        with self.assertRaises(ConcurrencyError):
+            await self.event_store.save_events("cart-1", [LineAdded("x", 1)], 0)
+
+    async def test_should_ignore_retried_append(self):
+        await self.event_store.save_events("cart-1", [LineAdded("a", 1), LineAdded("b", 2)], -1, ["e1", "e2"])
+        await self.event_store.save_events("cart-1", [LineAdded("a", 1), LineAdded("b", 2)], -1, ["e1", "e2"])
+        assert self.event_store.record_count == 1
+
+    async def test_should_expose_event_descriptors(self):
+        compressed = BatchRecordEventStore(compressor=PayloadCompressor(codec="zlib", min_size=1, train_after=None))
+        await compressed.save_events("cart-1", [LineAdded("a", 1), LineAdded("b", 2)], -1)
+
+        descs = await compressed.get_event_descriptors("cart-1")
+        assert [desc.version for desc in descs] == [0, 1]
+        copy = BatchRecordEventStore()
+        await copy.append_descriptors("cart-1", descs, -1)
+        assert await copy.get_events_by_type("LineAdded") == [LineAdded("a", 1), LineAdded("b", 2)]
+
+    async def test_should_decrypt_users(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        repository = EventStoreRepository[User](self.event_store, User)
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        user.change_last_name("Boucher")
+        await repository.save(user, -1)
+
+        loaded = await repository.get_by_id("1")
+
+        assert loaded.last_name == "Boucher"
+        assert self.event_store.records["user-1"][0].subject_ids == ["1"]
@@ -0,0 +1,37 @@
+import pytest
+import unittest
+from eventsourcing.bloom import BloomFilter
+
+class BloomFilterTest(unittest.TestCase):
+    """
+    Test suite for the Bloom filter of stream IDs.
+    """
+    def test_should_have_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        bloom.update(f"user-{n}" for n in range(1000))
+
+        assert all(f"user-{n}" in bloom for n in range(1000))
+        assert bloom.count == 1000
+
+    def test_should_keep_false_positive_rate(self):
+        bloom = BloomFilter(2000, false_positive_rate=0.01)
+        bloom.update(f"user-{n}" for n in range(2000))
+
+        false_positives = sum(f"order-{n}" in bloom for n in range(20000))
+        assert false_positives / 20000 < 0.02
+
+    def test_should_size_memory_by_capacity_and_rate(self):
+        assert BloomFilter(10000, 0.001).nbytes > BloomFilter(10000, 0.01).nbytes > BloomFilter(1000, 0.01).nbytes
+        assert BloomFilter(10000, 0.01).nbytes < 12000
+
+    def test_should_clear(self):
+        bloom = BloomFilter(10)
+        bloom.add("user-1")
+        bloom.clear()
+        assert "user-1" not in bloom
+
+    def test_should_validate_configuration(self):
+        with pytest.raises(ValueError):
+            BloomFilter(0)
+        with pytest.raises(ValueError):
+            BloomFilter(10, false_positive_rate=1.5)
@@ -0,0 +1,104 @@
+import pytest
+import unittest
+from dataclasses import dataclass
+from eventsourcing.cache import DecodedEventCache
+from eventsourcing.encryption import encrypted, CryptoRepository, InMemCryptoStore
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore
+
+@dataclass
+class CachedEvent(IEvent):
+    val : int
+
+    @property
+    def type(self) -> str:
+        return "CachedEvent"
+
+@encrypted(subject_id="id", encrypted_members=["secret"])
+@dataclass
+class CachedSecretEvent(IEvent):
+    id : str
+    secret : str
+
+    @property
+    def type(self) -> str:
+        return "CachedSecretEvent"
+
+class DecodedEventCacheTest(unittest.TestCase):
+    """
+    Test suite for the LRU behaviour of the decoded event cache.
+    """
+    def test_should_count_hits_and_misses(self):
+        cache = DecodedEventCache(max_entries=4)
+        assert cache.get("s", 0) is None
+        cache.put("s", 0, CachedEvent(1))
+        assert cache.get("s", 0) == CachedEvent(1)
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert cache.hit_rate == 0.5
+
+    def test_should_evict_least_recently_used(self):
+        cache = DecodedEventCache(max_entries=2)
+        cache.put("s", 0, CachedEvent(0))
+        cache.put("s", 1, CachedEvent(1))
+        cache.get("s", 0)
+        cache.put("s", 2, CachedEvent(2))
+        assert ("s", 0) in cache
+        assert ("s", 1) not in cache
+        assert ("s", 2) in cache
+        assert cache.evictions == 1
+
+    def test_should_respect_byte_budget(self):
+        cache = DecodedEventCache(max_entries=100, max_bytes=25)
+        for version in range(5):
+            cache.put("s", version, CachedEvent(version), size=10)
+        assert len(cache) == 2
+        assert cache.size == 20
+
+    def test_should_evict_one_stream(self):
+        cache = DecodedEventCache(max_entries=3)
+        for version in range(2):
+            cache.put("a", version, CachedEvent(version), size=1)
+            cache.put("b", version, CachedEvent(version), size=1)
+
+        cache.evict_stream("b")
+        assert len(cache) == 1 and ("a", 1) in cache
+        assert cache.size == 1
+        cache.evict_stream("a")
+        assert len(cache) == 0
+
+    def test_should_reject_empty_cache(self):
+        with pytest.raises(ValueError):
+            DecodedEventCache(max_entries=0)
+
+class CachedEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for an event store reading through a decoded event cache.
+    """
+    def setUp(self):
+        self.key_store = InMemCryptoStore()
+        CryptoRepository.crypto_store = self.key_store
+        self.cache = DecodedEventCache()
+        self.event_store = InMemEventStore(event_cache=self.cache)
+
+    async def test_should_serve_second_read_from_cache(self):
+        await self.event_store.save_events("stream", [CachedEvent(1), CachedEvent(2)], -1)
+        first = await self.event_store.get_events_for_aggregate("stream")
+        second = await self.event_store.get_events_for_aggregate("stream")
+        assert first == second
+        assert first[0] is second[0]
+        assert self.cache.misses == 2
+        assert self.cache.hits == 2
+
+    async def test_should_evict_on_crypto_shredding(self):
+        await self.event_store.save_events("stream", [CachedSecretEvent("subject", "hidden"), CachedEvent(3)], -1)
+        events = await self.event_store.get_events_for_aggregate("stream")
+        assert events[0].secret == "hidden"
+        assert len(self.cache) == 2
+
+        CryptoRepository.delete_encryption_key("subject")
+
+        assert len(self.cache) == 1
+        events = await self.event_store.get_events_for_aggregate("stream")
+        assert events[0].secret != "hidden"
+        assert events[0].secret.startswith("encrypted_")
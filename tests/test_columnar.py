@@ -0,0 +1,62 @@
+import pytest
+import unittest
+from array import array
+from datetime import date
+from eventsourcing import columnar
+from eventsourcing.columnar import scan_columns
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.repositories import EventStoreRepository
+from example.user import User
+
+class ScanColumnsTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the columnar scan of events.
+    """
+    async def asyncSetUp(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        self.event_store = InMemEventStore()
+        repository = EventStoreRepository[User](self.event_store, User)
+        for i in range(5):
+            user = User(str(i), f"first {i}", f"last {i}", date(1990 + i, 1 + i, 1))
+            user.change_last_name(f"changed {i}")
+            await repository.save(user, -1)
+
+    async def scan(self, event_type, **kwargs):
+        return [batch async for batch in scan_columns(self.event_store, event_type, backend="array", **kwargs)]
+
+    async def test_should_build_typed_columns_without_decryption(self):
+        batches = await self.scan("UserCreated")
+        assert len(batches) == 1
+        batch = batches[0]
+        assert len(batch) == 5
+        assert batch.stream_ids == [f"user-{i}" for i in range(5)]
+        assert batch.versions == array("q", [0] * 5)
+        assert batch.columns["year_of_birth"] == array("q", [1990, 1991, 1992, 1993, 1994])
+        assert batch.columns["id"] == ["0", "1", "2", "3", "4"]
+        assert all(value.startswith("encrypted_") for value in batch.columns["month_of_birth"])
+
+    async def test_should_decrypt_on_demand(self):
+        batch = (await self.scan("UserCreated", decrypt=True))[0]
+        assert batch.columns["month_of_birth"] == array("q", [1, 2, 3, 4, 5])
+        assert batch.columns["first_name"] == [f"first {i}" for i in range(5)]
+
+    async def test_should_split_batches_and_filter_streams(self):
+        batches = await self.scan("LastNameChanged", batch_size=2, stream_ids=["user-1", "user-2", "user-3"])
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert [batch.versions.tolist() for batch in batches] == [[1, 1], [1]]
+
+    async def test_should_fall_back_to_lists_for_mixed_values(self):
+        CryptoRepository.delete_encryption_key("2")
+        batch = (await self.scan("UserCreated", decrypt=True))[0]
+        assert isinstance(batch.columns["month_of_birth"], list)
+        assert batch.columns["year_of_birth"] == array("q", [1990, 1991, 1992, 1993, 1994])
+
+    async def test_should_reject_missing_backend(self):
+        if columnar.numpy is not None:
+            pytest.skip("numpy is installed")
+        with pytest.raises(ImportError):
+            await self.scan_with("numpy")
+
+    async def scan_with(self, backend):
+        return [batch async for batch in scan_columns(self.event_store, "UserCreated", backend=backend)]
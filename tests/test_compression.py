@@ -0,0 +1,109 @@
+import json
+import pytest
+import unittest
+from dataclasses import dataclass
+from eventsourcing import compression
+from eventsourcing.compression import PayloadCompressor, train_dictionary
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore
+
+@dataclass
+class AddressChanged(IEvent):
+    id : str
+    street : str
+    city : str
+    country : str
+
+    @property
+    def type(self) -> str:
+        return "AddressChanged"
+
+def payload(i: int) -> bytes:
+    return json.dumps({"id": f"user-{i:06d}", "street": f"{i} rue de la Paix", "city": "Paris", "country": "France"}).encode()
+
+class PayloadCompressorTest(unittest.TestCase):
+    """
+    Test suite for the per event type payload compressor.
+    """
+    def test_should_round_trip_without_dictionary(self):
+        compressor = PayloadCompressor(codec="zlib", min_size=0, train_after=None)
+        data = payload(1) * 4
+        compression_id, compressed = compressor.compress("AddressChanged", data)
+        assert compression_id == "zlib"
+        assert compressor.decompress(compression_id, compressed) == data
+
+    def test_should_compress_better_with_trained_dictionary(self):
+        plain = PayloadCompressor(codec="zlib", min_size=0, train_after=None)
+        trained = PayloadCompressor(codec="zlib", min_size=0, train_after=None)
+        dictionary_id = trained.train("AddressChanged", [payload(i) for i in range(50)])
+
+        data = payload(1000)
+        plain_id, plain_data = plain.compress("AddressChanged", data)
+        trained_id, trained_data = trained.compress("AddressChanged", data)
+        assert trained_id == f"zlib:{dictionary_id}"
+        assert plain_id is None or len(trained_data) < len(plain_data)
+        assert len(trained_data) < len(data) // 2
+        assert trained.decompress(trained_id, trained_data) == data
+
+    def test_should_train_automatically(self):
+        compressor = PayloadCompressor(codec="zlib", min_size=0, train_after=10)
+        for i in range(10):
+            compressor.compress("AddressChanged", payload(i))
+        assert compressor.dictionary_for("AddressChanged") is not None
+        assert compressor.dictionary_for("Other") is None
+
+    def test_should_keep_small_payloads_uncompressed(self):
+        compressor = PayloadCompressor(codec="zlib", min_size=64)
+        assert compressor.compress("AddressChanged", b"{}") == (None, b"{}")
+
+    def test_should_reject_unknown_dictionary(self):
+        trained = PayloadCompressor(codec="zlib", min_size=0, train_after=None)
+        trained.train("AddressChanged", [payload(i) for i in range(10)])
+        compression_id, compressed = trained.compress("AddressChanged", payload(11))
+        with pytest.raises(ValueError):
+            PayloadCompressor(codec="zlib").decompress(compression_id, compressed)
+
+    def test_should_reuse_persisted_dictionaries(self):
+        trained = PayloadCompressor(codec="zlib", min_size=0, train_after=None)
+        trained.train("AddressChanged", [payload(i) for i in range(10)])
+        compression_id, compressed = trained.compress("AddressChanged", payload(11))
+
+        restored = PayloadCompressor(codec="zlib")
+        for dictionary in trained.dictionaries.values():
+            restored.add_dictionary(dictionary)
+        assert restored.decompress(compression_id, compressed) == payload(11)
+
+    def test_should_require_zstandard_for_zstd(self):
+        if compression.zstandard is not None:
+            pytest.skip("zstandard is installed")
+        with pytest.raises(ImportError):
+            PayloadCompressor(codec="zstd")
+
+    def test_should_train_dictionary_ending_with_sample(self):
+        samples = [payload(i) for i in range(5)]
+        dictionary = train_dictionary(samples, size=4096)
+        assert dictionary.endswith(samples[-1])
+        assert b'"street"' in dictionary
+
+class CompressedEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for an in-memory event store compressing its payloads.
+    """
+    async def test_should_read_compressed_and_uncompressed_records(self):
+        compressor = PayloadCompressor(codec="zlib", min_size=0, train_after=5)
+        event_store = InMemEventStore(compressor=compressor)
+        events = [AddressChanged(f"user-{i:06d}", f"{i} rue de la Paix", "Paris", "France") for i in range(10)]
+        await event_store.save_events("stream", events, -1)
+
+        compressions = [desc.compression for desc in event_store.current["stream"]]
+        assert any(c is not None and ":" in c for c in compressions)
+        assert len({c for c in compressions}) > 1
+        assert await event_store.get_events_for_aggregate("stream") == events
+        assert (await event_store.get_events_for_aggregates(["stream"]))["stream"] == events
+
+    async def test_should_fail_to_read_compressed_records_without_compressor(self):
+        event_store = InMemEventStore(compressor=PayloadCompressor(codec="zlib", min_size=0, train_after=None))
+        await event_store.save_events("stream", [AddressChanged("id", "street " * 10, "Paris", "France")], -1)
+        event_store.compressor = None
+        with pytest.raises(ValueError):
+            await event_store.get_events_for_aggregate("stream")
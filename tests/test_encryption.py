@@ -1,6 +1,9 @@
 import pytest
 import unittest
-from eventsourcing.encryption import encrypted, ICryptoStore, CryptoRepository
+from unittest import mock
+from eventsourcing import encryption
+from eventsourcing.encryption import encrypted, reencrypt_members, ICryptoStore, CryptoRepository, FERNET, AES_GCM, CHACHA20_POLY1305
+from cryptography.exceptions import InvalidTag
 from dataclasses import dataclass
 from eventsourcing.data import Data, to_dict
 from cryptography.fernet import Fernet
@@ -457,4 +460,143 @@ class EncryptionFromDictTest(unittest.TestCase):
         assert my_obj.val_two == 22
         assert my_obj.nested.val_one == "one"
         assert my_obj.nested.val_two == 2
-        assert my_obj.nested.val_three == 3.3
\ No newline at end of file
+        assert my_obj.nested.val_three == 3.3
+
+class AeadCipherTest(unittest.TestCase):
+    """
+    Test suite for the AES-GCM and ChaCha20-Poly1305 cipher suites of encrypted members.
+    """
+    def setUp(self):
+        self.key_store = FakeCryptoStore()
+        CryptoRepository.crypto_store = self.key_store
+
+    def make_class(self, cipher: str):
+        @encrypted(subject_id="id", encrypted_members=["name", "age"], cipher=cipher)
+        @dataclass
+        class Person(Data):
+            id : str
+            name : str
+            age : int
+        return Person
+
+    def test_round_trip(self):
+        """
+        Test that both AEAD suites decrypt what they encrypt, with tagged values.
+        """
+        for cipher, tag in [(AES_GCM, "$g1$"), (CHACHA20_POLY1305, "$c1$")]:
+            Person = self.make_class(cipher)
+            values = Person(id="1", name="Paul", age=27).to_dict()
+            assert values["name"].startswith(tag) and values["age"].startswith(tag)
+            person = Person.from_dict(values)
+            assert person.name == "Paul" and person.age == 27
+
+    def test_values_are_smaller_than_fernet(self):
+        """
+        Test that AEAD values take less room than Fernet tokens.
+        """
+        fernet = self.make_class(FERNET)(id="1", name="Paul", age=27).to_dict()
+        for cipher in [AES_GCM, CHACHA20_POLY1305]:
+            aead = self.make_class(cipher)(id="1", name="Paul", age=27).to_dict()
+            assert len(aead["name"]) < len(fernet["name"]) / 2
+
+    def test_tampered_or_moved_values_are_rejected(self):
+        """
+        Test that a modified value, or a value copied to another member or subject, fails to decrypt.
+        """
+        Person = self.make_class(AES_GCM)
+        values = Person(id="1", name="Paul", age=27).to_dict()
+        self.key_store.store["2"] = self.key_store.store["1"]
+
+        tampered = dict(values, name=values["name"][:-2] + ("AA" if values["name"][-2:] != "AA" else "BB"))
+        with pytest.raises(InvalidTag):
+            Person.from_dict(tampered).name
+        with pytest.raises(InvalidTag):
+            Person.from_dict(dict(values, age=values["name"])).age
+        with pytest.raises(InvalidTag):
+            Person.from_dict(dict(values, id="2")).name
+
+    def test_fernet_values_stay_readable(self):
+        """
+        Test that a class switched to an AEAD suite still reads the values written with Fernet.
+        """
+        values = self.make_class(FERNET)(id="1", name="Paul", age=27).to_dict()
+        person = self.make_class(CHACHA20_POLY1305).from_dict(values)
+        assert person.name == "Paul" and person.age == 27
+
+    def test_reencrypt_upgrades_cipher_and_key(self):
+        """
+        Test that re-encryption moves values to the suite of the class and the newest key, once.
+        """
+        values = self.make_class(FERNET)(id="1", name="Paul", age=27).to_dict()
+        Person = self.make_class(AES_GCM)
+        assert reencrypt_members(Person, values, self.key_store.store["1"])["name"].startswith("$g1$")
+
+        CryptoRepository.rotate_key("1")
+        key = self.key_store.store["1"]
+        upgraded = reencrypt_members(Person, values, key)
+        assert upgraded["name"].startswith("$g1$")
+        assert reencrypt_members(Person, upgraded, key) is None
+
+        CryptoRepository.retire_previous_keys("1")
+        person = Person.from_dict(upgraded)
+        assert person.name == "Paul" and person.age == 27
+
+    def test_unknown_cipher(self):
+        """
+        Test that the decorator rejects an unknown cipher suite.
+        """
+        with pytest.raises(ValueError):
+            self.make_class("rot13")
+
+
+class LazyDecryptionTest(unittest.TestCase):
+    """
+    Test suite for the decryption of encrypted members on first read.
+    """
+    def setUp(self):
+        self.key_store = FakeCryptoStore()
+        CryptoRepository.crypto_store = self.key_store
+
+        @encrypted(subject_id="id", encrypted_members=["name", "age"], cipher=AES_GCM)
+        @dataclass
+        class Person(Data):
+            id : str
+            name : str
+            age : int
+            city : str
+        self.Person = Person
+        self.values = Person(id="1", name="Paul", age=27, city="Lyon").to_dict()
+
+    def test_members_are_decrypted_once_on_read(self):
+        """
+        Test that decoding does no decryption, and that each member is decrypted once when read.
+        """
+        with mock.patch("eventsourcing.encryption._decryptor", wraps=encryption._decryptor) as decryptor:
+            person = self.Person.from_dict(self.values)
+            assert person.city == "Lyon"
+            assert decryptor.call_count == 0
+
+            assert person.age == 27 and person.age == 27
+            assert decryptor.call_count == 1
+            assert person.name == "Paul"
+            assert decryptor.call_count == 2
+
+    def test_unread_members_are_stored_unchanged(self):
+        """
+        Test that serializing again keeps the stored value of unread members without decrypting them.
+        """
+        person = self.Person.from_dict(self.values)
+        with mock.patch("eventsourcing.encryption._decryptor") as decryptor:
+            assert person.to_dict()["name"] == self.values["name"]
+            decryptor.assert_not_called()
+
+        person.name = "Pierre"
+        assert self.Person.from_dict(person.to_dict()).name == "Pierre"
+
+    def test_decoded_instances_compare_by_plaintext(self):
+        """
+        Test that equality and the source payload are unaffected by lazy members.
+        """
+        values = dict(self.values)
+        assert self.Person.from_dict(values) == self.Person(id="1", name="Paul", age=27, city="Lyon")
+        assert values == self.values
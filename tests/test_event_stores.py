@@ -1,5 +1,11 @@
 import pytest
 import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from eventsourcing.cache import DecodedEventCache
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore, _Ciphertext
+from eventsourcing.repositories import EventStoreRepository
+from example.user import User
 from eventsourcing.event_stores import get_event_class, InMemEventStore, EventDescriptor
 from eventsourcing.event import IEvent
 from dataclasses import dataclass
@@ -89,4 +95,110 @@ class InMemEventStoreTest(unittest.IsolatedAsyncioTestCase):
         lst_events = await self.event_store.get_events_for_aggregate(aggregate_id)
         assert len(lst_events) == 2
         assert lst_events[0] == event_1
-        assert lst_events[1] == event_2
\ No newline at end of file
+        assert lst_events[1] == event_2
+
+    async def test_should_retrieve_several_streams(self):
+        await self.event_store.save_events("1", [EventOne(1)], -1)
+        await self.event_store.save_events("2", [EventOne(2), EventTwo("two")], -1)
+        streams = await self.event_store.get_events_for_aggregates(["2", "missing", "1"])
+        assert list(streams) == ["2", "1"]
+        assert streams["1"] == [EventOne(1)]
+        assert streams["2"] == [EventOne(2), EventTwo("two")]
+
+    async def test_should_index_streams_by_category(self):
+        await self.event_store.save_events("user-1", [EventOne(1)], -1)
+        await self.event_store.save_events("order-1", [EventOne(2)], -1)
+        await self.event_store.save_events("user-2", [EventOne(3)], -1)
+        assert await self.event_store.get_stream_ids_by_category("user") == ["user-1", "user-2"]
+        assert await self.event_store.get_stream_ids_by_category("invoice") == []
+
+    async def test_should_index_events_by_type(self):
+        await self.event_store.save_events("user-1", [EventOne(1), EventTwo("a")], -1)
+        await self.event_store.save_events("user-2", [EventTwo("b")], -1)
+        descs = await self.event_store.get_event_descriptors_by_type("EventTwo")
+        assert [(desc.id, desc.version, desc.position) for desc in descs] == [("user-1", 1, 2), ("user-2", 0, 3)]
+        assert await self.event_store.get_events_by_type("EventTwo") == [EventTwo("a"), EventTwo("b")]
+
+    async def test_should_keep_type_index_after_truncation(self):
+        await self.event_store.save_events("user-1", [EventTwo("a"), EventTwo("b"), EventOne(1)], -1)
+        await self.event_store.truncate_stream("user-1", 1)
+        assert await self.event_store.get_events_by_type("EventTwo") == [EventTwo("b")]
+
+    async def test_should_prune_type_index_lazily(self):
+        for n in range(10):
+            await self.event_store.save_events(f"user-{n}", [EventTwo(f"{n}a"), EventTwo(f"{n}b")], -1)
+
+        await self.event_store.truncate_stream("user-0", 1)
+        assert len(self.event_store.type_index["EventTwo"]) == 20
+        assert len(await self.event_store.get_event_descriptors_by_type("EventTwo")) == 19
+
+        for n in range(1, 10):
+            await self.event_store.truncate_stream(f"user-{n}", 1)
+        await self.event_store.truncate_stream("user-0", 2)
+        assert len(self.event_store.type_index["EventTwo"]) == 9
+        assert await self.event_store.get_events_by_type("EventTwo") == [EventTwo(f"{n}b") for n in range(1, 10)]
+
+class CountingExecutor(ThreadPoolExecutor):
+    """
+    A thread pool counting the tasks submitted to it.
+    """
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+class OffloadedDecodeTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for decoding large reads in an executor.
+    """
+    def setUp(self):
+        self.executor = CountingExecutor()
+        self.event_store = InMemEventStore(event_cache=DecodedEventCache(), decode_executor=self.executor, inline_decode_threshold=10)
+        self.event_store.decode_batch_size = 4
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_should_decode_small_reads_inline(self):
+        await self.event_store.save_events("1", [EventOne(n) for n in range(9)], -1)
+        assert await self.event_store.get_events_for_aggregate("1") == [EventOne(n) for n in range(9)]
+        assert self.executor.submitted == 0
+
+    async def test_should_decode_large_reads_in_batches(self):
+        await self.event_store.save_events("1", [EventOne(n) for n in range(6)], -1)
+        await self.event_store.save_events("2", [EventTwo(str(n)) for n in range(6)], -1)
+
+        streams = await self.event_store.get_events_for_aggregates(["1", "2"])
+
+        assert streams == {"1": [EventOne(n) for n in range(6)], "2": [EventTwo(str(n)) for n in range(6)]}
+        assert self.executor.submitted == 3
+        assert self.event_store.event_cache.get("2", 5) == EventTwo("5")
+
+    async def test_should_decrypt_in_worker_processes(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        for n in range(20):
+            user.change_last_name(f"Boucher {n}")
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            event_store = InMemEventStore(decode_executor=executor, inline_decode_threshold=10)
+            await EventStoreRepository[User](event_store, User).save(user, -1)
+
+            loaded = await EventStoreRepository[User](event_store, User).get_by_id("1")
+
+        assert loaded.last_name == "Boucher 19"
+
+    async def test_should_decrypt_eagerly_in_the_executor(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        for n in range(20):
+            user.change_last_name(f"Boucher {n}")
+        await EventStoreRepository[User](self.event_store, User).save(user, -1)
+
+        stream_id = user.to_stream_id("1")
+        events = (await self.event_store.get_events_for_aggregates([stream_id]))[stream_id]
+
+        assert self.executor.submitted > 0
+        assert not any(isinstance(value, _Ciphertext) for event in events for value in vars(event).values())
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import pytest
+import tempfile
+import unittest
+from dataclasses import dataclass
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.group_commit import GroupCommitEventStore
+from eventsourcing.sqlite import SqliteEventStore
+
+@dataclass
+class SeatReserved(IEvent):
+    seat : int
+
+    @property
+    def type(self) -> str:
+        return "SeatReserved"
+
+class GroupCommitEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the batching of concurrent appends.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sqlite = SqliteEventStore(os.path.join(self.directory.name, "events.db"))
+        self.event_store = GroupCommitEventStore(self.sqlite, window=0.01, max_batch=100)
+
+    def tearDown(self):
+        self.sqlite.close()
+        self.directory.cleanup()
+
+    async def test_should_commit_concurrent_appends_together(self):
+        await asyncio.gather(*(self.event_store.save_events(f"hall-{n}", [SeatReserved(n)], -1) for n in range(20)))
+
+        assert self.sqlite.commits == 1
+        assert self.event_store.average_batch_size == 20
+        assert await self.event_store.get_events_for_aggregate("hall-7") == [SeatReserved(7)]
+
+    async def test_should_fail_only_conflicting_append(self):
+        results = await asyncio.gather(
+            self.event_store.save_events("hall-1", [SeatReserved(1)], -1),
+            self.event_store.save_events("hall-1", [SeatReserved(2)], -1),
+            self.event_store.save_events("hall-2", [SeatReserved(3)], -1),
+            return_exceptions=True,
+        )
+
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], ConcurrencyError)
+        assert await self.event_store.get_events_for_aggregate("hall-1") == [SeatReserved(1)]
+
+    async def test_should_fail_only_unencodable_append(self):
+        results = await asyncio.gather(
+            self.event_store.save_events("hall-1", [SeatReserved(1)], -1),
+            self.event_store.save_events("hall-2", [SeatReserved({2})], -1),
+            self.event_store.save_events("hall-3", [SeatReserved(3)], -1),
+            return_exceptions=True)
+
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], TypeError)
+        assert self.sqlite.commits == 1
+        assert await self.event_store.get_events_for_aggregate("hall-3") == [SeatReserved(3)]
+        assert await self.event_store.get_events_for_aggregate("hall-2") == []
+
+    async def test_should_write_when_batch_is_full(self):
+        event_store = GroupCommitEventStore(self.sqlite, window=60, max_batch=2)
+        await asyncio.wait_for(asyncio.gather(event_store.save_events("hall-1", [SeatReserved(1)], -1), event_store.save_events("hall-2", [SeatReserved(2)], -1)), 1)
+        assert event_store.batches == 1
+
+    async def test_should_batch_over_any_store(self):
+        event_store = GroupCommitEventStore(InMemEventStore(), window=0)
+        await event_store.save_events("hall-1", [SeatReserved(1)], -1)
+        with pytest.raises(ConcurrencyError):
+            await event_store.save_events("hall-1", [SeatReserved(1)], -1)
+        await event_store.flush()
+        assert await event_store.get_stream_ids() == ["hall-1"]
+
+    async def test_should_release_callers_of_cancelled_write(self):
+        class CancelledStore(InMemEventStore):
+            async def save_events_batch(self, appends):
+                raise asyncio.CancelledError()
+
+        event_store = GroupCommitEventStore(CancelledStore(), window=0)
+        results = await asyncio.wait_for(asyncio.gather(event_store.save_events("hall-1", [SeatReserved(1)], -1), event_store.save_events("hall-2", [SeatReserved(2)], -1), return_exceptions=True), 1)
+        assert all(isinstance(result, asyncio.CancelledError) for result in results)
@@ -0,0 +1,78 @@
+import pytest
+import unittest
+from dataclasses import dataclass
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.exceptions import ArgumentError, ConcurrencyError
+from eventsourcing.idempotency import DedupIndex
+from eventsourcing.outbox import Outbox
+
+@dataclass
+class PaymentReceived(IEvent):
+    amount : int
+
+    @property
+    def type(self) -> str:
+        return "PaymentReceived"
+
+class DedupIndexTest(unittest.TestCase):
+    """
+    Test suite for the bounded event id index.
+    """
+    def test_should_forget_oldest_ids(self):
+        index = DedupIndex(max_entries=2)
+        index.add("a", "1", 0)
+        index.add("b", "2", 0)
+        index.add("a", "3", 1)
+        assert index.get("a", "1") is None
+        assert index.get("x", "2") == ("b", 0)
+        assert len(index) == 2
+
+    def test_should_bound_each_stream(self):
+        index = DedupIndex(max_entries=1, per_stream=True)
+        index.add("a", "1", 0)
+        index.add("b", "2", 0)
+        assert index.get("a", "1") == ("a", 0)
+        assert index.get("a", "2") is None
+
+class IdempotentAppendTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for retried appends carrying event ids.
+    """
+    def setUp(self):
+        self.outbox = Outbox()
+        self.event_store = InMemEventStore(outbox=self.outbox, dedup_index=DedupIndex())
+
+    async def test_should_ignore_retried_append(self):
+        await self.event_store.save_events("pay-1", [PaymentReceived(1), PaymentReceived(2)], -1, ["e1", "e2"])
+        await self.event_store.save_events("pay-1", [PaymentReceived(1), PaymentReceived(2)], -1, ["e1", "e2"])
+
+        assert [desc.event_id for desc in self.event_store.current["pay-1"]] == ["e1", "e2"]
+        assert len(self.outbox) == 2
+
+    async def test_should_ignore_retry_after_later_appends(self):
+        await self.event_store.save_events("pay-1", [PaymentReceived(1)], -1, ["e1"])
+        await self.event_store.save_events("pay-1", [PaymentReceived(2)], 0, ["e2"])
+        await self.event_store.save_events("pay-1", [PaymentReceived(1)], -1, ["e1"])
+        assert len(self.event_store.current["pay-1"]) == 2
+
+    async def test_should_fall_back_to_stored_ids_once_evicted(self):
+        event_store = InMemEventStore(dedup_index=DedupIndex(max_entries=1))
+        await event_store.save_events("pay-1", [PaymentReceived(1)], -1, ["e1"])
+        await event_store.save_events("pay-2", [PaymentReceived(1)], -1, ["e2"])
+        await event_store.save_events("pay-1", [PaymentReceived(1)], -1, ["e1"])
+        assert len(event_store.current["pay-1"]) == 1
+
+    async def test_should_still_detect_conflicts(self):
+        await self.event_store.save_events("pay-1", [PaymentReceived(1)], -1, ["e1"])
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("pay-1", [PaymentReceived(3)], -1, ["e3"])
+
+    async def test_should_reject_id_appended_elsewhere(self):
+        await self.event_store.save_events("pay-1", [PaymentReceived(1)], -1, ["e1"])
+        with pytest.raises(ArgumentError):
+            await self.event_store.save_events("pay-2", [PaymentReceived(1)], -1, ["e1"])
+
+    async def test_should_require_one_id_per_event(self):
+        with pytest.raises(ArgumentError):
+            await self.event_store.save_events("pay-1", [PaymentReceived(1), PaymentReceived(2)], -1, ["e1"])
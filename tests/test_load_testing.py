@@ -0,0 +1,90 @@
+import pytest
+import unittest
+from collections import Counter
+from dataclasses import dataclass
+from eventsourcing.aggregates import AggregateRoot
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.load_testing import LoadTestConfig, LoadTester, percentile
+from eventsourcing.repositories import EventStoreRepository
+
+@dataclass
+class TallyOpened(IEvent):
+    id : str
+
+    @property
+    def type(self) -> str:
+        return "TallyOpened"
+
+@dataclass
+class TallyMarked(IEvent):
+    id : str
+
+    @property
+    def type(self) -> str:
+        return "TallyMarked"
+
+class Counted(AggregateRoot):
+    def __init__(self, id : str | None = None) -> None:
+        super().__init__()
+        self.count = 0
+        if id:
+            self._apply_change(TallyOpened(id))
+
+    def increment(self) -> None:
+        self._apply_change(TallyMarked(self.id))
+
+    def _apply(self, e : IEvent) -> None:
+        if isinstance(e, TallyOpened):
+            self.__id = e.id
+        else:
+            self.count += 1
+
+    @property
+    def id(self) -> str:
+        return self.__id
+
+    @staticmethod
+    def to_stream_id(id : str) -> str:
+        return f"counter-{id}"
+
+def test_percentile():
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+def test_config_validation():
+    with pytest.raises(ValueError):
+        LoadTestConfig(read_ratio=2)
+
+class LoadTesterTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the concurrent load generator.
+    """
+    def setUp(self):
+        self.event_store = InMemEventStore()
+        self.repository = EventStoreRepository[Counted](self.event_store, Counted)
+
+    def make_tester(self, **config) -> LoadTester[Counted]:
+        return LoadTester[Counted](self.repository, Counted, Counted.increment, LoadTestConfig(seed=1, **config))
+
+    async def test_should_account_for_every_write(self):
+        tester = self.make_tester(clients=8, aggregates=2, duration=10, operations=200, read_ratio=0.2, think_time=0.001)
+
+        report = await tester.run()
+
+        assert report.operations == 200
+        assert report.conflicts > 0
+        stored = sum(len(self.event_store.current[f"counter-{id}"]) - 1 for id in tester.ids)
+        assert stored == len(report.write_latencies)
+        assert sum(stats.operations for stats in report.timeline) == 200
+        assert report.latency(99, "write") >= report.latency(50, "write") > 0
+
+    async def test_should_skew_keys(self):
+        tester = self.make_tester(aggregates=50, key_skew=1.5)
+        await tester.seed()
+
+        counts = Counter(tester.choose_id() for _ in range(2000))
+
+        assert counts[tester.ids[0]] > counts[tester.ids[-1]] * 10
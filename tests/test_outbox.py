@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from dataclasses import dataclass
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.outbox import Outbox, OutboxDispatcher
+
+@dataclass
+class OrderPlaced(IEvent):
+    n : int
+
+    @property
+    def type(self) -> str:
+        return "OrderPlaced"
+
+class OutboxTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the outbox written by the event store.
+    """
+    async def test_should_append_committed_events(self):
+        outbox = Outbox()
+        event_store = InMemEventStore(outbox=outbox)
+        await event_store.save_events("order-1", [OrderPlaced(0), OrderPlaced(1)], -1)
+        await event_store.save_events("order-1", [OrderPlaced(2)], 1)
+
+        entries = outbox.pending()
+        assert [(e.position, e.stream_id, e.version, e.event) for e in entries] == [
+            (1, "order-1", 0, OrderPlaced(0)),
+            (2, "order-1", 1, OrderPlaced(1)),
+            (3, "order-1", 2, OrderPlaced(2)),
+        ]
+        assert [e.position for e in outbox.pending(after_position=1, limit=1)] == [2]
+
+    async def test_should_not_append_rejected_events(self):
+        outbox = Outbox()
+        event_store = InMemEventStore(outbox=outbox)
+        with self.assertRaises(ConcurrencyError):
+            await event_store.save_events("order-1", [OrderPlaced(0)], 3)
+        assert len(outbox) == 0
+
+    async def test_should_remove_acknowledged_entries(self):
+        outbox = Outbox()
+        outbox.append("order-1", 0, [OrderPlaced(0), OrderPlaced(1)])
+        outbox.acknowledge([1])
+        assert [e.position for e in outbox.pending()] == [2]
+
+    async def test_should_list_pending_entries_after_many_acknowledgements(self):
+        outbox = Outbox()
+        outbox.append("order-1", 0, [OrderPlaced(n) for n in range(200)])
+        outbox.acknowledge(list(range(1, 150)))
+        assert [e.position for e in outbox.pending(after_position=160, limit=3)] == [161, 162, 163]
+        assert [e.position for e in outbox.pending(limit=2)] == [150, 151]
+        assert len(outbox) == 51
+
+class OutboxDispatcherTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the delivery of outbox entries to subscribers.
+    """
+    def setUp(self):
+        self.outbox = Outbox()
+        self.event_store = InMemEventStore(outbox=self.outbox)
+
+    async def test_should_deliver_to_every_subscriber_in_batches(self):
+        dispatcher = OutboxDispatcher(self.outbox, batch_size=2, poll_interval=0.01)
+        first, second = [], []
+
+        async def first_handler(entries):
+            first.append([e.event.n for e in entries])
+
+        async def second_handler(entries):
+            second.extend(e.event.n for e in entries)
+
+        dispatcher.subscribe(first_handler)
+        dispatcher.subscribe(second_handler, concurrency=3)
+        dispatcher.start()
+        await self.event_store.save_events("order-1", [OrderPlaced(n) for n in range(5)], -1)
+        await dispatcher.drain()
+        await dispatcher.stop()
+
+        assert first == [[0, 1], [2, 3], [4]]
+        assert sorted(second) == [0, 1, 2, 3, 4]
+        assert dispatcher.delivered == 5
+        assert len(self.outbox) == 0
+        stats = dispatcher.stats()
+        assert stats["subscribers"]["second_handler"]["delivered"] == 5
+        assert stats["queue_depth"] == 0
+
+    async def test_should_retry_failed_deliveries(self):
+        dispatcher = OutboxDispatcher(self.outbox, poll_interval=0.01, retry_delay=0)
+        received = []
+        attempts = 0
+
+        async def flaky(entries):
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise RuntimeError("unavailable")
+            received.extend(entries)
+
+        subscription = dispatcher.subscribe(flaky)
+        await self.event_store.save_events("order-1", [OrderPlaced(0)], -1)
+        dispatcher.start()
+        await dispatcher.drain()
+        await dispatcher.stop()
+
+        assert [e.event for e in received] == [OrderPlaced(0)]
+        assert subscription.failures == 2
+
+    async def test_should_apply_backpressure(self):
+        dispatcher = OutboxDispatcher(self.outbox, batch_size=1, queue_size=1, poll_interval=0.01)
+        release = asyncio.Event()
+
+        async def slow(entries):
+            await release.wait()
+
+        dispatcher.subscribe(slow)
+        await self.event_store.save_events("order-1", [OrderPlaced(n) for n in range(10)], -1)
+        dispatcher.start()
+        await asyncio.sleep(0.05)
+
+        assert dispatcher.queue_depth == 1
+        assert len(self.outbox) == 10
+        release.set()
+        await dispatcher.drain()
+        await dispatcher.stop()
+        assert len(self.outbox) == 0
+
+    async def test_should_redeliver_unacknowledged_after_restart(self):
+        dispatcher = OutboxDispatcher(self.outbox, poll_interval=0.01)
+        started = asyncio.Event()
+
+        async def stuck(entries):
+            started.set()
+            await asyncio.sleep(10)
+
+        dispatcher.subscribe(stuck)
+        await self.event_store.save_events("order-1", [OrderPlaced(0)], -1)
+        dispatcher.start()
+        await started.wait()
+        await dispatcher.stop()
+        assert len(self.outbox) == 1
+
+        received = []
+
+        async def handler(entries):
+            received.extend(entries)
+
+        restarted = OutboxDispatcher(self.outbox, poll_interval=0.01)
+        restarted.subscribe(handler)
+        restarted.start()
+        await restarted.drain()
+        await restarted.stop()
+        assert [e.event for e in received] == [OrderPlaced(0)]
+
+    async def test_should_refuse_to_drain_before_start(self):
+        dispatcher = OutboxDispatcher(self.outbox, poll_interval=0.01)
+        with self.assertRaises(RuntimeError):
+            await dispatcher.drain()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from eventsourcing import data, event_stores
+from eventsourcing.encryption import CryptoRepository
+from eventsourcing.event_stores import EventDescriptor, InMemEventStore
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.profile import PHASES, PhaseProfiler, main
+
+class PhaseProfilerTest(unittest.TestCase):
+    """
+    Test suite for the nested phase timings.
+    """
+    def test_should_report_exclusive_time(self):
+        profiler = PhaseProfiler()
+        with profiler.phase("outer"):
+            with profiler.phase("inner"):
+                pass
+            with profiler.phase("inner"):
+                pass
+        assert profiler.calls == {"outer": 1, "inner": 2}
+        assert set(profiler.stacks) == {("outer",), ("outer", "inner")}
+        assert profiler.stacks[("outer", "inner")] == profiler.times["inner"]
+
+class ProfileCliTest(unittest.TestCase):
+    """
+    Test suite for the profiling command line.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.crypto_store = getattr(CryptoRepository, "crypto_store", None)
+
+    def tearDown(self):
+        CryptoRepository.crypto_store = self.crypto_store
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def run_main(self, *argv: str) -> str:
+        output = StringIO()
+        with redirect_stdout(output):
+            main(list(argv))
+        return output.getvalue()
+
+    def test_should_break_replay_down_by_phase(self):
+        output = self.run_main("--users", "3", "--changes", "2", "--flamegraph", self.path("replay.folded"))
+
+        assert "3 aggregate loads" in output
+        for phase in PHASES:
+            assert phase in output
+        with open(self.path("replay.folded")) as file:
+            stacks = dict(line.rsplit(" ", 1) for line in file.read().splitlines())
+        # Members are decrypted when the aggregate reads them.
+        assert "replay;_apply;Fernet_decryption" in stacks
+        assert "replay;store_read;from_dict" in stacks
+        assert event_stores.get_event_class.__module__ == "eventsourcing.event_stores"
+        assert data.from_dict.__name__ == "from_dict"
+
+    def test_should_replay_saved_dump(self):
+        self.run_main("--users", "2", "--save-dump", self.path("dump.ndjson"), "--keys", self.path("keys.json"))
+
+        output = self.run_main("--dump", self.path("dump.ndjson"), "--keys", self.path("keys.json"), "--allocations")
+
+        assert "2 aggregate loads" in output
+        assert "alloc KiB" in output
+
+class AppendDescriptorsTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the raw append of stored records.
+    """
+    async def test_should_append_records_and_check_versions(self):
+        event_store = InMemEventStore()
+        records = [EventDescriptor("log-1", "Ticked", "{}", version) for version in (3, 4)]
+
+        await event_store.append_descriptors("log-1", records, 2)
+
+        assert [desc.version for desc in event_store.current["log-1"]] == [3, 4]
+        assert [desc.position for desc in event_store.current["log-1"]] == [1, 2]
+        with self.assertRaises(ConcurrencyError):
+            await event_store.append_descriptors("log-1", [EventDescriptor("log-1", "Ticked", "{}", 5)], 2)
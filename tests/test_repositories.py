@@ -0,0 +1,308 @@
+import os
+import time
+import tempfile
+import asyncio
+import unittest
+from unittest import mock
+from datetime import date
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event_stores import EventDescriptor, InMemEventStore
+from eventsourcing.exceptions import AggregateNotFoundError, InvalidOperationError
+from eventsourcing.repositories import EventStoreRepository
+from eventsourcing.retention import Compactor, RetentionPolicy
+from eventsourcing.snapshots import InMemSnapshotStore
+from eventsourcing.sqlite import SqliteEventStore
+from example.user import User, LastNameChanged
+
+class CountingCryptoStore(InMemCryptoStore):
+    """
+    An in-memory key store counting the calls made to it.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.single_calls = 0
+        self.batch_calls = 0
+
+    def get_encryption_key(self, id: str) -> bytes | None:
+        self.single_calls += 1
+        return super().get_encryption_key(id)
+
+    def get_encryption_keys(self, ids):
+        self.batch_calls += 1
+        return {id: self.store.get(id) for id in ids}
+
+class EventStoreRepositoryTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for loading aggregates through the event store repository.
+    """
+    def setUp(self):
+        self.key_store = CountingCryptoStore()
+        CryptoRepository.crypto_store = self.key_store
+        self.event_store = InMemEventStore()
+        self.repository = EventStoreRepository[User](self.event_store, User)
+
+    async def create_user(self, id: str) -> User:
+        user = User(id, "Paul", "Boulanger", date(1997, 2, 18))
+        user.change_last_name("Boucher")
+        await self.repository.save(user, user.version)
+        return user
+
+    async def test_should_get_by_id(self):
+        await self.create_user("1")
+        user = await self.repository.get_by_id("1")
+        assert user.id == "1"
+        assert user.last_name == "Boucher"
+        assert user.version == 1
+
+    async def test_should_raise_when_not_found(self):
+        with self.assertRaises(AggregateNotFoundError):
+            await self.repository.get_by_id("missing")
+
+    async def test_should_get_by_ids_and_report_missing(self):
+        for id in ["1", "2", "3"]:
+            await self.create_user(id)
+        users = await self.repository.get_by_ids(["1", "missing", "3"])
+        assert list(users) == ["1", "missing", "3"]
+        assert users["1"].id == "1"
+        assert users["3"].date_of_birth == date(1997, 2, 18)
+        assert isinstance(users["missing"], AggregateNotFoundError)
+        assert users["missing"].message == "missing"
+
+    async def test_should_look_up_keys_in_one_batch(self):
+        for id in ["1", "2", "3"]:
+            await self.create_user(id)
+        self.key_store.single_calls = 0
+        users = await self.repository.get_by_ids(["1", "2", "3"])
+        assert all(user.first_name == "Paul" for user in users.values())
+        assert self.key_store.batch_calls == 1
+        assert self.key_store.single_calls == 0
+
+class SnapshotRepositoryTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for loading aggregates from snapshots and truncated streams.
+    """
+    def setUp(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        self.event_store = InMemEventStore()
+        self.snapshot_store = InMemSnapshotStore()
+        self.repository = EventStoreRepository[User](self.event_store, User, snapshot_store=self.snapshot_store, snapshot_every=2)
+
+    async def test_should_take_snapshot_every_n_events(self):
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        await self.repository.save(user, -1)
+        assert await self.snapshot_store.get_snapshot("user-1") is None
+
+        user = await self.repository.get_by_id("1")
+        user.change_last_name("Boucher")
+        await self.repository.save(user, user.version)
+        snapshot = await self.snapshot_store.get_snapshot("user-1")
+        assert snapshot.version == 1
+        assert snapshot.state["last_name"] == "Boucher"
+
+    async def test_should_load_from_snapshot_after_truncation(self):
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        user.change_last_name("Boucher")
+        await self.repository.save(user, -1)
+        await self.event_store.save_events("user-1", [LastNameChanged("1", "Meunier")], 1)
+        await Compactor(self.event_store, {"user": RetentionPolicy(truncate_before_snapshot=True)}, self.snapshot_store).run_once()
+        assert len(self.event_store.current["user-1"]) == 1
+
+        user = await self.repository.get_by_id("1")
+        assert user.version == 2
+        assert user.first_name == "Paul"
+        assert user.last_name == "Meunier"
+        user.change_last_name("Charpentier")
+        await self.repository.save(user, user.version)
+        assert (await self.repository.get_by_ids(["1"]))["1"].last_name == "Charpentier"
+
+    async def test_should_drop_snapshots_of_shredded_subjects(self):
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        user.change_last_name("Boucher")
+        await self.repository.save(user, -1)
+        assert (await self.snapshot_store.get_snapshot("user-1")).subject_ids == ["1"]
+
+        CryptoRepository.delete_encryption_key("1")
+
+        assert await self.snapshot_store.get_snapshot("user-1") is None
+        user = await self.repository.get_by_id("1")
+        assert user.version == 1
+        assert user.first_name.startswith("encrypted_")
+        assert user.last_name.startswith("encrypted_")
+
+    async def test_should_refuse_truncated_stream_without_snapshot(self):
+        repository = EventStoreRepository[User](self.event_store, User)
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        user.change_last_name("Boucher")
+        await repository.save(user, -1)
+        await self.event_store.truncate_stream("user-1", 1)
+
+        with self.assertRaises(InvalidOperationError):
+            await repository.get_by_id("1")
+        assert isinstance((await repository.get_by_ids(["1"]))["1"], InvalidOperationError)
+
+    async def test_should_fetch_snapshots_and_starts_in_one_batch(self):
+        for id in ["1", "2", "3"]:
+            user = User(id, "Paul", "Boulanger", date(1997, 2, 18))
+            user.change_last_name("Boucher")
+            await self.repository.save(user, -1)
+        with mock.patch.object(self.snapshot_store, "get_snapshot", wraps=self.snapshot_store.get_snapshot) as get_snapshot, \
+             mock.patch.object(self.event_store, "get_stream_start", wraps=self.event_store.get_stream_start) as get_stream_start, \
+             mock.patch.object(self.event_store, "get_stream_starts", wraps=self.event_store.get_stream_starts) as get_stream_starts:
+            users = await self.repository.get_by_ids(["1", "2", "3"])
+
+        assert all(user.version == 1 and user.last_name == "Boucher" for user in users.values())
+        get_snapshot.assert_not_called()
+        get_stream_start.assert_not_called()
+        get_stream_starts.assert_called_once()
+
+class TemporalQueryTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for loading aggregates as of an earlier version or time.
+    """
+    def setUp(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        self.event_store = InMemEventStore()
+        self.snapshot_store = InMemSnapshotStore()
+        self.repository = EventStoreRepository[User](self.event_store, User, snapshot_store=self.snapshot_store, snapshot_every=2)
+
+    async def save_history(self) -> None:
+        names = ["Boucher", "Meunier", "Charpentier", "Tisserand"]
+        user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+        with mock.patch("time.time", return_value=100.0):
+            await self.repository.save(user, -1)
+        for n, name in enumerate(names):
+            user = await self.repository.get_by_id("1")
+            user.change_last_name(name)
+            with mock.patch("time.time", return_value=110.0 + 10 * n):
+                await self.repository.save(user, user.version)
+
+    async def test_should_resolve_version_at_time(self):
+        await self.save_history()
+        assert await self.event_store.get_version_at("user-1", 99.0) == -1
+        assert await self.event_store.get_version_at("user-1", 100.0) == 0
+        assert await self.event_store.get_version_at("user-1", 125.0) == 2
+        assert await self.event_store.get_version_at("user-1", 1000.0) == 4
+        assert await self.event_store.get_version_at("user-2", 1000.0) == -1
+
+    async def test_should_load_as_of_version(self):
+        await self.save_history()
+        user = await self.repository.get_by_id("1", as_of_version=2)
+        assert user.version == 2
+        assert user.last_name == "Meunier"
+        assert (await self.repository.get_by_id("1", as_of_version=0)).last_name == "Boulanger"
+
+    async def test_should_load_as_of_time(self):
+        await self.save_history()
+        user = await self.repository.get_by_id("1", as_of_time=135.0)
+        assert user.version == 3
+        assert user.last_name == "Charpentier"
+        assert (await self.repository.get_by_id("1", as_of_time=135.0, as_of_version=1)).last_name == "Boucher"
+
+    async def test_should_start_from_earlier_snapshot(self):
+        await self.save_history()
+        assert [s.version for s in self.snapshot_store.current["user-1"]] == [1, 3]
+        with mock.patch.object(self.event_store, "get_events_for_aggregate", wraps=self.event_store.get_events_for_aggregate) as read:
+            user = await self.repository.get_by_id("1", as_of_version=2)
+        read.assert_awaited_once_with("user-1", 2, 2)
+        assert user.version == 2
+        assert user.first_name == "Paul"
+        assert user.last_name == "Meunier"
+
+    async def test_should_raise_before_creation(self):
+        await self.save_history()
+        with self.assertRaises(AggregateNotFoundError):
+            await self.repository.get_by_id("1", as_of_time=50.0)
+
+    async def test_should_load_as_of_time_after_truncation(self):
+        await self.save_history()
+        await self.repository.save_snapshot(await self.repository.get_by_id("1"))
+        await self.event_store.truncate_stream("user-1", 5)
+
+        user = await self.repository.get_by_id("1", as_of_time=1000.0)
+        assert user.version == 4
+        assert user.last_name == "Tisserand"
+
+class SqliteTemporalQueryTest(TemporalQueryTest):
+    """
+    Test suite for temporal queries against the SQLite event store.
+    """
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.event_store = SqliteEventStore(os.path.join(self.directory.name, "events.db"))
+        self.repository = EventStoreRepository[User](self.event_store, User, snapshot_store=self.snapshot_store, snapshot_every=2)
+
+    def tearDown(self):
+        self.event_store.close()
+        self.directory.cleanup()
+
+class SlowCryptoStore(CountingCryptoStore):
+    """
+    A key store answering each key after a delay, fetching several keys concurrently.
+    """
+    latency = 0.05
+
+    async def fetch_encryption_keys(self, ids):
+        self.batch_calls += 1
+
+        async def fetch(id):
+            await asyncio.sleep(self.latency)
+            return self.store.get(id)
+
+        ids = list(ids)
+        return dict(zip(ids, await asyncio.gather(*(fetch(id) for id in ids))))
+
+class KeyPrefetchTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for fetching the keys of a read before decrypting its events.
+    """
+    def setUp(self):
+        self.key_store = SlowCryptoStore()
+        CryptoRepository.crypto_store = self.key_store
+        self.event_store = InMemEventStore()
+        self.repository = EventStoreRepository[User](self.event_store, User)
+
+    async def create_users(self, count: int) -> list[str]:
+        ids = [str(n) for n in range(count)]
+        for id in ids:
+            user = User(id, "Paul", "Boulanger", date(1997, 2, 18))
+            user.change_last_name("Boucher")
+            await self.repository.save(user, -1)
+        self.key_store.single_calls = 0
+        return ids
+
+    async def test_should_record_subject_on_descriptors(self):
+        await self.create_users(1)
+        assert [desc.subject_id for desc in self.event_store.current["user-0"]] == ["0", "0"]
+
+    async def test_should_fetch_keys_of_many_subjects_concurrently(self):
+        ids = await self.create_users(5)
+
+        started = time.perf_counter()
+        users = await self.repository.get_by_ids(ids)
+        elapsed = time.perf_counter() - started
+
+        assert [user.last_name for user in users.values()] == ["Boucher"] * 5
+        assert self.key_store.batch_calls == 1
+        assert self.key_store.single_calls == 0
+        assert elapsed < self.key_store.latency * 3
+
+    async def test_should_fetch_key_once_per_stream(self):
+        await self.create_users(1)
+        user = await self.repository.get_by_id("0")
+        assert user.last_name == "Boucher"
+        assert self.key_store.batch_calls == 1
+        assert self.key_store.single_calls == 0
+
+    async def test_should_find_subjects_of_records_without_one(self):
+        await self.create_users(1)
+        records = [desc.to_record() for desc in self.event_store.current["user-0"]]
+        for record in records:
+            del record["subject_id"]
+        event_store = InMemEventStore()
+        await event_store.append_descriptors("user-0", [EventDescriptor.from_record(record) for record in records], -1)
+
+        user = await EventStoreRepository[User](event_store, User).get_by_id("0")
+
+        assert user.last_name == "Boucher"
+        assert self.key_store.single_calls == 0
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+import unittest
+from dataclasses import dataclass
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import InMemEventStore, stream_category
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.retention import Compactor, RetentionPolicy
+from eventsourcing.snapshots import InMemSnapshotStore, Snapshot
+
+@dataclass
+class Ticked(IEvent):
+    n : int
+
+    @property
+    def type(self) -> str:
+        return "Ticked"
+
+def test_stream_category():
+    assert stream_category("user-1234-5678") == "user"
+    assert stream_category("orphan") == "orphan"
+
+class CompactorTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the retention policies and the compaction job.
+    """
+    def setUp(self):
+        self.event_store = InMemEventStore()
+        self.snapshot_store = InMemSnapshotStore()
+
+    async def tick(self, stream_id: str, count: int) -> None:
+        await self.event_store.save_events(stream_id, [Ticked(n) for n in range(count)], -1)
+
+    async def test_should_keep_max_count_events(self):
+        await self.tick("log-1", 10)
+        await self.tick("user-1", 10)
+        await self.snapshot_store.save_snapshot(Snapshot("log-1", 9, {}))
+        compactor = Compactor(self.event_store, {"log": RetentionPolicy(max_count=3)}, self.snapshot_store)
+
+        assert await compactor.run_once() == {"log-1": 7}
+
+        assert [desc.version for desc in self.event_store.current["log-1"]] == [7, 8, 9]
+        assert len(self.event_store.current["user-1"]) == 10
+        assert await self.event_store.get_events_for_aggregate("log-1") == [Ticked(7), Ticked(8), Ticked(9)]
+        assert await self.event_store.get_stream_start("log-1") == 7
+
+    async def test_should_drop_events_older_than_max_age(self):
+        await self.tick("log-1", 4)
+        recorded_at = self.event_store.current["log-1"][2].recorded_at
+        await self.snapshot_store.save_snapshot(Snapshot("log-1", 3, {}))
+        compactor = Compactor(self.event_store, {"log": RetentionPolicy(max_age=10)}, self.snapshot_store)
+
+        await compactor.run_once(now=recorded_at + 10)
+
+        assert self.event_store.current["log-1"][0].version >= 2
+
+    async def test_should_keep_expected_version_after_dropping_everything(self):
+        await self.tick("log-1", 4)
+        await self.snapshot_store.save_snapshot(Snapshot("log-1", 3, {}))
+        compactor = Compactor(self.event_store, {"log": RetentionPolicy(max_age=0)}, self.snapshot_store)
+
+        await compactor.run_once(now=self.event_store.current["log-1"][-1].recorded_at + 1)
+
+        assert self.event_store.current["log-1"] == []
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("log-1", [Ticked(4)], -1)
+        await self.event_store.save_events("log-1", [Ticked(4)], 3)
+        assert self.event_store.current["log-1"][0].version == 4
+
+    async def test_should_truncate_before_snapshot(self):
+        await self.tick("user-1", 6)
+        await self.snapshot_store.save_snapshot(Snapshot("user-1", 3, {}))
+        compactor = Compactor(self.event_store, {"user": RetentionPolicy(truncate_before_snapshot=True)}, self.snapshot_store)
+
+        assert await compactor.run_once() == {"user-1": 4}
+        assert await compactor.run_once() == {}
+        assert await self.event_store.get_events_for_aggregate("user-1", 0) == [Ticked(4), Ticked(5)]
+        assert await self.event_store.get_events_for_aggregate("user-1", 5) == [Ticked(5)]
+
+    async def test_should_require_snapshot_store(self):
+        for policy in [RetentionPolicy(truncate_before_snapshot=True), RetentionPolicy(max_count=1), RetentionPolicy(max_age=60)]:
+            with pytest.raises(ValueError):
+                Compactor(self.event_store, {"user": policy})
+
+    async def test_should_not_drop_events_after_latest_snapshot(self):
+        await self.tick("log-1", 10)
+        await self.tick("log-2", 10)
+        await self.snapshot_store.save_snapshot(Snapshot("log-1", 5, {}))
+        compactor = Compactor(self.event_store, {"log": RetentionPolicy(max_count=3, max_age=0)}, self.snapshot_store)
+
+        assert await compactor.run_once() == {"log-1": 6}
+        assert await self.event_store.get_events_for_aggregate("log-1", 6) == [Ticked(n) for n in range(6, 10)]
+        assert len(self.event_store.current["log-2"]) == 10
+
+    async def test_should_run_in_background(self):
+        await self.tick("log-1", 10)
+        await self.snapshot_store.save_snapshot(Snapshot("log-1", 9, {}))
+        compactor = Compactor(self.event_store, {"log": RetentionPolicy(max_count=1)}, self.snapshot_store)
+        compactor.start(interval=0.01)
+        await asyncio.sleep(0.05)
+        await compactor.stop()
+        assert compactor.dropped == 9
@@ -0,0 +1,153 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+from cryptography.fernet import InvalidToken
+from datetime import date
+from eventsourcing.arena import ArenaEventStore
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore, key_generations
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.repositories import EventStoreRepository
+from eventsourcing.rotation import FileCheckpoint, InMemCheckpoint, ReEncryptionJob
+from eventsourcing.sqlite import SqliteEventStore
+from example.user import User
+
+class ReEncryptionJobTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for rotating keys and re-encrypting the stored payloads.
+    """
+    def setUp(self):
+        self.crypto_store = InMemCryptoStore()
+        CryptoRepository.crypto_store = self.crypto_store
+        self.event_store = InMemEventStore()
+        self.repository = EventStoreRepository[User](self.event_store, User)
+
+    async def create_users(self, ids: list[str]) -> None:
+        for id in ids:
+            user = User(id, "Paul", "Boulanger", date(1997, 2, 18))
+            user.change_last_name("Boucher")
+            await self.repository.save(user, -1)
+
+    def rotate(self, ids: list[str]) -> dict[str, bytes]:
+        return {id: CryptoRepository.rotate_key(id) for id in ids}
+
+    async def test_should_read_and_write_during_rotation(self):
+        await self.create_users(["1"])
+        new_key = self.rotate(["1"])["1"]
+        assert key_generations(self.crypto_store.store["1"])[0] == new_key
+
+        user = await self.repository.get_by_id("1")
+        assert user.first_name == "Paul"
+        user.change_last_name("Meunier")
+        await self.repository.save(user, 1)
+        assert (await self.repository.get_by_id("1")).last_name == "Meunier"
+
+    async def test_should_reencrypt_with_newest_key(self):
+        await self.create_users(["1", "2", "3"])
+        self.rotate(["1", "2", "3"])
+        job = ReEncryptionJob(self.event_store, batch_size=2, workers=2)
+        await job.run()
+
+        assert job.streams == 3
+        assert job.events_rewritten == 6
+        assert job.checkpoint.load() is None
+        for id in ["1", "2", "3"]:
+            CryptoRepository.retire_previous_keys(id)
+            assert len(key_generations(self.crypto_store.store[id])) == 1
+            assert (await self.repository.get_by_id(id)).last_name == "Boucher"
+
+        await job.run()
+        assert job.events_rewritten == 6
+
+    async def test_should_resume_from_checkpoint(self):
+        await self.create_users(["1", "2"])
+        self.rotate(["1", "2"])
+        checkpoint = InMemCheckpoint()
+        checkpoint.save("user-1")
+        job = ReEncryptionJob(self.event_store, checkpoint)
+        await job.run()
+
+        assert job.streams == 1
+        assert job.events_rewritten == 2
+        CryptoRepository.retire_previous_keys("1")
+        CryptoRepository.retire_previous_keys("2")
+        assert (await self.repository.get_by_id("2")).last_name == "Boucher"
+        with self.assertRaises(InvalidToken):
+            await self.repository.get_by_id("1")
+
+    async def test_should_record_failed_streams(self):
+        await self.create_users(["1", "2", "3", "4"])
+        self.rotate(["1", "2", "3", "4"])
+        job = ReEncryptionJob(self.event_store, batch_size=2)
+        reencrypt_stream = job.reencrypt_stream
+
+        async def fail_second(stream_id: str) -> int:
+            if stream_id == "user-2":
+                raise ConcurrencyError()
+            return await reencrypt_stream(stream_id)
+
+        with mock.patch.object(job, "reencrypt_stream", fail_second):
+            await job.run()
+
+        assert list(job.failed) == ["user-2"]
+        assert isinstance(job.failed["user-2"], ConcurrencyError)
+        assert job.streams == 3
+        assert job.checkpoint.load() == "user-1"
+
+        await job.run()
+        assert job.failed == {}
+        assert job.streams == 6
+        assert job.events_rewritten == 8
+        assert job.checkpoint.load() is None
+
+    async def test_should_persist_checkpoint_in_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = FileCheckpoint(os.path.join(directory, "rotation.json"))
+            assert checkpoint.load() is None
+            checkpoint.save("user-7")
+            assert FileCheckpoint(checkpoint.path).load() == "user-7"
+
+    async def test_should_limit_throughput(self):
+        await self.create_users(["1", "2", "3"])
+        self.rotate(["1", "2", "3"])
+        job = ReEncryptionJob(self.event_store, workers=1, max_events_per_second=60)
+        started = time.monotonic()
+        await job.run()
+
+        assert job.events_read == 6
+        assert time.monotonic() - started >= 4 / 60
+
+    async def test_should_skip_deleted_keys(self):
+        await self.create_users(["1"])
+        CryptoRepository.delete_encryption_key("1")
+        job = ReEncryptionJob(self.event_store)
+        await job.run()
+
+        assert job.events_rewritten == 0
+
+    async def test_should_refuse_stale_replacement(self):
+        await self.create_users(["1"])
+        stale = await self.event_store.get_event_descriptors("user-1")
+        payload = dict(self.event_store.read_payload(stale[0]), year_of_birth=1998)
+        await self.event_store.replace_payloads("user-1", stale[:1], [payload])
+
+        assert (await self.repository.get_by_id("1")).date_of_birth == date(1998, 2, 18)
+        with self.assertRaises(ConcurrencyError):
+            await self.event_store.replace_payloads("user-1", stale[:1], [payload])
+
+    async def test_should_rewrite_arena_and_sqlite_stores(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sqlite_store = SqliteEventStore(os.path.join(directory, "events.db"))
+            try:
+                for event_store in [ArenaEventStore(), sqlite_store]:
+                    CryptoRepository.crypto_store = InMemCryptoStore()
+                    self.repository = EventStoreRepository[User](event_store, User)
+                    await self.create_users(["1"])
+                    self.rotate(["1"])
+                    await ReEncryptionJob(event_store).run()
+                    CryptoRepository.retire_previous_keys("1")
+                    assert (await self.repository.get_by_id("1")).last_name == "Boucher"
+            finally:
+                sqlite_store.close()
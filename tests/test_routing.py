@@ -0,0 +1,121 @@
+import os
+import asyncio
+import pytest
+import tempfile
+import unittest
+from collections import Counter
+from dataclasses import dataclass
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import EventDescriptor, InMemEventStore, PendingAppend
+from eventsourcing.exceptions import ArgumentError, ConcurrencyError
+from eventsourcing.routing import CategoryRouter, ConsistentHashRouter, RoutingEventStore
+from eventsourcing.sqlite import SqliteEventStore
+
+@dataclass
+class ShelfStocked(IEvent):
+    count : int
+
+    @property
+    def type(self) -> str:
+        return "ShelfStocked"
+
+def test_category_router():
+    router = CategoryRouter({"user": "a", "order": "b"})
+    assert router.route("user-1") == "a"
+    assert router.route("order-1-2") == "b"
+    with pytest.raises(ArgumentError):
+        router.route("invoice-1")
+    assert CategoryRouter({}, default="c").route("invoice-1") == "c"
+
+def test_consistent_hash_router_moves_few_streams():
+    router = ConsistentHashRouter(["a", "b", "c"])
+    stream_ids = [f"shelf-{n}" for n in range(3000)]
+    before = {stream_id: router.route(stream_id) for stream_id in stream_ids}
+    assert min(Counter(before.values()).values()) > 600
+
+    router.add_shard("d")
+
+    moved = [stream_id for stream_id in stream_ids if router.route(stream_id) != before[stream_id]]
+    assert all(router.route(stream_id) == "d" for stream_id in moved)
+    assert 400 < len(moved) < 1200
+
+class RoutingEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the store sharding streams across backends.
+    """
+    def setUp(self):
+        self.shards = {"a": InMemEventStore(), "b": InMemEventStore(), "c": InMemEventStore()}
+        self.event_store = RoutingEventStore(self.shards, ConsistentHashRouter(self.shards))
+
+    async def stock(self, count: int) -> list[str]:
+        stream_ids = [f"shelf-{n}" for n in range(count)]
+        for n, stream_id in enumerate(stream_ids):
+            await self.event_store.save_events(stream_id, [ShelfStocked(n)], -1)
+        return stream_ids
+
+    async def test_should_write_each_stream_to_one_shard(self):
+        stream_ids = await self.stock(30)
+        for stream_id in stream_ids:
+            owners = [name for name, shard in self.shards.items() if stream_id in shard.current]
+            assert owners == [self.event_store.router.route(stream_id)]
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("shelf-0", [ShelfStocked(0)], -1)
+
+    async def test_should_fan_out_reads(self):
+        stream_ids = await self.stock(30)
+
+        streams = await self.event_store.get_events_for_aggregates(list(reversed(stream_ids)) + ["missing-1"])
+
+        assert list(streams) == list(reversed(stream_ids))
+        assert streams["shelf-7"] == [ShelfStocked(7)]
+        assert sorted(await self.event_store.get_stream_ids()) == sorted(stream_ids)
+        assert await self.event_store.get_events_by_type("ShelfStocked") == [ShelfStocked(n) for n in range(30)]
+
+    async def test_should_route_batches(self):
+        results = await self.event_store.save_events_batch([PendingAppend(f"shelf-{n}", [ShelfStocked(n)], -1) for n in range(10)] + [PendingAppend("shelf-3", [ShelfStocked(3)], -1)])
+        assert results[:10] == [None] * 10
+        assert isinstance(results[10], ConcurrencyError)
+
+    async def test_should_check_every_shard_before_appending(self):
+        stream_ids = await self.stock(30)
+        routes = {self.event_store.router.route(stream_id) : stream_id for stream_id in stream_ids}
+        first, second = list(routes.values())[:2]
+
+        def record(stream_id: str, version: int) -> EventDescriptor:
+            return EventDescriptor(stream_id, "ShelfStocked", '{"count": 1}', version)
+
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.append_descriptors_batch([(first, [record(first, 1)], 0), (second, [record(second, 1)], -1)])
+        with pytest.raises(ArgumentError):
+            await self.event_store.append_descriptors_batch([(first, [record(first, 1)], 0), (second, [record(second, 3)], 0)])
+        assert len(await self.event_store.get_event_descriptors(first)) == 1
+
+        await self.event_store.append_descriptors_batch([(first, [record(first, 1)], 0), (second, [record(second, 1)], 0), (first, [record(first, 2)], 1)])
+        assert len(await self.event_store.get_event_descriptors(first)) == 3
+        assert len(await self.event_store.get_event_descriptors(second)) == 2
+
+class CategoryRoutedSqliteTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for routing categories to separate SQLite files.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.shards = {name: SqliteEventStore(os.path.join(self.directory.name, f"{name}.db")) for name in ("users", "orders")}
+        self.event_store = RoutingEventStore(self.shards, CategoryRouter({"user": "users", "order": "orders"}))
+
+    def tearDown(self):
+        for shard in self.shards.values():
+            shard.close()
+        self.directory.cleanup()
+
+    async def test_should_keep_categories_apart(self):
+        await asyncio.gather(
+            self.event_store.save_events("user-1", [ShelfStocked(1)], -1),
+            self.event_store.save_events("order-1", [ShelfStocked(2)], -1),
+        )
+
+        assert await self.shards["users"].get_stream_ids() == ["user-1"]
+        assert await self.event_store.get_stream_ids_by_category("order") == ["order-1"]
+        assert await self.event_store.get_events_for_aggregate("order-1") == [ShelfStocked(2)]
+        with pytest.raises(ArgumentError):
+            await self.event_store.save_events("invoice-1", [ShelfStocked(3)], -1)
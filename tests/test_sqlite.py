@@ -0,0 +1,235 @@
+import os
+import pytest
+import tempfile
+import unittest
+from unittest import mock
+from dataclasses import dataclass
+from eventsourcing.bloom import BloomFilter
+from eventsourcing.compression import PayloadCompressor
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import EventDescriptor, PendingAppend
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.outbox import OutboxDispatcher
+from eventsourcing.sqlite import SqliteEventStore
+
+@dataclass
+class ParcelShipped(IEvent):
+    weight : int
+
+    @property
+    def type(self) -> str:
+        return "ParcelShipped"
+
+class SqliteEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the SQLite event store.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "events.db")
+        self.event_store = SqliteEventStore(self.path, outbox=True)
+
+    def tearDown(self):
+        self.event_store.close()
+        self.directory.cleanup()
+
+    async def test_should_persist_events(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1), ParcelShipped(2)], -1)
+        await self.event_store.save_events("parcel-1", [ParcelShipped(3)], 1)
+        self.event_store.close()
+
+        self.event_store = SqliteEventStore(self.path)
+        assert await self.event_store.get_events_for_aggregate("parcel-1") == [ParcelShipped(1), ParcelShipped(2), ParcelShipped(3)]
+        assert await self.event_store.get_events_for_aggregate("parcel-1", 2) == [ParcelShipped(3)]
+        assert [desc.position for desc in await self.event_store.get_event_descriptors("parcel-1")] == [1, 2, 3]
+
+    async def test_should_read_up_to_version_and_time(self):
+        for n in range(4):
+            await self.event_store.append_descriptors("parcel-1", [EventDescriptor("parcel-1", "ParcelShipped", '{"weight": %d}' % n, n, recorded_at=100.0 + n)], n - 1)
+
+        assert await self.event_store.get_events_for_aggregate("parcel-1", 1, 2) == [ParcelShipped(1), ParcelShipped(2)]
+        assert await self.event_store.get_version_at("parcel-1", 102.5) == 2
+        assert await self.event_store.get_version_at("parcel-1", 99.0) == -1
+
+    async def test_should_check_expected_version(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1)], -1)
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("parcel-1", [ParcelShipped(2)], -1)
+
+    async def test_should_write_batch_in_one_commit(self):
+        results = await self.event_store.save_events_batch([
+            PendingAppend("parcel-1", [ParcelShipped(1)], -1),
+            PendingAppend("parcel-1", [ParcelShipped(2)], -1),
+            PendingAppend("parcel-1", [ParcelShipped(3)], 0),
+            PendingAppend("parcel-2", [ParcelShipped(4)], -1, ["e4"]),
+        ])
+
+        assert [type(result) for result in results] == [type(None), ConcurrencyError, type(None), type(None)]
+        assert self.event_store.commits == 1
+        assert await self.event_store.get_events_for_aggregates(["parcel-1", "parcel-2"]) == {"parcel-1": [ParcelShipped(1), ParcelShipped(3)], "parcel-2": [ParcelShipped(4)]}
+        assert [(entry.position, entry.stream_id, entry.version, entry.event) for entry in self.event_store.outbox.pending()] == [(1, "parcel-1", 0, ParcelShipped(1)), (2, "parcel-1", 1, ParcelShipped(3)), (3, "parcel-2", 0, ParcelShipped(4))]
+
+    async def test_should_keep_undelivered_outbox_entries_across_restarts(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1), ParcelShipped(2)], -1)
+        self.event_store.close()
+
+        self.event_store = SqliteEventStore(self.path, outbox=True)
+        assert len(self.event_store.outbox) == 2
+        delivered = []
+
+        async def handler(entries):
+            delivered.extend(entry.event for entry in entries)
+
+        dispatcher = OutboxDispatcher(self.event_store.outbox, poll_interval=0.01)
+        dispatcher.subscribe(handler)
+        dispatcher.start()
+        await self.event_store.save_events("parcel-1", [ParcelShipped(3)], 1)
+        await dispatcher.drain()
+        await dispatcher.stop()
+
+        assert delivered == [ParcelShipped(1), ParcelShipped(2), ParcelShipped(3)]
+        self.event_store.close()
+        self.event_store = SqliteEventStore(self.path, outbox=True)
+        assert len(self.event_store.outbox) == 0
+
+    async def test_should_read_several_streams_from_their_own_versions(self):
+        for n in range(3):
+            await self.event_store.save_events(f"parcel-{n}", [ParcelShipped(10 * n), ParcelShipped(10 * n + 1)], -1)
+
+        with mock.patch("eventsourcing.sqlite._STREAMS_PER_QUERY", 2):
+            streams = await self.event_store.get_events_for_aggregates(["parcel-2", "missing", "parcel-0", "parcel-1"], from_versions={"parcel-2": 1, "parcel-1": 2})
+        assert list(streams.items()) == [("parcel-2", [ParcelShipped(21)]), ("parcel-0", [ParcelShipped(0), ParcelShipped(1)])]
+
+    async def test_should_ignore_retried_append(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1)], -1, ["e1"])
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1)], -1, ["e1"])
+        assert len(await self.event_store.get_event_descriptors("parcel-1")) == 1
+
+    async def test_should_truncate_streams(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(n) for n in range(4)], -1)
+        self.event_store.outbox.acknowledge([entry.position for entry in self.event_store.outbox.pending()])
+
+        assert await self.event_store.truncate_stream("parcel-1", 2) == 2
+        assert await self.event_store.truncate_stream("parcel-1", 1) == 0
+        assert await self.event_store.get_stream_start("parcel-1") == 2
+        assert await self.event_store.get_events_for_aggregate("parcel-1") == [ParcelShipped(2), ParcelShipped(3)]
+
+        assert await self.event_store.truncate_stream("parcel-1", 10) == 2
+        assert await self.event_store.get_stream_start("parcel-1") == 4
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("parcel-1", [ParcelShipped(4)], -1)
+        await self.event_store.save_events("parcel-1", [ParcelShipped(4)], 3)
+        assert await self.event_store.get_events_for_aggregate("parcel-1") == [ParcelShipped(4)]
+
+    async def test_should_not_truncate_undelivered_events(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(n) for n in range(4)], -1)
+        delivered = []
+
+        async def deliver(entries):
+            delivered.extend(entry.event for entry in entries)
+
+        assert await self.event_store.truncate_stream("parcel-1", 3) == 0
+        self.event_store.outbox.acknowledge([entry.position for entry in self.event_store.outbox.pending(limit=2)])
+        assert await self.event_store.truncate_stream("parcel-1", 3) == 2
+        assert await self.event_store.get_stream_start("parcel-1") == 2
+
+        dispatcher = OutboxDispatcher(self.event_store.outbox, poll_interval=0.01)
+        dispatcher.subscribe(deliver)
+        dispatcher.start()
+        await dispatcher.drain()
+        await dispatcher.stop()
+        assert delivered == [ParcelShipped(2), ParcelShipped(3)]
+        assert await self.event_store.truncate_stream("parcel-1", 3) == 1
+
+    async def test_should_get_several_stream_starts(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(n) for n in range(4)], -1)
+        await self.event_store.append_descriptors("parcel-2", [EventDescriptor("parcel-2", "ParcelShipped", '{"weight": 5}', 5)], 4)
+        self.event_store.outbox.acknowledge([entry.position for entry in self.event_store.outbox.pending()])
+        await self.event_store.truncate_stream("parcel-1", 2)
+
+        assert await self.event_store.get_stream_starts(["parcel-1", "parcel-2", "missing"]) == {"parcel-1": 2, "parcel-2": 5, "missing": 0}
+
+    async def test_should_list_streams_of_category(self):
+        for stream_id in ["parcel-2", "parcel", "parcels-1", "parcel-1", "crate-1"]:
+            await self.event_store.save_events(stream_id, [ParcelShipped(1)], -1)
+
+        assert await self.event_store.get_stream_ids_by_category("parcel") == ["parcel-2", "parcel", "parcel-1"]
+        assert await self.event_store.get_stream_ids_by_category("crate") == ["crate-1"]
+        assert await self.event_store.get_stream_ids_by_category("box") == []
+
+    async def test_should_append_records_of_truncated_stream(self):
+        await self.event_store.append_descriptors("parcel-1", [EventDescriptor("parcel-1", "ParcelShipped", '{"weight": 5}', 5)], 4)
+
+        assert await self.event_store.get_stream_start("parcel-1") == 5
+        assert await self.event_store.get_events_by_type("ParcelShipped") == [ParcelShipped(5)]
+        await self.event_store.save_events("parcel-1", [ParcelShipped(6)], 5)
+        assert await self.event_store.get_stream_ids() == ["parcel-1"]
+
+    async def test_should_persist_compression_dictionaries(self):
+        self.event_store.close()
+        self.event_store = SqliteEventStore(self.path, compressor=PayloadCompressor(codec="zlib", min_size=0, train_after=4))
+        for n in range(6):
+            await self.event_store.save_events(f"parcel-{n}", [ParcelShipped(1000 + n)], -1)
+        dictionary_id = self.event_store.compressor.dictionary_for("ParcelShipped")
+        assert f"zlib:{dictionary_id}" in {desc.compression for desc in await self.event_store.get_event_descriptors_by_type("ParcelShipped")}
+        self.event_store.close()
+
+        compressor = PayloadCompressor(codec="zlib", min_size=0, train_after=4)
+        self.event_store = SqliteEventStore(self.path, compressor=compressor)
+        assert await self.event_store.get_events_by_type("ParcelShipped") == [ParcelShipped(1000 + n) for n in range(6)]
+        assert compressor.dictionary_for("ParcelShipped") == dictionary_id
+
+class FilteredSqliteEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the SQLite event store answering missing streams from a Bloom filter.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "events.db")
+        self.event_store = SqliteEventStore(self.path, stream_filter=BloomFilter(1000))
+
+    def tearDown(self):
+        self.event_store.close()
+        self.directory.cleanup()
+
+    async def test_should_answer_missing_streams_without_query(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1)], -1)
+        lookups = self.event_store.filtered_lookups
+
+        assert await self.event_store.get_events_for_aggregate("parcel-2") == []
+        assert await self.event_store.get_stream_start("parcel-2") == 0
+        assert await self.event_store.get_events_for_aggregates(["parcel-1", "parcel-2"]) == {"parcel-1": [ParcelShipped(1)]}
+        assert self.event_store.filtered_lookups == lookups + 3
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("parcel-2", [ParcelShipped(2)], 0)
+
+    async def test_should_rebuild_filter_on_startup(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1)], -1)
+        self.event_store.close()
+
+        self.event_store = SqliteEventStore(self.path, stream_filter=BloomFilter(1000))
+        assert "parcel-1" in self.event_store.stream_filter
+        assert await self.event_store.get_events_for_aggregate("parcel-1") == [ParcelShipped(1)]
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("parcel-1", [ParcelShipped(2)], -1)
+
+    async def test_should_keep_fully_truncated_streams_on_startup(self):
+        await self.event_store.save_events("parcel-1", [ParcelShipped(1), ParcelShipped(2)], -1)
+        await self.event_store.truncate_stream("parcel-1", 2)
+        self.event_store.close()
+
+        self.event_store = SqliteEventStore(self.path, stream_filter=BloomFilter(1000))
+        assert "parcel-1" in self.event_store.stream_filter
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("parcel-1", [ParcelShipped(3)], -1)
+        await self.event_store.save_events("parcel-1", [ParcelShipped(3)], 1)
+        assert [desc.version for desc in await self.event_store.get_event_descriptors("parcel-1")] == [2]
+
+    async def test_should_reject_duplicate_creation_in_one_batch(self):
+        results = await self.event_store.save_events_batch([
+            PendingAppend("parcel-1", [ParcelShipped(1)], -1),
+            PendingAppend("parcel-1", [ParcelShipped(2)], -1),
+        ])
+
+        assert [type(result) for result in results] == [type(None), ConcurrencyError]
+        assert await self.event_store.get_events_for_aggregate("parcel-1") == [ParcelShipped(1)]
@@ -0,0 +1,94 @@
+import os
+import pytest
+import unittest
+from dataclasses import dataclass
+from eventsourcing.compression import PayloadCompressor
+from eventsourcing.event import IEvent
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.tiering import TieredEventStore
+
+@dataclass
+class CounterIncremented(IEvent):
+    by : int
+
+    @property
+    def type(self) -> str:
+        return "CounterIncremented"
+
+class TieredEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for the hot/cold tiered in-memory event store.
+    """
+    def setUp(self):
+        self.event_store = TieredEventStore(max_hot_events=4)
+
+    def tearDown(self):
+        self.event_store.close()
+
+    async def test_should_require_a_budget(self):
+        with pytest.raises(ValueError):
+            TieredEventStore()
+
+    async def test_should_evict_least_recently_used_streams(self):
+        await self.event_store.save_events("a", [CounterIncremented(1), CounterIncremented(2)], -1)
+        await self.event_store.save_events("b", [CounterIncremented(3), CounterIncremented(4)], -1)
+        await self.event_store.get_events_for_aggregate("a")
+        await self.event_store.save_events("c", [CounterIncremented(5)], -1)
+
+        assert list(self.event_store.current) == ["a", "c"]
+        assert self.event_store.cold_stream_ids == ["b"]
+        assert self.event_store.hot_events == 3
+
+    async def test_should_read_cold_streams_back(self):
+        await self.event_store.save_events("a", [CounterIncremented(1), CounterIncremented(2)], -1)
+        await self.event_store.save_events("b", [CounterIncremented(3), CounterIncremented(4), CounterIncremented(5)], -1)
+        assert self.event_store.cold_stream_ids == ["a"]
+
+        assert await self.event_store.get_events_for_aggregate("a") == [CounterIncremented(1), CounterIncremented(2)]
+        assert self.event_store.cold_stream_ids == ["b"]
+        assert self.event_store.loads == 1
+
+    async def test_should_append_to_cold_streams(self):
+        await self.event_store.save_events("a", [CounterIncremented(1)], -1)
+        await self.event_store.save_events("b", [CounterIncremented(2)] * 4, -1)
+        assert "a" in self.event_store.cold_stream_ids
+
+        with pytest.raises(ConcurrencyError):
+            await self.event_store.save_events("a", [CounterIncremented(9)], -1)
+        await self.event_store.save_events("a", [CounterIncremented(3)], 0)
+        assert await self.event_store.get_events_for_aggregate("a") == [CounterIncremented(1), CounterIncremented(3)]
+
+    async def test_should_keep_compressed_payloads(self):
+        event_store = TieredEventStore(max_hot_bytes=1, compressor=PayloadCompressor(codec="zlib", min_size=0, train_after=None))
+        try:
+            await event_store.save_events("a", [CounterIncremented(10 ** 40)], -1)
+            await event_store.save_events("b", [CounterIncremented(2)], -1)
+            assert event_store.cold_stream_ids == ["a"]
+            assert await event_store.get_events_for_aggregate("a") == [CounterIncremented(10 ** 40)]
+        finally:
+            event_store.close()
+
+    async def test_should_account_replaced_payloads(self):
+        await self.event_store.save_events("a", [CounterIncremented(1), CounterIncremented(2)], -1)
+        descriptors = await self.event_store.get_event_descriptors("a")
+        before = self.event_store.hot_bytes
+
+        await self.event_store.replace_payloads("a", descriptors[:1], [{"by": 10 ** 30}])
+
+        replaced = await self.event_store.get_event_descriptors("a")
+        assert self.event_store.hot_bytes == before + len(replaced[0].event_data) - len(descriptors[0].event_data)
+        assert self.event_store.hot_bytes == sum(len(desc.event_data) for desc in replaced)
+
+    async def test_should_compact_segment(self):
+        for name in ["a", "b", "c"]:
+            await self.event_store.save_events(name, [CounterIncremented(1)] * 3, -1)
+        await self.event_store.get_events_for_aggregate("a")
+        assert self.event_store.segment_garbage > 0
+        size = os.path.getsize(self.event_store.segment_path)
+
+        self.event_store.compact_segment()
+
+        assert self.event_store.segment_garbage == 0
+        assert os.path.getsize(self.event_store.segment_path) < size
+        for name in ["a", "b", "c"]:
+            assert await self.event_store.get_events_for_aggregate(name) == [CounterIncremented(1)] * 3
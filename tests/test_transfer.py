@@ -0,0 +1,111 @@
+import io
+import os
+import asyncio
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from eventsourcing.encryption import CryptoRepository, InMemCryptoStore
+from eventsourcing.event_stores import InMemEventStore
+from eventsourcing.exceptions import ConcurrencyError
+from eventsourcing.repositories import EventStoreRepository
+from eventsourcing.sqlite import SqliteEventStore
+from eventsourcing.transfer import FRAMED, NDJSON, export_events, import_events, main, read_records, write_records
+from example.user import User
+
+class TransferTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for streaming event stores to and from files.
+    """
+    async def asyncSetUp(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = InMemEventStore()
+        repository = EventStoreRepository[User](self.source, User)
+        for i in range(5):
+            user = User(str(i), "Paul", "Boulanger", date(1997, 2, 18))
+            for j in range(3):
+                user.change_last_name(f"Name {j}")
+            await repository.save(user, -1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    async def test_should_round_trip_records(self):
+        for format in [NDJSON, FRAMED]:
+            buffer = io.BytesIO()
+            assert await export_events(self.source, buffer, format) == 20
+            buffer.seek(0)
+            target = InMemEventStore()
+            assert await import_events(target, buffer, format, batch_size=7) == 20
+
+            for stream_id in await self.source.get_stream_ids():
+                expected = [desc.to_record() | {"position": None} for desc in await self.source.get_event_descriptors(stream_id)]
+                actual = [desc.to_record() | {"position": None} for desc in await target.get_event_descriptors(stream_id)]
+                assert actual == expected
+            assert (await EventStoreRepository[User](target, User).get_by_id("3")).last_name == "Name 2"
+
+    async def test_should_import_in_few_transactions(self):
+        buffer = io.BytesIO()
+        await export_events(self.source, buffer)
+        buffer.seek(0)
+        target = SqliteEventStore(self.path("events.db"))
+        try:
+            await import_events(target, buffer, batch_size=8)
+            assert target.commits == 3
+            assert (await EventStoreRepository[User](target, User).get_by_id("4")).version == 3
+
+            buffer.seek(0)
+            with self.assertRaises(ConcurrencyError):
+                await import_events(target, buffer)
+            assert len(await target.get_event_descriptors("user-0")) == 4
+        finally:
+            target.close()
+
+    async def test_should_reject_truncated_frames(self):
+        buffer = io.BytesIO()
+        write_records(buffer, [{"a": 1}, {"b": 2}], FRAMED)
+        truncated = io.BytesIO(buffer.getvalue()[:-3])
+
+        records = read_records(truncated, FRAMED)
+        assert next(records) == {"a": 1}
+        with self.assertRaises(ValueError):
+            next(records)
+
+class TransferCliTest(unittest.TestCase):
+    """
+    Test suite for the transfer command line.
+    """
+    def setUp(self):
+        CryptoRepository.crypto_store = InMemCryptoStore()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def test_should_copy_between_databases(self):
+        source = SqliteEventStore(self.path("source.db"))
+        try:
+            user = User("1", "Paul", "Boulanger", date(1997, 2, 18))
+            user.change_last_name("Boucher")
+            asyncio.run(EventStoreRepository[User](source, User).save(user, -1))
+        finally:
+            source.close()
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["export", self.path("source.db"), self.path("dump.bin"), "--format", FRAMED])
+            main(["import", self.path("target.db"), self.path("dump.bin"), "--format", FRAMED])
+        assert output.getvalue().splitlines() == ["2 events exported", "2 events imported"]
+
+        target = SqliteEventStore(self.path("target.db"))
+        try:
+            assert (asyncio.run(EventStoreRepository[User](target, User).get_by_id("1"))).last_name == "Boucher"
+        finally:
+            target.close()
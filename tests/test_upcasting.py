@@ -0,0 +1,100 @@
+import json
+import unittest
+from dataclasses import dataclass
+from eventsourcing.event import IEvent
+from eventsourcing.event_stores import EventDescriptor, InMemEventStore
+from eventsourcing.upcasting import SCHEMA_VERSION, UpcasterRegistry, upcaster, upcasters
+
+@dataclass
+class ContactAdded(IEvent):
+    id : str
+    first_name : str
+    last_name : str
+    country : str
+
+    @property
+    def type(self) -> str:
+        return "ContactAdded"
+
+def split_name(values: dict) -> dict:
+    values["first_name"], values["last_name"] = values.pop("name").split(" ", 1)
+    return values
+
+def add_country(values: dict) -> dict:
+    values.setdefault("country", "FR")
+    return values
+
+class UpcasterRegistryTest(unittest.TestCase):
+    """
+    Test suite for composing upcasters.
+    """
+    def setUp(self):
+        self.registry = UpcasterRegistry()
+        self.calls = []
+
+        def first(values: dict) -> dict:
+            self.calls.append(1)
+            return split_name(values)
+
+        def second(values: dict) -> dict:
+            self.calls.append(2)
+            return add_country(values)
+
+        upcaster("ContactAdded", 1, self.registry)(first)
+        upcaster("ContactAdded", 2, self.registry)(second)
+
+    def test_should_compose_chain_once(self):
+        chain = self.registry.chain("ContactAdded", 1)
+        assert self.registry.chain("ContactAdded", 1) is chain
+        assert self.registry.chain("ContactAdded", 3) is None
+
+        old = {"id": "1", "name": "Paul Boulanger"}
+        assert chain(old) == {"id": "1", "first_name": "Paul", "last_name": "Boulanger", "country": "FR", SCHEMA_VERSION: 3}
+        assert old == {"id": "1", "name": "Paul Boulanger"}
+        assert self.calls == [1, 2]
+        assert self.registry.upcast("ContactAdded", {"id": "1", "first_name": "Paul", "last_name": "Boulanger", "country": "BE", SCHEMA_VERSION: 2})["country"] == "BE"
+        assert self.calls == [1, 2, 2]
+
+    def test_should_leave_current_payloads_alone(self):
+        values = {"id": "1", SCHEMA_VERSION: 3}
+        assert self.registry.upcast("ContactAdded", values) is values
+        assert self.registry.upcast("Unknown", values) is values
+        assert self.registry.stamp("ContactAdded", {}) == {SCHEMA_VERSION: 3}
+        assert self.registry.stamp("Unknown", {}) == {}
+
+    def test_should_reject_inconsistent_chains(self):
+        with self.assertRaises(ValueError):
+            self.registry.register("ContactAdded", 2, add_country)
+        with self.assertRaises(ValueError):
+            self.registry.register("ContactAdded", 0, add_country)
+        with self.assertRaises(ValueError):
+            self.registry.upcast("ContactAdded", {SCHEMA_VERSION: 4})
+
+        self.registry.register("ContactAdded", 4, add_country)
+        assert self.registry.schema_version("ContactAdded") == 5
+        with self.assertRaises(ValueError):
+            self.registry.chain("ContactAdded", 1)
+
+class UpcastingEventStoreTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Test suite for reading events stored with older schemas.
+    """
+    def setUp(self):
+        upcasters.register("ContactAdded", 1, split_name)
+        upcasters.register("ContactAdded", 2, add_country)
+        self.event_store = InMemEventStore()
+
+    def tearDown(self):
+        upcasters.clear()
+
+    async def test_should_upcast_old_events_and_stamp_new_ones(self):
+        await self.event_store.append_descriptors("contact-1", [
+            EventDescriptor("contact-1", "ContactAdded", json.dumps({"id": "1", "name": "Paul Boulanger"}), 0),
+            EventDescriptor("contact-1", "ContactAdded", json.dumps({"id": "1", "first_name": "Paul", "last_name": "Boucher", SCHEMA_VERSION: 2}), 1),
+        ], -1)
+        await self.event_store.save_events("contact-1", [ContactAdded("1", "Paul", "Meunier", "BE")], 1)
+
+        events = await self.event_store.get_events_for_aggregate("contact-1")
+        assert events == [ContactAdded("1", "Paul", "Boulanger", "FR"), ContactAdded("1", "Paul", "Boucher", "FR"), ContactAdded("1", "Paul", "Meunier", "BE")]
+        assert await self.event_store.get_events_by_type("ContactAdded") == events
+        assert self.event_store.read_payload((await self.event_store.get_event_descriptors("contact-1"))[2])[SCHEMA_VERSION] == 3